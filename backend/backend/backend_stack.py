@@ -127,6 +127,12 @@ class MovieApiStack(Stack):
                                    authorizer=authorizer,
                                    authorization_type=apigateway.AuthorizationType.COGNITO)
 
+        # 📁 /movies/bulk
+        movies_bulk = movies.add_resource("bulk")
+        movies_bulk.add_method("POST", apigateway.LambdaIntegration(movies_handler,timeout=Duration.seconds(60)),
+                               authorizer=authorizer,
+                               authorization_type=apigateway.AuthorizationType.COGNITO)
+
         # 📁 /movies/search
         movie_semantic_search = movies.add_resource("search")
         for method in ["POST"]:
@@ -138,6 +144,7 @@ class MovieApiStack(Stack):
         add_cors_options(movies)
         add_cors_options(movie_by_id)
         add_cors_options(movie_semantic_search)
+        add_cors_options(movies_bulk)
 
 
 
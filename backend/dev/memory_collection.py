@@ -0,0 +1,690 @@
+"""
+In-memory stand-in for a pymongo client, database and collection.
+
+Implements the aggregation subset the search modules use so pipelines can
+be exercised locally without Atlas: $vectorSearch (brute-force cosine),
+$search (text operator over an inverted index, BM25 scored), $match,
+$addFields/$set, $project, $unionWith, $group, $unwind, $replaceRoot,
+$sort and $limit; plus the cursor and write methods the CRUD routes, the
+caches and the gazetteer call. An optional per-call latency simulates the
+network round trip to the cluster.
+"""
+
+import copy
+import math
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import timing
+
+# Keys holding $meta values. "$" prefixed keys cannot exist in real documents.
+_META_PREFIX = "$meta:"
+
+# BM25 parameters, as used by Lucene (and so Atlas Search)
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+class InMemoryClient:
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self._databases = {}
+        self.admin = SimpleNamespace(command=lambda *args, **kwargs: {"ok": 1.0})
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = InMemoryDatabase(self.latency_ms)
+        return self._databases[name]
+
+    def get_database(self, name):
+        return self[name]
+
+    def close(self):
+        pass
+
+
+class InMemoryDatabase:
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(name, database=self)
+        return self._collections[name]
+
+
+class InMemoryCollection:
+    def __init__(self, name="movies", documents=None, database=None, latency_ms=None):
+        self.name = name
+        self.database = database
+        self._latency_ms = latency_ms
+        self._root = self
+        self._document_class = dict
+        self._documents = list(documents or [])
+        self._round_trips = 0
+        self._lock = threading.RLock()
+        self._text_indexes = {}
+        self._text_indexed = None
+
+    # Views from with_options share documents, counters and indexes with their root
+    @property
+    def documents(self):
+        return self._root._documents
+
+    @documents.setter
+    def documents(self, documents):
+        self._root._documents = documents
+
+    @property
+    def round_trips(self):
+        return self._root._round_trips
+
+    @round_trips.setter
+    def round_trips(self, value):
+        self._root._round_trips = value
+
+    @property
+    def latency_ms(self):
+        root = self._root
+        if root._latency_ms is not None:
+            return root._latency_ms
+        return root.database.latency_ms if root.database else 0.0
+
+    def with_options(self, codec_options=None, **kwargs):
+        view = copy.copy(self)
+        if codec_options is not None:
+            view._document_class = codec_options.document_class
+        return view
+
+    def _round_trip(self):
+        with self._root._lock:
+            self._root._round_trips += 1
+        timing.count("mongo_round_trips")
+        if self.latency_ms:
+            with timing.span("mongo"):
+                time.sleep(self.latency_ms / 1000)
+
+    def _sibling(self, name):
+        if name == self.name or self.database is None:
+            return self
+        return self.database[name]
+
+    def _output(self, doc):
+        doc = _strip_meta(doc)
+        if self._document_class is dict:
+            return doc
+        import bson
+        return self._document_class(bson.encode(doc))
+
+    def _changed(self):
+        with self._root._lock:
+            self._root._text_indexes = {}
+
+    # ------------------------------------------------------------ reads
+
+    def aggregate(self, pipeline, **kwargs):
+        self._round_trip()
+        return iter([self._output(doc) for doc in self._run(pipeline)])
+
+    def _run(self, pipeline):
+        docs = None
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            if docs is None and op not in _SOURCE_STAGES:
+                docs = [copy.deepcopy(doc) for doc in self.documents]
+            docs = _STAGES[op](self, docs, spec)
+        return docs if docs is not None else [copy.deepcopy(doc) for doc in self.documents]
+
+    def find(self, filter=None, projection=None, **kwargs):
+        return InMemoryCursor(self, filter or {}, projection)
+
+    def find_one(self, filter=None, projection=None, **kwargs):
+        return next(iter(self.find(filter, projection).limit(1)), None)
+
+    def count_documents(self, filter, **kwargs):
+        self._round_trip()
+        return sum(1 for doc in self.documents if matches(doc, filter))
+
+    def estimated_document_count(self, **kwargs):
+        self._round_trip()
+        return len(self.documents)
+
+    def distinct(self, key, filter=None, **kwargs):
+        self._round_trip()
+        values = []
+        for doc in self.documents:
+            if filter and not matches(doc, filter):
+                continue
+            value = get_path(doc, key)
+            for item in value if isinstance(value, list) else [value]:
+                if item is not None and item not in values:
+                    values.append(item)
+        return values
+
+    def text_index(self, path):
+        """
+        Returns (postings, lengths, average_length) for `path`, where postings
+        maps each token to {document position: term frequency}. Built on first
+        use and dropped by every write.
+        """
+        root = self._root
+        with root._lock:
+            # Benchmarks replace `documents` wholesale; treat that as a write too
+            state = (id(root._documents), len(root._documents))
+            if root._text_indexed != state:
+                root._text_indexes = {}
+                root._text_indexed = state
+            if path not in root._text_indexes:
+                postings = {}
+                lengths = []
+                for position, doc in enumerate(root._documents):
+                    tokens = tokenize(get_path(doc, path))
+                    lengths.append(len(tokens))
+                    for token in tokens:
+                        frequencies = postings.setdefault(token, {})
+                        frequencies[position] = frequencies.get(position, 0) + 1
+                average = sum(lengths) / len(lengths) if lengths else 0.0
+                root._text_indexes[path] = (postings, lengths, average)
+            return root._text_indexes[path]
+
+    # ------------------------------------------------------------ writes
+
+    def insert_one(self, document, **kwargs):
+        self._round_trip()
+        with self._root._lock:
+            self._insert(document)
+        self._changed()
+        return SimpleNamespace(inserted_id=document["_id"], acknowledged=True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        self._round_trip()
+        inserted_ids = []
+        write_errors = []
+        with self._root._lock:
+            for index, document in enumerate(documents):
+                try:
+                    self._insert(document)
+                    inserted_ids.append(document["_id"])
+                except Exception as e:
+                    write_errors.append({"index": index, "code": getattr(e, "code", None), "errmsg": str(e)})
+                    if ordered:
+                        break
+        self._changed()
+        if write_errors:
+            from pymongo.errors import BulkWriteError
+            raise BulkWriteError({"writeErrors": write_errors, "nInserted": len(inserted_ids)})
+        return SimpleNamespace(inserted_ids=inserted_ids, acknowledged=True)
+
+    def _insert(self, document):
+        if "_id" not in document:
+            from bson import ObjectId
+            document["_id"] = ObjectId()
+        if self._position({"_id": document["_id"]}) is not None:
+            from pymongo.errors import DuplicateKeyError
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} _id: {document['_id']}", 11000)
+        self.documents.append(copy.deepcopy(document))
+
+    def _position(self, filter):
+        for position, doc in enumerate(self.documents):
+            if matches(doc, filter):
+                return position
+        return None
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        self._round_trip()
+        with self._root._lock:
+            result = self._update(filter, update, upsert)
+        self._changed()
+        return result
+
+    def _update(self, filter, update, upsert):
+        position = self._position(filter)
+        if position is None:
+            if not upsert:
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+            document = {k: v for k, v in filter.items() if not k.startswith("$") and not isinstance(v, dict)}
+            apply_update(document, update, inserting=True)
+            self._insert(document)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=document["_id"])
+
+        document = self.documents[position]
+        before = copy.deepcopy(document)
+        apply_update(document, update)
+        return SimpleNamespace(matched_count=1, modified_count=int(document != before), upserted_id=None)
+
+    def delete_one(self, filter, **kwargs):
+        self._round_trip()
+        with self._root._lock:
+            position = self._position(filter)
+            if position is not None:
+                del self.documents[position]
+        self._changed()
+        return SimpleNamespace(deleted_count=int(position is not None))
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        """
+        Applies pymongo InsertOne / UpdateOne / DeleteOne requests in one round trip.
+        """
+        self._round_trip()
+        counts = {"inserted_count": 0, "matched_count": 0, "modified_count": 0, "deleted_count": 0, "upserted_count": 0}
+        with self._root._lock:
+            for request in requests:
+                kind = type(request).__name__
+                if kind == "InsertOne":
+                    self._insert(request._doc)
+                    counts["inserted_count"] += 1
+                elif kind == "UpdateOne":
+                    result = self._update(request._filter, request._doc, bool(request._upsert))
+                    counts["matched_count"] += result.matched_count
+                    counts["modified_count"] += result.modified_count
+                    counts["upserted_count"] += int(result.upserted_id is not None)
+                elif kind == "DeleteOne":
+                    position = self._position(request._filter)
+                    if position is not None:
+                        del self.documents[position]
+                        counts["deleted_count"] += 1
+                else:
+                    raise NotImplementedError(f"Unsupported bulk request {kind}")
+        self._changed()
+        return SimpleNamespace(acknowledged=True, **counts)
+
+    def create_index(self, keys, **kwargs):
+        return keys if isinstance(keys, str) else "_".join(f"{key}_{direction}" for key, direction in keys)
+
+
+class InMemoryCursor:
+    """
+    Lazy find() cursor supporting sort/skip/limit chaining; the query runs,
+    as one round trip, when the cursor is first iterated.
+    """
+
+    def __init__(self, collection, filter, projection):
+        self.collection = collection
+        self.filter = filter
+        self.projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key, direction=1):
+        self._sort = [(key, direction)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        if self._results is None:
+            collection = self.collection
+            collection._round_trip()
+            # Sorting, slicing and projecting only reorder or rebuild the top-level dicts,
+            # so copying is left until just the returned documents remain
+            docs = [doc for doc in collection.documents if matches(doc, self.filter)]
+            if self._sort:
+                docs = _sort(collection, docs, dict(self._sort))
+            docs = docs[self._skip:self._skip + self._limit if self._limit else None]
+            if self.projection:
+                docs = _project(collection, docs, self.projection)
+            self._results = [collection._output(copy.deepcopy(doc)) for doc in docs]
+        return iter(self._results)
+
+
+def apply_update(document, update, inserting=False):
+    for op, values in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for key, value in values.items():
+                _set_path(document, key, copy.deepcopy(value))
+        elif op == "$setOnInsert":
+            continue
+        elif op == "$inc":
+            for key, value in values.items():
+                _set_path(document, key, (get_path(document, key) or 0) + value)
+        elif op == "$unset":
+            for key in values:
+                parent, _, leaf = key.rpartition(".")
+                target = get_path(document, parent) if parent else document
+                if isinstance(target, dict):
+                    target.pop(leaf, None)
+        else:
+            raise NotImplementedError(f"Unsupported update operator {op}")
+
+
+def _set_path(document, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def tokenize(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [token for item in value for token in tokenize(item)]
+    return re.findall(r"\w+", str(value).lower())
+
+
+def _strip_meta(doc):
+    return {k: v for k, v in doc.items() if not k.startswith(_META_PREFIX)}
+
+
+def get_path(doc, path):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part)
+        else:
+            return None
+    return value
+
+
+def cosine_score(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    if not norm:
+        return 0.0
+    # Atlas normalizes cosine similarity into [0, 1]
+    return (1 + dot / norm) / 2
+
+
+def evaluate(expr, doc):
+    if isinstance(expr, str):
+        if expr == "$$ROOT":
+            return doc
+        if expr.startswith("$"):
+            return get_path(doc, expr[1:])
+        return expr
+    if isinstance(expr, list):
+        return [evaluate(e, doc) for e in expr]
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            (op, arg), = expr.items()
+            if op in _OPERATORS:
+                return _OPERATORS[op](arg, doc)
+        return {k: evaluate(v, doc) for k, v in expr.items()}
+    return expr
+
+
+def _merge_objects(arg, doc):
+    merged = {}
+    for part in evaluate(arg, doc):
+        if part:
+            merged.update(part)
+    return merged
+
+
+def _if_null(arg, doc):
+    for candidate in arg:
+        value = evaluate(candidate, doc)
+        if value is not None:
+            return value
+    return None
+
+
+_OPERATORS = {
+    "$meta": lambda arg, doc: doc.get(_META_PREFIX + arg),
+    "$add": lambda arg, doc: sum(evaluate(a, doc) or 0 for a in arg),
+    "$multiply": lambda arg, doc: math.prod(evaluate(a, doc) or 0 for a in arg),
+    "$divide": lambda arg, doc: evaluate(arg[0], doc) / evaluate(arg[1], doc),
+    "$ifNull": _if_null,
+    "$mergeObjects": _merge_objects,
+    "$literal": lambda arg, doc: arg,
+    "$arrayElemAt": lambda arg, doc: _array_elem_at(evaluate(arg[0], doc), evaluate(arg[1], doc)),
+    "$indexOfArray": lambda arg, doc: _index_of_array(evaluate(arg[0], doc), evaluate(arg[1], doc)),
+}
+
+
+def _array_elem_at(values, index):
+    if not isinstance(values, list) or index is None or not -len(values) <= index < len(values):
+        return None
+    return values[index]
+
+
+def _index_of_array(values, value):
+    return values.index(value) if isinstance(values, list) and value in values else -1
+
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+            continue
+        value = get_path(doc, key)
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            for op, arg in condition.items():
+                if op == "$in" and not (value in arg or (isinstance(value, list) and any(v in arg for v in value))):
+                    return False
+                if op == "$nin" and (value in arg):
+                    return False
+                if op == "$eq" and value != arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+                if op == "$gt" and not (value is not None and value > arg):
+                    return False
+                if op == "$gte" and not (value is not None and value >= arg):
+                    return False
+                if op == "$lt" and not (value is not None and value < arg):
+                    return False
+                if op == "$lte" and not (value is not None and value <= arg):
+                    return False
+                if op == "$exists" and (value is not None) != bool(arg):
+                    return False
+        elif isinstance(value, list) and not isinstance(condition, list):
+            if condition not in value:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _vector_search(collection, docs, spec):
+    if docs is not None:
+        raise ValueError("$vectorSearch must be the first stage in a pipeline")
+    query_vector = spec["queryVector"]
+    path = spec["path"]
+    scored = []
+    for doc in collection.documents:
+        vector = get_path(doc, path)
+        if not vector:
+            continue
+        if spec.get("filter") and not matches(doc, spec["filter"]):
+            continue
+        scored.append((cosine_score(query_vector, vector), doc))
+    scored.sort(key=lambda x: x[0], reverse=True)
+
+    results = []
+    for score, doc in scored[:spec["limit"]]:
+        doc = copy.deepcopy(doc)
+        doc[_META_PREFIX + "vectorSearchScore"] = score
+        results.append(doc)
+    return results
+
+
+def _search(collection, docs, spec):
+    if docs is not None:
+        raise ValueError("$search must be the first stage in a pipeline")
+    if "text" not in spec:
+        raise NotImplementedError(f"Unsupported $search operator {sorted(k for k in spec if k != 'index')}")
+    query = tokenize(spec["text"]["query"])
+    paths = spec["text"]["path"]
+    paths = [paths] if isinstance(paths, str) else paths
+
+    # BM25 summed over the searched paths, like a Lucene disjunction over fields
+    scores = {}
+    total = len(collection.documents)
+    for path in paths:
+        postings, lengths, average = collection.text_index(path)
+        for token in set(query):
+            frequencies = postings.get(token)
+            if not frequencies:
+                continue
+            idf = math.log(1 + (total - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+            for position, tf in frequencies.items():
+                norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * lengths[position] / (average or 1))
+                scores[position] = scores.get(position, 0.0) + idf * tf * (_BM25_K1 + 1) / (tf + norm)
+
+    results = []
+    for position in sorted(scores, key=lambda p: (-scores[p], p)):
+        doc = copy.deepcopy(collection.documents[position])
+        doc[_META_PREFIX + "searchScore"] = scores[position]
+        results.append(doc)
+    return results
+
+
+def _match(collection, docs, spec):
+    return [doc for doc in docs if matches(doc, spec)]
+
+
+def _add_fields(collection, docs, spec):
+    for doc in docs:
+        values = {k: evaluate(v, doc) for k, v in spec.items()}
+        doc.update(values)
+    return docs
+
+
+def _project(collection, docs, spec):
+    fields = [v for k, v in spec.items() if k != "_id"]
+    exclude = all(v in (0, False) for v in fields) if fields else spec.get("_id") in (0, False)
+    projected = []
+    for doc in docs:
+        if exclude:
+            out = {k: v for k, v in doc.items() if spec.get(k, 1) not in (0, False)}
+        else:
+            out = {k: v for k, v in doc.items() if k.startswith(_META_PREFIX)}
+            if spec.get("_id", 1) not in (0, False) and "_id" in doc:
+                out["_id"] = doc["_id"]
+            for key, value in spec.items():
+                if key == "_id":
+                    continue
+                if value in (1, True):
+                    if get_path(doc, key) is not None:
+                        out[key] = get_path(doc, key)
+                elif value not in (0, False):
+                    out[key] = evaluate(value, doc)
+        projected.append(out)
+    return projected
+
+
+def _union_with(collection, docs, spec):
+    other = collection._sibling(spec["coll"] if isinstance(spec, dict) else spec)
+    pipeline = spec.get("pipeline", []) if isinstance(spec, dict) else []
+    return docs + other._run(pipeline)
+
+
+def _group(collection, docs, spec):
+    groups = {}
+    order = []
+    for doc in docs:
+        key = evaluate(spec["_id"], doc)
+        hashable = repr(key)
+        if hashable not in groups:
+            groups[hashable] = {"_id": key}
+            order.append(hashable)
+        group = groups[hashable]
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, expr), = accumulator.items()
+            value = evaluate(expr, doc)
+            if op == "$first":
+                group.setdefault(field, value)
+            elif op == "$last":
+                group[field] = value
+            elif op == "$push":
+                group.setdefault(field, []).append(value)
+            elif op == "$addToSet":
+                bucket = group.setdefault(field, [])
+                if value not in bucket:
+                    bucket.append(value)
+            elif op == "$max":
+                if value is not None and (group.get(field) is None or value > group[field]):
+                    group[field] = value
+                else:
+                    group.setdefault(field, None)
+            elif op == "$min":
+                if value is not None and (group.get(field) is None or value < group[field]):
+                    group[field] = value
+                else:
+                    group.setdefault(field, None)
+            elif op == "$sum":
+                group[field] = group.get(field, 0) + (value or 0)
+            else:
+                raise NotImplementedError(f"Unsupported accumulator {op}")
+    return [groups[k] for k in order]
+
+
+def _unwind(collection, docs, spec):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"].lstrip("$")
+    index_field = spec.get("includeArrayIndex")
+    unwound = []
+    for doc in docs:
+        values = get_path(doc, path)
+        if not isinstance(values, list):
+            continue
+        for index, value in enumerate(values):
+            out = dict(doc)
+            out[path] = value
+            if index_field:
+                out[index_field] = index
+            unwound.append(out)
+    return unwound
+
+
+def _replace_root(collection, docs, spec):
+    return [dict(evaluate(spec["newRoot"], doc)) for doc in docs]
+
+
+def _sort(collection, docs, spec):
+    # Apply keys from least to most significant; Python's sort is stable.
+    for key, direction in reversed(list(spec.items())):
+        docs.sort(key=lambda d: _sort_key(get_path(d, key)), reverse=direction == -1)
+    return docs
+
+
+def _sort_key(value):
+    # None sorts before numbers, numbers before everything else, like BSON's type ordering.
+    if value is None:
+        return (0, 0, "")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value, "")
+    return (2, 0, str(value))
+
+
+def _limit(collection, docs, spec):
+    return docs[:spec]
+
+
+_STAGES = {
+    "$vectorSearch": _vector_search,
+    "$search": _search,
+    "$match": _match,
+    "$addFields": _add_fields,
+    "$set": _add_fields,
+    "$project": _project,
+    "$unionWith": _union_with,
+    "$group": _group,
+    "$unwind": _unwind,
+    "$replaceRoot": _replace_root,
+    "$sort": _sort,
+    "$limit": _limit,
+}
+
+# Stages that read the collection themselves and so must come first
+_SOURCE_STAGES = {"$vectorSearch", "$search"}
@@ -0,0 +1,207 @@
+"""
+Local stand-ins for the external services, for load tests and offline runs.
+
+- memory_collection.InMemoryClient replaces the Atlas cluster
+- HashingEmbedder replaces the OpenAI embeddings API with deterministic
+  feature-hashed bag-of-words vectors, so texts sharing words land close
+  together and search results stay meaningful
+- CannedBedrock replaces the Bedrock runtime, answering the query
+  understanding prompt from the request text itself
+
+Each stand-in takes a base latency plus an optional exponential jitter, so
+tail latency under load resembles the real services. `install` routes the
+clients.py getters to them; nothing reads Secrets Manager afterwards.
+"""
+
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import clients
+from memory_collection import InMemoryClient, tokenize
+
+
+class SimulatedLatency:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self):
+        delay = self.latency_ms
+        if self.jitter_ms:
+            with self._lock:
+                delay += self._rng.expovariate(1 / self.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+
+class HashingEmbedder:
+    """
+    Drop-in for the OpenAI client's `embeddings.create`: each word is hashed
+    into one signed bucket of the vector, then the vector is L2 normalized.
+    """
+
+    def __init__(self, dimensions=256, latency_ms=0.0, jitter_ms=0.0):
+        self.dimensions = dimensions
+        self.latency = SimulatedLatency(latency_ms, jitter_ms)
+        self.embeddings = self
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def embed(self, text, dimensions=None):
+        dimensions = dimensions or self.dimensions
+        vector = [0.0] * dimensions
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def create(self, model, input, dimensions=None, **kwargs):
+        with self._lock:
+            self.requests += 1
+        inputs = [input] if isinstance(input, str) else list(input)
+        self.latency.sleep()
+        tokens = sum(len(tokenize(text)) for text in inputs)
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(embedding=self.embed(text, dimensions), index=i) for i, text in enumerate(inputs)],
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens),
+        )
+
+
+def understanding_response(prompt):
+    """
+    Canned answer to agent.understand_query's prompt: the user request is used
+    as both the semantic and the keyword text.
+    """
+    match = re.search(r"<USER_REQUEST>\s*(.*?)\s*</USER_REQUEST>", prompt, re.S)
+    request = " ".join(match.group(1).split()) if match else ""
+    return (
+        f"<SEMANTIC_SEARCH_TEXT>{request}</SEMANTIC_SEARCH_TEXT>\n"
+        f"<KEYWORD_SEARCH_TEXT>{request}</KEYWORD_SEARCH_TEXT>\n"
+        f'<KEYWORD_CATEGORIES>"genres", "cast", "directors", "type"</KEYWORD_CATEGORIES>'
+    )
+
+
+class ThrottlingException(Exception):
+    """
+    Shaped like botocore's ClientError: the error code is in `response`.
+    """
+
+    def __init__(self, operation="InvokeModel"):
+        self.response = {"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}
+        super().__init__(f"An error occurred (ThrottlingException) when calling the {operation} operation: Too many requests")
+
+
+class CannedBedrock:
+    """
+    Drop-in for the bedrock-runtime client's `invoke_model` and
+    `invoke_model_with_response_stream`. `responder` maps
+    the prompt to the answer text; `throttle_rate` is the share of calls
+    rejected with a ThrottlingException, either one rate or {model_id: rate}.
+    """
+
+    def __init__(self, latency_ms=800.0, jitter_ms=0.0, responder=understanding_response, throttle_rate=0.0, seed=None):
+        self.latency = SimulatedLatency(latency_ms, jitter_ms, seed)
+        self.responder = responder
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def _record(self, model_id):
+        rate = self.throttle_rate.get(model_id, 0.0) if isinstance(self.throttle_rate, dict) else self.throttle_rate
+        with self._lock:
+            self.calls[model_id] = self.calls.get(model_id, 0) + 1
+            return self._rng.random() < rate
+
+    def invoke_model(self, modelId, body, **kwargs):
+        throttled = self._record(modelId)
+        request = json.loads(body)
+        prompt = "".join(
+            part.get("text", "") for message in request.get("messages", []) for part in message.get("content", [])
+        )
+        if throttled:
+            raise ThrottlingException()
+
+        self.latency.sleep()
+        text = self.responder(prompt)
+        payload = {
+            "type": "message",
+            "role": "assistant",
+            "model": modelId,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": len(tokenize(prompt)), "output_tokens": len(tokenize(text))},
+        }
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8")), "contentType": "application/json"}
+
+    def invoke_model_with_response_stream(self, modelId, body, chunk_chars=16, **kwargs):
+        """
+        Streams the same answer as content_block_delta events of `chunk_chars`
+        characters, with the latency spread evenly over them.
+        """
+        throttled = self._record(modelId)
+        request = json.loads(body)
+        prompt = "".join(
+            part.get("text", "") for message in request.get("messages", []) for part in message.get("content", [])
+        )
+        if throttled:
+            raise ThrottlingException("InvokeModelWithResponseStream")
+
+        text = self.responder(prompt)
+        pieces = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+        return {"body": CannedStream(self.latency, pieces), "contentType": "application/json"}
+
+
+class CannedStream:
+    """
+    The EventStream of invoke_model_with_response_stream: iterable, and
+    close() stops it early. Each delta waits its share of one sampled latency.
+    """
+
+    def __init__(self, latency, pieces):
+        self.latency = latency
+        self.pieces = pieces
+        self.closed = False
+        self.sent = 0
+
+    def __iter__(self):
+        per_piece = SimulatedLatency(self.latency.latency_ms / len(self.pieces), self.latency.jitter_ms / len(self.pieces))
+        yield self._event({"type": "message_start"})
+        for piece in self.pieces:
+            if self.closed:
+                return
+            per_piece.sleep()
+            self.sent += 1
+            yield self._event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}})
+        yield self._event({"type": "message_stop"})
+
+    @staticmethod
+    def _event(payload):
+        return {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+    def close(self):
+        self.closed = True
+
+
+def install(mongo=None, embedder=None, bedrock=None):
+    """
+    Routes clients.py to the given stand-ins (a default one for each omitted)
+    and returns them as (mongo, embedder, bedrock).
+    """
+    mongo = mongo or InMemoryClient()
+    embedder = embedder or HashingEmbedder()
+    bedrock = bedrock or CannedBedrock()
+    clients.use_stand_ins(mongo=mongo, openai=embedder, bedrock=bedrock)
+    return mongo, embedder, bedrock
@@ -1,8 +1,42 @@
-from models import invoke_claude_x, get_tag
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models import invoke_claude_x_streaming, create_embeddings
 from hybrid_search import hybrid_search
+from query_cache import get_understanding, put_understanding
+from gazetteer import fast_path
+from timing import count, propagate
+
+UNDERSTANDING_TAGS = ("SEMANTIC_SEARCH_TEXT", "KEYWORD_SEARCH_TEXT", "KEYWORD_CATEGORIES")
+
+# Embeds the semantic text while the LLM is still writing the keyword tags
+_prefetch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="embed-prefetch")
+
 
+def parse_categories(text):
+    # '"cast", "genres"' -> ["cast", "genres"]
+    return [c.strip().strip('"').strip("'") for c in text.split(",") if c.strip().strip('"').strip("'")]
+
+
+def understand_query(user_input, on_semantic_text=None, degraded=None):
+    """
+    Extracts (semantic_search_text, keyword_search_text, keyword_categories) from the
+    user request. Structured queries are resolved locally by the gazetteer; the rest
+    go to the LLM, reusing a cached answer for repeated requests. The LLM answer is
+    streamed: `on_semantic_text(text)` is called as soon as the semantic tag closes,
+    and the stream is cut once all three tags are in. When the LLM gives no
+    semantic text (every model failed), the request itself is used for both texts
+    and "query_understanding" is appended to `degraded`.
+    """
+    local = fast_path(user_input)
+    if local is not None:
+        count("gazetteer_hits")
+        return local
 
-def intelligent_search(user_input, recent_history = "", last_attempt = False):
+    cached = get_understanding(user_input)
+    if cached is not None:
+        count("query_cache_hits")
+        return cached
 
     prompt = f"""
     # Movie Search Criteria Extraction
@@ -55,14 +89,48 @@ def intelligent_search(user_input, recent_history = "", last_attempt = False):
     <KEYWORD_CATEGORIES>"cast", "genres", "type"</KEYWORD_CATEGORIES>
     """
 
-    response = invoke_claude_x(prompt)
+    def on_tag(tag, value):
+        if tag == "SEMANTIC_SEARCH_TEXT" and on_semantic_text is not None and value:
+            on_semantic_text(value)
+
+    response, parser = invoke_claude_x_streaming(prompt, UNDERSTANDING_TAGS, on_tag)
+    semantic_search_text = parser.get("SEMANTIC_SEARCH_TEXT").strip() if parser is not None else ""
+    if not semantic_search_text:
+        # Every model failed or the answer had no semantic text: search the request as typed
+        print(f"[Agent] No query understanding ({response[:200]}), searching the raw request")
+        count("understanding_fallbacks")
+        if degraded is not None:
+            degraded.append("query_understanding")
+        request = " ".join(user_input.split())
+        return request, request, []
+
+    keyword_search_text = parser.get("KEYWORD_SEARCH_TEXT")
+    keyword_categories = parse_categories(parser.get("KEYWORD_CATEGORIES"))
+
+    # Only cache complete extractions; truncated answers are retried next time
+    if semantic_search_text and parser.done:
+        put_understanding(user_input, semantic_search_text, keyword_search_text, keyword_categories)
+
+    return semantic_search_text, keyword_search_text, keyword_categories
+
+
+def intelligent_search(user_input, recent_history = "", last_attempt = False, fields=None, failed_retrievers=None, degraded=None):
+    # A hedged LLM call can report the same semantic text twice; embed it once
+    prefetched = {}
+    lock = threading.Lock()
+
+    def prefetch(text):
+        with lock:
+            if text not in prefetched:
+                prefetched[text] = _prefetch_executor.submit(propagate(create_embeddings), text)
 
-    print(f"Model Response:\n{response}")
+    semantic_search_text, keyword_search_text, keyword_categories = understand_query(user_input, on_semantic_text=prefetch, degraded=degraded)
 
-    semantic_search_text = get_tag(response, "SEMANTIC_SEARCH_TEXT")
-    keyword_search_text = get_tag(response, "KEYWORD_SEARCH_TEXT")
-    keyword_categories = get_tag(response, "KEYWORD_CATEGORIES")
+    with lock:
+        future = prefetched.get(semantic_search_text)
+    query_vector = future.result() if future is not None else None
 
-    return hybrid_search(semantic_search_text,keyword_search_text=keyword_search_text,keyword_search_categories=keyword_categories)
+    return hybrid_search(semantic_search_text,keyword_search_text=keyword_search_text,keyword_search_categories=keyword_categories, fields=fields,
+                         query_vector=query_vector, failed_retrievers=failed_retrievers)
 
 
@@ -0,0 +1,195 @@
+"""
+Shared client registry for the Movie API Lambda.
+
+Fetches the application secret once (refreshing it after SECRET_TTL_SECONDS)
+and lazily builds a single pooled MongoClient, OpenAI client and Bedrock
+runtime client that every module reuses across warm invocations.
+
+Environment variables:
+- SECRET_NAME            → Secrets Manager secret holding MONGODB_URI / OPENAI_API_KEY
+- AWS_REGION             → region for Secrets Manager (default us-west-2)
+- SECRET_TTL_SECONDS     → seconds before the cached secret is re-fetched (default 900)
+- MONGO_MAX_POOL_SIZE    → maxPoolSize for the shared MongoClient (default 10)
+- MONGO_MIN_POOL_SIZE    → minPoolSize for the shared MongoClient (default 0)
+- MONGO_COMPRESSORS      → wire compressors, comma separated (e.g. "zstd,snappy,zlib")
+- MONGO_DATABASE         → database name (default sample_mflix)
+- VECTOR_BACKEND         → "atlas" ($vectorSearch, default) or "local" (vector_index.py)
+- BEDROCK_MAX_POOL_CONNECTIONS → HTTP connections the Bedrock client keeps (default 25)
+
+use_stand_ins swaps any of the three clients for a local stand-in for load
+tests and offline runs. The stand-ins themselves (backend/dev/stand_ins.py)
+are not part of the deployed bundle.
+"""
+
+import os
+import json
+import time
+import threading
+
+from timing import span, mongo_command_listener
+
+
+SECRET_TTL_SECONDS = int(os.environ.get("SECRET_TTL_SECONDS", 900))
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 10))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_COMPRESSORS = os.environ.get("MONGO_COMPRESSORS", "")
+MONGO_DATABASE = os.environ.get("MONGO_DATABASE", "sample_mflix")
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "atlas")
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", 25))
+
+_lock = threading.RLock()
+_secrets = None
+_secrets_fetched_at = 0.0
+_mongo_client = None
+_mongo_uri = None
+_openai_client = None
+_openai_api_key = None
+_bedrock_client = None
+_stand_ins = {}
+
+
+def use_stand_ins(mongo=None, openai=None, bedrock=None):
+    """
+    Serves the given stand-ins from get_mongo_client, get_openai_client and
+    get_bedrock_client; a stubbed client never reads the secret. Call with no
+    arguments to go back to the real services.
+    """
+    with _lock:
+        _stand_ins.clear()
+        for name, client in (("mongo", mongo), ("openai", openai), ("bedrock", bedrock)):
+            if client is not None:
+                _stand_ins[name] = client
+
+
+def get_secrets(force_refresh=False):
+    """
+    Returns the decoded application secret, fetching it from Secrets Manager
+    on first use and again once it is older than SECRET_TTL_SECONDS.
+    """
+    global _secrets, _secrets_fetched_at
+
+    with _lock:
+        expired = time.monotonic() - _secrets_fetched_at > SECRET_TTL_SECONDS
+        if _secrets is None or expired or force_refresh:
+            with span("secrets"):
+                import boto3
+
+                region_name = os.environ.get("AWS_REGION", "us-west-2")  # fallback default
+                session = boto3.session.Session()
+                secret_client = session.client(service_name="secretsmanager", region_name=region_name)
+
+                get_secret_value_response = secret_client.get_secret_value(SecretId=os.environ["SECRET_NAME"])
+                _secrets = json.loads(get_secret_value_response["SecretString"])
+                _secrets_fetched_at = time.monotonic()
+        return _secrets
+
+
+def get_mongo_client():
+    """
+    Returns the shared MongoClient. The client is rebuilt only when a secret
+    refresh hands back a different MONGODB_URI.
+    """
+    global _mongo_client, _mongo_uri
+
+    with _lock:
+        if "mongo" in _stand_ins:
+            return _stand_ins["mongo"]
+        uri = get_secrets()["MONGODB_URI"]
+        if _mongo_client is None or uri != _mongo_uri:
+            from pymongo.mongo_client import MongoClient
+            from pymongo.server_api import ServerApi
+
+            options = {
+                "server_api": ServerApi('1'),
+                "maxPoolSize": MONGO_MAX_POOL_SIZE,
+                "minPoolSize": MONGO_MIN_POOL_SIZE,
+                "event_listeners": [mongo_command_listener()],
+            }
+            if MONGO_COMPRESSORS:
+                options["compressors"] = MONGO_COMPRESSORS
+
+            previous = _mongo_client
+            _mongo_client = MongoClient(uri, **options)
+            _mongo_uri = uri
+            if previous is not None:
+                previous.close()
+        return _mongo_client
+
+
+def get_db(name=None):
+    return get_mongo_client()[name or MONGO_DATABASE]
+
+
+def get_collection(name="movies"):
+    return get_db()[name]
+
+
+def get_raw_collection(name="movies"):
+    """
+    The collection with RawBSONDocument results, for reads that are only
+    serialized back out (see bson_json).
+    """
+    from bson.codec_options import CodecOptions
+    from bson.raw_bson import RawBSONDocument
+    return get_collection(name).with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+
+
+def get_openai_client():
+    """
+    Returns the shared OpenAI client. The SDK is only imported on first use.
+    """
+    global _openai_client, _openai_api_key
+
+    with _lock:
+        if "openai" in _stand_ins:
+            return _stand_ins["openai"]
+        api_key = get_secrets()["OPENAI_API_KEY"]
+        if _openai_client is None or api_key != _openai_api_key:
+            from openai import OpenAI
+
+            _openai_client = OpenAI(api_key=api_key)
+            _openai_api_key = api_key
+        return _openai_client
+
+
+def get_bedrock_client():
+    """
+    Returns the shared Bedrock Runtime client. botocore clients are thread
+    safe, so one client with a connection pool serves every concurrent call.
+    Its own retries are off: llm_router fails over to another model instead
+    of retrying a throttled one, and retries read timeouts and connection
+    errors on the next model the same way.
+    """
+    global _bedrock_client
+
+    with _lock:
+        if "bedrock" in _stand_ins:
+            return _stand_ins["bedrock"]
+        if _bedrock_client is None:
+            import boto3
+            from botocore.config import Config
+
+            _bedrock_client = boto3.client("bedrock-runtime", config=Config(
+                max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+                retries={"mode": "standard", "max_attempts": 1},
+            ))
+        return _bedrock_client
+
+
+def reset():
+    """
+    Drops every cached secret and client. Used by benchmarks to simulate a cold start.
+    """
+    global _secrets, _secrets_fetched_at, _mongo_client, _mongo_uri
+    global _openai_client, _openai_api_key, _bedrock_client
+
+    with _lock:
+        if _mongo_client is not None:
+            _mongo_client.close()
+        _secrets = None
+        _secrets_fetched_at = 0.0
+        _mongo_client = None
+        _mongo_uri = None
+        _openai_client = None
+        _openai_api_key = None
+        _bedrock_client = None
@@ -0,0 +1,206 @@
+"""
+Two-tier cache for OpenAI embeddings.
+
+Entries are keyed by a SHA-256 of (model, dimensions, normalized text). Lookups
+hit an in-process LRU first and then a persistent store: a Mongo collection
+(default) or a local SQLite file. Vectors are persisted as packed float32.
+
+Environment variables:
+- EMBEDDING_CACHE_BACKEND      → "mongo" (default), "disk" or "none" for the persistent tier
+- EMBEDDING_CACHE_SIZE         → max entries kept in process (default 1024)
+- EMBEDDING_CACHE_TTL_SECONDS  → entry lifetime in both tiers (default 30 days)
+- EMBEDDING_CACHE_COLLECTION   → Mongo collection for the persistent tier (default embedding_cache)
+- EMBEDDING_CACHE_PATH         → SQLite file for the disk backend (default /tmp/embedding_cache.sqlite3)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from ttl_cache import TTLCache
+
+
+EMBEDDING_CACHE_BACKEND = os.environ.get("EMBEDDING_CACHE_BACKEND", "mongo")
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 1024))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.environ.get("EMBEDDING_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+EMBEDDING_CACHE_COLLECTION = os.environ.get("EMBEDDING_CACHE_COLLECTION", "embedding_cache")
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "/tmp/embedding_cache.sqlite3")
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", str(text)).split())
+
+
+def embedding_key(text, model, dimensions=None):
+    raw = f"{model}\x00{dimensions or ''}\x00{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector):
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data):
+    values = array("f")
+    values.frombytes(bytes(data))
+    return values.tolist()
+
+
+class MongoEmbeddingStore:
+    """
+    Persistent tier backed by a Mongo collection with a TTL index on expires_at.
+    """
+
+    def __init__(self, collection, ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._indexed = False
+
+    def _ensure_index(self):
+        if not self._indexed:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+
+    def get_many(self, keys):
+        now = datetime.now(timezone.utc)
+        found = {}
+        cursor = self.collection.find(
+            {"_id": {"$in": list(keys)}, "expires_at": {"$gt": now}},
+            {"vector": 1}
+        )
+        for doc in cursor:
+            found[doc["_id"]] = unpack_vector(doc["vector"])
+        return found
+
+    def put_many(self, entries):
+        if not entries:
+            return
+        from bson.binary import Binary
+        from pymongo import UpdateOne
+
+        self._ensure_index()
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        ops = [
+            UpdateOne(
+                {"_id": key},
+                {"$set": {"vector": Binary(pack_vector(vector)), "expires_at": expires_at}},
+                upsert=True
+            )
+            for key, vector in entries.items()
+        ]
+        self.collection.bulk_write(ops, ordered=False)
+
+
+class DiskEmbeddingStore:
+    """
+    Persistent tier backed by a local SQLite file (e.g. /tmp in Lambda or a dev laptop).
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB, expires_at REAL)"
+        )
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders}) AND expires_at > ?",
+                keys + [time.time()]
+            ).fetchall()
+        return {key: unpack_vector(vector) for key, vector in rows}
+
+    def put_many(self, entries):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, expires_at) VALUES (?, ?, ?)",
+                [(key, pack_vector(vector), expires_at) for key, vector in entries.items()]
+            )
+            self._conn.commit()
+
+
+class EmbeddingCache:
+    def __init__(self, store=None, max_size=EMBEDDING_CACHE_SIZE, ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS):
+        self.store = store
+        self.memory = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "store_errors": 0}
+
+    def get(self, text, model, dimensions=None):
+        return self.get_many([text], model, dimensions)[0]
+
+    def put(self, text, model, vector, dimensions=None):
+        self.put_many([text], [vector], model, dimensions)
+
+    def get_many(self, texts, model, dimensions=None):
+        """
+        Returns one vector per text, or None where neither tier has it.
+        """
+        keys = [embedding_key(text, model, dimensions) for text in texts]
+        vectors = [self.memory.get(key) for key in keys]
+        self.stats["memory_hits"] += sum(v is not None for v in vectors)
+
+        missing = {key for key, vector in zip(keys, vectors) if vector is None}
+        if missing and self.store is not None:
+            try:
+                found = self.store.get_many(missing)
+            except Exception as e:
+                print(f"[Embedding Cache] Store lookup failed: {e}")
+                self.stats["store_errors"] += 1
+                found = {}
+            for key, vector in found.items():
+                self.memory.put(key, vector)
+            vectors = [found.get(key, vector) if vector is None else vector for key, vector in zip(keys, vectors)]
+            self.stats["store_hits"] += len(found)
+
+        self.stats["misses"] += sum(v is None for v in vectors)
+        return vectors
+
+    def put_many(self, texts, vectors, model, dimensions=None):
+        entries = {
+            embedding_key(text, model, dimensions): vector
+            for text, vector in zip(texts, vectors)
+            if vector is not None
+        }
+        for key, vector in entries.items():
+            self.memory.put(key, vector)
+        if entries and self.store is not None:
+            try:
+                self.store.put_many(entries)
+            except Exception as e:
+                print(f"[Embedding Cache] Store write failed: {e}")
+                self.stats["store_errors"] += 1
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide cache, creating its persistent tier from
+    EMBEDDING_CACHE_BACKEND on first use.
+    """
+    global _default_cache
+
+    with _default_lock:
+        if _default_cache is None:
+            store = None
+            if EMBEDDING_CACHE_BACKEND == "mongo":
+                from clients import get_collection
+                store = MongoEmbeddingStore(get_collection(EMBEDDING_CACHE_COLLECTION))
+            elif EMBEDDING_CACHE_BACKEND == "disk":
+                store = DiskEmbeddingStore(EMBEDDING_CACHE_PATH)
+            _default_cache = EmbeddingCache(store=store)
+        return _default_cache
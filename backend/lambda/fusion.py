@@ -0,0 +1,251 @@
+"""
+Multi-retriever fusion engine.
+
+Runs any set of retrievers concurrently — the contextual and narrative
+vector searches and the `movies_text_search_v2` full-text search — each
+returning only ranked `_id`s and raw scores, fuses their candidate arrays
+with NumPy, and hydrates just the final top documents with one `$in` lookup.
+
+Fusion methods:
+- rrf         → sum of weight / (rank + k)
+- combsum     → weighted sum of raw retriever scores
+- normalized  → weighted sum of min-max normalized retriever scores
+
+Environment variables (per-request arguments take precedence):
+- FUSION_METHOD          → default method (default "rrf")
+- FUSION_RRF_K           → RRF rank constant (default 40)
+- FUSION_WEIGHTS         → e.g. "contextual=0.3,narrative=0.5,text=0.2"; unset retrievers
+                           get the adaptive defaults from default_weights
+- FUSION_DEPTHS          → e.g. "text=40"; candidates per retriever (default FUSION_DEPTH)
+- FUSION_DEPTH           → default candidates per retriever (default 20)
+- FUSION_NUM_CANDIDATES  → minimum ANN numCandidates for vector retrievers (default 100)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from clients import get_collection, VECTOR_BACKEND
+from models import embedding_field, vector_index_name
+from projections import build_projection
+from timing import span, propagate
+
+
+RETRIEVERS = ("contextual", "narrative", "text")
+VECTOR_RETRIEVERS = ("contextual", "narrative")
+FUSION_METHODS = ("rrf", "combsum", "normalized")
+
+DEFAULT_KEYWORD_CATEGORIES = ["genres", "cast", "directors", "languages", "year", "rated", "type"]
+
+
+def parse_mapping(value, cast=float):
+    """
+    Parses "name=value,name=value" into a dict, ignoring unknown retriever names.
+    """
+    mapping = {}
+    for part in (value or "").split(","):
+        name, _, raw = part.partition("=")
+        if name.strip() in RETRIEVERS and raw.strip():
+            mapping[name.strip()] = cast(raw)
+    return mapping
+
+
+FUSION_METHOD = os.environ.get("FUSION_METHOD", "rrf")
+FUSION_RRF_K = int(os.environ.get("FUSION_RRF_K", 40))
+FUSION_WEIGHTS = parse_mapping(os.environ.get("FUSION_WEIGHTS"))
+FUSION_DEPTH = int(os.environ.get("FUSION_DEPTH", 20))
+FUSION_DEPTHS = parse_mapping(os.environ.get("FUSION_DEPTHS"), int)
+FUSION_NUM_CANDIDATES = int(os.environ.get("FUSION_NUM_CANDIDATES", 100))
+
+
+def default_weights(text, keyword_search_text, retrievers, overrides=None):
+    """
+    The lexical branch gets 0.2 for long natural-language queries and 0.5 when
+    the query is short or was rewritten into keywords; the rest is split
+    evenly across the vector retrievers. FUSION_WEIGHTS and `overrides` win.
+    """
+    vectors = [name for name in retrievers if name in VECTOR_RETRIEVERS]
+    weights = {}
+    if "text" in retrievers:
+        lexical_share = 0.5 if keyword_search_text != text or len(text) < 20 else 0.2
+        weights["text"] = lexical_share if vectors else 1.0
+    else:
+        lexical_share = 0.0
+    for name in vectors:
+        weights[name] = (1.0 - lexical_share) / len(vectors)
+
+    for source in (FUSION_WEIGHTS, overrides or {}):
+        weights.update({name: weight for name, weight in source.items() if name in retrievers})
+    return weights
+
+
+def retriever_depths(retrievers, minimum=0, overrides=None):
+    depths = {name: max(FUSION_DEPTHS.get(name, FUSION_DEPTH), minimum) for name in retrievers}
+    depths.update({name: depth for name, depth in (overrides or {}).items() if name in retrievers})
+    return depths
+
+
+def vector_retriever_pipeline(kind, query_vector, depth, filters=None, num_candidates=None):
+    num_candidates = max(num_candidates or FUSION_NUM_CANDIDATES, depth)
+    stages = None
+    if VECTOR_BACKEND == "local":
+        from vector_index import local_vector_search_stages
+        stages = local_vector_search_stages(
+            query_vector, embedding_field(kind), depth, num_candidates=num_candidates, filters=filters
+        )
+        score = "$vector_search_score"
+    if stages is None:
+        stage = {
+            "index": vector_index_name(),
+            "path": embedding_field(kind),
+            "queryVector": query_vector,
+            "numCandidates": num_candidates,
+            "limit": depth
+        }
+        if filters:
+            stage["filter"] = filters
+        stages = [{"$vectorSearch": stage}]
+        score = {"$meta": "vectorSearchScore"}
+    return stages + [{"$project": {"_id": 1, "score": score}}]
+
+
+def text_retriever_pipeline(keyword_search_text, keyword_search_categories, depth):
+    return [
+        {"$search": {
+            "index": "movies_text_search_v2",
+            "text": {"query": keyword_search_text, "path": keyword_search_categories}
+        }},
+        {"$limit": depth},
+        {"$project": {"_id": 1, "score": {"$meta": "searchScore"}}},
+    ]
+
+
+class RetrieverError(RuntimeError):
+    """
+    Raised when every retriever of a search failed.
+    """
+
+
+def run_retrievers(pipelines, collection=None, failed=None):
+    """
+    Runs {name: pipeline} concurrently. Returns {name: (ids, scores)} in rank
+    order. A failed retriever contributes no candidates and its name is
+    appended to `failed`; RetrieverError is raised when all of them fail.
+    """
+    collection = collection if collection is not None else get_collection("movies")
+    errors = {}
+
+    def run(name):
+        try:
+            with span(f"retriever_{name}"):
+                docs = list(collection.aggregate(pipelines[name]))
+        except Exception as e:
+            print(f"[Fusion] Retriever {name} failed: {e}")
+            errors[name] = e
+            docs = []
+        return [doc["_id"] for doc in docs], np.array([doc.get("score", 0.0) for doc in docs], dtype=float)
+
+    if len(pipelines) == 1:
+        name = next(iter(pipelines))
+        ranked = {name: run(name)}
+    else:
+        with ThreadPoolExecutor(max_workers=len(pipelines)) as executor:
+            futures = {name: executor.submit(propagate(run), name) for name in pipelines}
+            ranked = {name: future.result() for name, future in futures.items()}
+
+    if errors and len(errors) == len(pipelines):
+        raise RetrieverError("All retrievers failed: " + "; ".join(f"{name}: {e}" for name, e in errors.items()))
+    if failed is not None:
+        failed.extend(name for name in pipelines if name in errors)
+    return ranked
+
+
+def fuse(ranked, weights, method="rrf", rrf_k=40):
+    """
+    Fuses {name: (ids, scores)} into (ids, fused_scores, contributions), best
+    first. `contributions` has one weighted row per retriever, in `ranked`
+    order, aligned with the returned ids. Ties keep first-seen order.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method '{method}'")
+
+    names = list(ranked)
+    ids = list(dict.fromkeys(_id for name in names for _id in ranked[name][0]))
+    if not ids:
+        return [], np.zeros(0), np.zeros((len(names), 0))
+    position = {_id: i for i, _id in enumerate(ids)}
+
+    contributions = np.zeros((len(names), len(ids)))
+    for row, name in enumerate(names):
+        retriever_ids, scores = ranked[name]
+        if not retriever_ids:
+            continue
+        if method == "rrf":
+            values = 1.0 / (np.arange(len(retriever_ids)) + rrf_k)
+        elif method == "combsum":
+            values = scores
+        else:
+            low, high = scores.min(), scores.max()
+            values = (scores - low) / (high - low) if high > low else np.ones_like(scores)
+        columns = np.fromiter((position[_id] for _id in retriever_ids), dtype=np.intp, count=len(retriever_ids))
+        # A repeated id keeps its best contribution
+        np.maximum.at(contributions[row], columns, weights.get(name, 0.0) * values)
+
+    fused = contributions.sum(axis=0)
+    order = np.argsort(-fused, kind="stable")
+    return [ids[i] for i in order], fused[order], contributions[:, order]
+
+
+def hydrate(ids, score_fields, fields=None, collection=None):
+    """
+    Reads the documents for `ids` with one $in lookup and merges in the
+    per-result score fields, keeping the order of `ids`.
+    """
+    if not ids:
+        return []
+    collection = collection if collection is not None else get_collection("movies")
+    with span("hydrate"):
+        docs = {doc["_id"]: doc for doc in collection.find({"_id": {"$in": ids}}, build_projection(fields))}
+    return [{**docs[_id], **scores} for _id, scores in zip(ids, score_fields) if _id in docs]
+
+
+def fused_search(text, query_vector, retrievers=RETRIEVERS, keyword_search_text="", keyword_search_categories=None,
+                 limit=10, fields=None, method=None, weights=None, depths=None, rrf_k=None, min_depth=0, filters=None,
+                 failed_retrievers=None):
+    """
+    Runs `retrievers` concurrently, fuses them and returns the top `limit`
+    documents with `score`, `vs_score` (vector contributions) and
+    `fts_score` (text contribution). Retrievers that failed are appended to
+    `failed_retrievers`; see run_retrievers.
+    """
+    keyword_search_text = keyword_search_text or text
+    keyword_search_categories = keyword_search_categories or DEFAULT_KEYWORD_CATEGORIES
+    method = method or FUSION_METHOD
+    rrf_k = FUSION_RRF_K if rrf_k is None else rrf_k
+    weights = default_weights(text, keyword_search_text, retrievers, weights)
+    depths = retriever_depths(retrievers, min_depth, depths)
+
+    pipelines = {}
+    for name in retrievers:
+        if name == "text":
+            pipelines[name] = text_retriever_pipeline(keyword_search_text, keyword_search_categories, depths[name])
+        else:
+            pipelines[name] = vector_retriever_pipeline(name, query_vector, depths[name], filters)
+
+    ranked = run_retrievers(pipelines, failed=failed_retrievers)
+    ids, fused, contributions = fuse(ranked, weights, method, rrf_k)
+
+    names = list(ranked)
+    vector_rows = [row for row, name in enumerate(names) if name in VECTOR_RETRIEVERS]
+    text_rows = [row for row, name in enumerate(names) if name == "text"]
+    top = min(limit, len(ids))
+    score_fields = [
+        {
+            "score": float(fused[i]),
+            "vs_score": float(contributions[vector_rows, i].sum()),
+            "fts_score": float(contributions[text_rows, i].sum()),
+        }
+        for i in range(top)
+    ]
+    return hydrate(ids[:top], score_fields, fields)
@@ -0,0 +1,285 @@
+"""
+Local gazetteer fast path for agent=true searches.
+
+Builds a dictionary of the catalog's distinct `cast`, `directors`, `genres`,
+`rated` and `type` values and compiles it into a word-level Aho-Corasick
+automaton. A structured query such as "Tom Hanks comedies from 1994" is then
+resolved into keyword text and categories locally in one pass over its
+tokens, and the Bedrock extraction is only needed when words remain that the
+gazetteer cannot explain (free-form narrative content).
+
+The gazetteer is built inline by the first agent request that needs it,
+and again once it is older than GAZETTEER_REBUILD_SECONDS. No background
+thread is involved, since Lambda freezes the sandbox between invocations.
+The build is bounded by GAZETTEER_BUILD_TIMEOUT_MS: each `distinct` call
+gets what is left of it as maxTimeMS. A build that fails or runs out of time
+sends that request to the LLM, and the next attempt waits
+GAZETTEER_RETRY_SECONDS. Concurrent requests (server.py) do not wait for a
+build in progress; they use the previous gazetteer, or the LLM.
+
+New terms from movies written through this container are inserted into the
+trie as they arrive (the failure links are recomputed lazily on the next
+match); other containers pick them up at their next rebuild.
+
+Environment variables:
+- GAZETTEER_ENABLED           → "false" to always use the LLM (default "true")
+- GAZETTEER_REBUILD_SECONDS   → full rebuild interval (default 3600)
+- GAZETTEER_RETRY_SECONDS     → wait after a failed build before trying again (default 60)
+- GAZETTEER_BUILD_TIMEOUT_MS  → time budget of one build (default 1500, 0 for none)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+
+
+GAZETTEER_ENABLED = os.environ.get("GAZETTEER_ENABLED", "true") == "true"
+GAZETTEER_REBUILD_SECONDS = int(os.environ.get("GAZETTEER_REBUILD_SECONDS", 3600))
+GAZETTEER_RETRY_SECONDS = int(os.environ.get("GAZETTEER_RETRY_SECONDS", 60))
+GAZETTEER_BUILD_TIMEOUT_MS = int(os.environ.get("GAZETTEER_BUILD_TIMEOUT_MS", 1500))
+
+GAZETTEER_FIELDS = ["cast", "directors", "genres", "rated", "type"]
+
+# Words that carry no search intent on their own
+FILLER_WORDS = {
+    "a", "an", "the", "and", "or", "with", "from", "in", "of", "by", "for", "to", "on",
+    "movie", "movies", "film", "films", "show", "shows", "title", "titles",
+    "me", "find", "give", "list", "search", "looking", "want", "please", "some", "any", "all",
+    "starring", "featuring", "feature", "features", "directed", "director", "directors",
+    "actor", "actors", "actress", "cast", "released", "year", "years", "rated", "rating",
+    "genre", "genres", "type", "made", "i", "im", "like", "good", "best", "top",
+}
+
+TOKEN_PATTERN = re.compile(r"[\w'\-\.]+", re.UNICODE)
+YEAR_PATTERN = re.compile(r"^(18|19|20)\d{2}$")
+
+
+def tokenize(text):
+    return [t.strip(".'-").casefold() for t in TOKEN_PATTERN.findall(text) if t.strip(".'-")]
+
+
+def genre_variants(term):
+    # "Comedy" also matches "comedies", "Thriller" also matches "thrillers"
+    lower = term.casefold()
+    if lower.endswith("y"):
+        return [lower, lower[:-1] + "ies"]
+    if lower.endswith("s"):
+        return [lower]
+    return [lower, lower + "s"]
+
+
+class WordAhoCorasick:
+    """
+    Aho-Corasick automaton over word tokens. Patterns are token tuples and
+    matches are reported as (start_token, end_token, payload).
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self._dirty = False
+
+    def add(self, tokens, payload):
+        node = 0
+        for token in tokens:
+            nxt = self.goto[node].get(token)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][token] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = nxt
+        if payload not in self.output[node]:
+            self.output[node].append(payload)
+        self._dirty = True
+
+    def build(self):
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and token not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(token, 0)
+        self._dirty = False
+
+    def find(self, tokens):
+        if self._dirty:
+            self.build()
+        matches = []
+        node = 0
+        for position, token in enumerate(tokens):
+            while node and token not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(token, 0)
+            state = node
+            while state:
+                for length, payload in self.output[state]:
+                    matches.append((position - length + 1, position + 1, payload))
+                state = self.fail[state]
+        return matches
+
+
+class Gazetteer:
+    def __init__(self):
+        self.automaton = WordAhoCorasick()
+        self.terms = 0
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+
+    def add_term(self, category, value):
+        if not isinstance(value, str) or len(value.strip()) < 2:
+            return
+        variants = genre_variants(value) if category in ("genres", "type") else [value]
+        for variant in variants:
+            tokens = tokenize(variant)
+            if tokens:
+                self.automaton.add(tokens, (len(tokens), (category, value.strip())))
+                self.terms += 1
+
+    def add_document(self, doc):
+        """
+        Inserts the terms of a written movie; failure links are rebuilt on the next match.
+        """
+        with self._lock:
+            for category in GAZETTEER_FIELDS:
+                values = doc.get(category)
+                for value in values if isinstance(values, list) else [values]:
+                    self.add_term(category, value)
+
+    def load(self, collection, timeout_ms=0):
+        """
+        Reads the distinct values of GAZETTEER_FIELDS and compiles them. With
+        `timeout_ms`, raises TimeoutError once the reads have used it up.
+        """
+        start = time.perf_counter()
+        values = {}
+        for category in GAZETTEER_FIELDS:
+            options = {}
+            if timeout_ms:
+                remaining_ms = int(timeout_ms - (time.perf_counter() - start) * 1000)
+                if remaining_ms <= 0:
+                    raise TimeoutError(f"Gazetteer build exceeded {timeout_ms}ms")
+                options["maxTimeMS"] = remaining_ms
+            values[category] = collection.distinct(category, **options)
+
+        with self._lock:
+            for category in GAZETTEER_FIELDS:
+                for value in values[category]:
+                    self.add_term(category, value)
+            self.automaton.build()
+            self.built_at = time.monotonic()
+        print(f"[Gazetteer] Built {self.terms} terms in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return self
+
+    def match(self, text):
+        """
+        Returns (keyword_search_text, keyword_search_categories, residual_tokens).
+        Overlapping matches are resolved longest-first.
+        """
+        tokens = tokenize(text)
+        with self._lock:
+            matches = self.automaton.find(tokens)
+
+        matches.sort(key=lambda m: (-(m[1] - m[0]), m[0]))
+        taken = [False] * len(tokens)
+        terms = []
+        categories = []
+        for start, end, (category, value) in matches:
+            if any(taken[start:end]):
+                continue
+            for i in range(start, end):
+                taken[i] = True
+            terms.append((start, value))
+            if category not in categories:
+                categories.append(category)
+
+        for i, token in enumerate(tokens):
+            if not taken[i] and YEAR_PATTERN.match(token):
+                taken[i] = True
+                terms.append((i, token))
+                if "year" not in categories:
+                    categories.append("year")
+
+        residual = [t for i, t in enumerate(tokens) if not taken[i] and t not in FILLER_WORDS]
+        keyword_text = " ".join(value for _, value in sorted(terms))
+        return keyword_text, categories, residual
+
+
+_gazetteer = None
+_build_started_at = None
+_building = False
+_gazetteer_lock = threading.Lock()
+
+
+def _build():
+    global _gazetteer, _building
+    try:
+        from clients import get_collection
+        gazetteer = Gazetteer().load(get_collection("movies"), GAZETTEER_BUILD_TIMEOUT_MS)
+        with _gazetteer_lock:
+            _gazetteer = gazetteer
+        return gazetteer
+    except Exception as e:
+        print(f"[Gazetteer] Build failed: {e}")
+        return None
+    finally:
+        with _gazetteer_lock:
+            _building = False
+
+
+def get_gazetteer():
+    """
+    Returns the current gazetteer, or None when there is none yet. When there
+    is none or it is older than GAZETTEER_REBUILD_SECONDS, this call builds
+    it first (see the module docstring for the bounds); a build already in
+    progress is not waited for.
+    """
+    global _build_started_at, _building
+
+    with _gazetteer_lock:
+        now = time.monotonic()
+        stale = _gazetteer is None or now - _gazetteer.built_at > GAZETTEER_REBUILD_SECONDS
+        retry_due = _build_started_at is None or now - _build_started_at > GAZETTEER_RETRY_SECONDS
+        build = stale and retry_due and not _building
+        if build:
+            _building = True
+            _build_started_at = now
+        current = _gazetteer
+
+    if build:
+        current = _build() or current
+    return current
+
+
+def fast_path(user_input):
+    """
+    Returns (semantic_search_text, keyword_search_text, keyword_categories) when the
+    query is fully explained by catalog terms, years and filler words; otherwise None.
+    """
+    if not GAZETTEER_ENABLED:
+        return None
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return None
+    try:
+        keyword_text, categories, residual = gazetteer.match(user_input)
+    except Exception as e:
+        print(f"[Gazetteer] Match failed, falling back to the LLM: {e}")
+        return None
+    if residual or not categories:
+        return None
+    return " ".join(user_input.split()), keyword_text, categories
+
+
+def add_document(doc):
+    # Only update a gazetteer this instance has already built
+    if _gazetteer is not None:
+        _gazetteer.add_document(doc)
@@ -1,75 +1,24 @@
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-import time
+from clients import get_collection, VECTOR_BACKEND
+from models import create_embeddings, embedding_field, vector_index_name
+from projections import build_projection, with_rerank_fields, strip_fields
+from fusion import fused_search, default_weights, retriever_depths, FUSION_METHOD, FUSION_RRF_K, DEFAULT_KEYWORD_CATEGORIES
+from timing import span
 import os
-import json
-import boto3
-from openai import OpenAI
-from models import create_embeddings
 
-# Get secret name from environment variable
-secret_name = os.environ["SECRET_NAME"]
-region_name = os.environ.get("AWS_REGION", "us-west-2")  # fallback default
 
-# Create a Secrets Manager client
-session = boto3.session.Session()
-secret_client = session.client(service_name="secretsmanager", region_name=region_name)
+# "ids" runs the fusion engine (_id-only retrievers fused in Python, winners hydrated);
+# "pipeline" runs the original in-aggregation RRF over full documents
+HYBRID_FUSION = os.environ.get("HYBRID_FUSION", "ids")
+HYBRID_RETRIEVERS = ("narrative", "text")
 
-# Retrieve secret value
-get_secret_value_response = secret_client.get_secret_value(SecretId=secret_name)
-secrets = json.loads(get_secret_value_response["SecretString"])
 
-# Use the new OpenAI API key
-openai_api_key = secrets["OPENAI_API_KEY"]
-uri = secrets["MONGODB_URI"]
-
-# Create OpenAI client
-client = OpenAI(api_key=openai_api_key)
-
-# Connect to MongoDB
-mongo_client = MongoClient(uri, server_api=ServerApi('1'))
-
-
-
-def hybrid_search(text, keyword_search_text = "", keyword_search_categories = [], limit=10, reranking = False):
-
-    if keyword_search_text == "":
-        keyword_search_text = text
-
-    if len(keyword_search_categories) == 0:
-        keyword_search_categories = ["genres", "cast", "directors", "languages", "year" , "rated", "type"]
-
-    print(f"Running hybrid search for:\nnarrative search: {text}\nkeyword search: {keyword_search_text}\nkeyword search categories: {keyword_search_categories}")
-    
-    database_name = "sample_mflix"
-    collection_name = "movies"
-    db = mongo_client[database_name]
-    collection = db[collection_name]
-
-    search_embedding = create_embeddings(text)
-    if not search_embedding:
-        return []
-
-    vector_weight = 0.8
-    fulltext_weight = 0.2
-    rrf_k = 40  # for Reciprocal Rank Fusion
-
-    if keyword_search_text != text or len(text)<20:
-        fulltext_weight = 0.5
-        vector_weight = 0.5
-
-
-
-    pipeline = [
-        {
-            "$vectorSearch": {
-                "index": "vector_index",
-                "path": "narrative_embeddings",
-                "queryVector": search_embedding,
-                "numCandidates": 100,
-                "limit": 20
-            }
-        },
+def build_document_fusion_pipeline(vector_stages, keyword_search_text, keyword_search_categories,
+                                   branch_limit, fetch_limit, vector_weight, fulltext_weight, rrf_k, project_fields):
+    """
+    RRF computed inside the aggregation: each branch pushes its full documents
+    through $group/$unwind to get ranks before they are merged by _id.
+    """
+    return vector_stages + [
         {"$group": {"_id": None, "docs": {"$push": "$$ROOT"}}},
         {"$unwind": {"path": "$docs", "includeArrayIndex": "rank"}},
         {
@@ -102,7 +51,7 @@ def hybrid_search(text, keyword_search_text = "", keyword_search_categories = []
                             }
                         }
                     },
-                    {"$limit": 20},
+                    {"$limit": branch_limit},
                     {"$group": {"_id": None, "docs": {"$push": "$$ROOT"}}},
                     {"$unwind": {"path": "$docs", "includeArrayIndex": "rank"}},
                     {"$replaceRoot": {
@@ -121,30 +70,7 @@ def hybrid_search(text, keyword_search_text = "", keyword_search_categories = []
                             ]
                         }
                     }},
-                    {"$project": {
-                        "_id": 1,
-                        "title": 1,
-                        "plot": 1,
-                        "fullplot": 1,
-                        "genres": 1,
-                        "runtime": 1,
-                        "cast": 1,
-                        "poster": 1,
-                        "languages": 1,
-                        "released": 1,
-                        "directors": 1,
-                        "rated": 1,
-                        "awards": 1,
-                        "year": 1,
-                        "imdb": 1,
-                        "countries": 1,
-                        "type": 1,
-                        "tomatoes": 1,
-                        "num_mflix_comments": 1,
-                        "lastupdated": 1,
-                        "fts_score": 1,
-                        "vs_score": 1
-                    }}
+                    {"$project": build_projection(project_fields, extra=("fts_score", "vs_score"))}
                 ]
             }
         },
@@ -165,55 +91,84 @@ def hybrid_search(text, keyword_search_text = "", keyword_search_categories = []
             }}
         },
         {"$project": {
-            "_id": 1,
-            "title": 1,
-            "plot": 1,
-            "fullplot": 1,
-            "genres": 1,
-            "runtime": 1,
-            "cast": 1,
-            "poster": 1,
-            "languages": 1,
-            "released": 1,
-            "directors": 1,
-            "rated": 1,
-            "awards": 1,
-            "year": 1,
-            "imdb": 1,
-            "countries": 1,
-            "type": 1,
-            "tomatoes": 1,
-            "num_mflix_comments": 1,
-            "lastupdated": 1,
-            "score": {"$add": ["$vs_score", "$fts_score"]},
-            "vs_score": 1,
-            "fts_score": 1
+            **build_projection(project_fields, extra=("vs_score", "fts_score")),
+            "score": {"$add": ["$vs_score", "$fts_score"]}
         }},
         {"$sort": {"score": -1}},
-        {"$limit": limit}
+        {"$limit": fetch_limit}
     ]
 
-    results = list(collection.aggregate(pipeline))
 
-    #removes duplicate by _id
-    results = list({doc['_id']: doc for doc in results}.values())
+def hybrid_search(text, keyword_search_text = "", keyword_search_categories = [], limit=10, reranking = False, fields=None,
+                  retrievers=None, method=None, weights=None, query_vector=None, failed_retrievers=None):
+    """
+    Fuses vector and full-text retrievers (narrative + text by default; any of
+    contextual, narrative and text via `retrievers`) with the fusion engine.
+    `query_vector` is the embedding of `text` when the caller already has it.
+    Retrievers that failed, leaving the results partial, are appended to
+    `failed_retrievers`; if all of them fail fusion.RetrieverError is raised.
+    """
+    retrievers = tuple(retrievers or HYBRID_RETRIEVERS)
+
+    if keyword_search_text == "":
+        keyword_search_text = text
+
+    if len(keyword_search_categories) == 0:
+        keyword_search_categories = DEFAULT_KEYWORD_CATEGORIES
+
+    collection = get_collection("movies")
+
+    search_embedding = query_vector or create_embeddings(text)
+    if not search_embedding:
+        return []
 
-    log_output = ["\n--- Final Scores ---"]
-    for doc in results:
-        title = doc.get('title', 'N/A')
-        score = doc.get('score', 0)
-        vs_score = doc.get('vs_score', 0)
-        fts_score = doc.get('fts_score', 0)
+    # Over-fetch when a rerank stage will reorder the candidates
+    fetch_limit = limit
+    min_depth = 0
+    project_fields = fields
+    if reranking:
+        from reranking import candidate_limit
+        fetch_limit = candidate_limit(limit)
+        min_depth = fetch_limit
+        project_fields = with_rerank_fields(fields)
+
+    legacy_pipeline = HYBRID_FUSION == "pipeline" and retrievers == HYBRID_RETRIEVERS and (method or FUSION_METHOD) == "rrf"
+    if not legacy_pipeline:
+        results = fused_search(
+            text, search_embedding, retrievers, keyword_search_text, keyword_search_categories,
+            limit=fetch_limit, fields=project_fields, method=method, weights=weights, min_depth=min_depth,
+            failed_retrievers=failed_retrievers
+        )
+    else:
+        fusion_weights = default_weights(text, keyword_search_text, retrievers, weights)
+        branch_limit = retriever_depths(retrievers, min_depth)["narrative"]
+        vector_stages = None
+        if VECTOR_BACKEND == "local":
+            from vector_index import local_vector_search_stages
+            vector_stages = local_vector_search_stages(search_embedding, embedding_field("narrative"), branch_limit, num_candidates=max(100, branch_limit))
+        if vector_stages is None:
+            vector_stages = [{
+                "$vectorSearch": {
+                    "index": vector_index_name(),
+                    "path": embedding_field("narrative"),
+                    "queryVector": search_embedding,
+                    "numCandidates": max(100, branch_limit),
+                    "limit": branch_limit
+                }
+            }]
 
-        log_output.append(
-            f"Title: {title}\n"
-            f"  Combined Score: {score:.8f} "
-            f"  Vector Score:   {vs_score:.8f} "
-            f"  Fulltext Score: {fts_score:.8f} "
-            + "-" * 40
+        pipeline = build_document_fusion_pipeline(
+            vector_stages, keyword_search_text, keyword_search_categories, branch_limit, fetch_limit,
+            fusion_weights["narrative"], fusion_weights["text"], FUSION_RRF_K, project_fields
         )
+        with span("hybrid_pipeline"):
+            results = list(collection.aggregate(pipeline))
 
-    #print("\n".join(log_output))
+        #removes duplicate by _id
+        results = list({doc['_id']: doc for doc in results}.values())
 
+    if reranking:
+        from reranking import rerank
+        results = strip_fields(rerank(text, search_embedding, results, limit), fields)
 
     return results
@@ -0,0 +1,452 @@
+"""
+Adaptive router over the Bedrock Claude model IDs (models.CLAUDE_MODEL_IDS).
+
+Every call's outcome updates its model's EWMA latency, throttle rate and
+error rate. Each request goes to the model with the lowest expected time to
+a successful answer, EWMA latency / (1 - throttle rate - error rate), so a
+throttled model loses traffic without being tried first each time. Models
+with no samples yet are tried first so every model gets measured.
+
+Circuit breaker per model: LLM_BREAKER_THRESHOLD throttles in a row open it
+and take it out of rotation. After LLM_BREAKER_COOLDOWN_SECONDS it is half
+open, and the next request goes to it as the only probe. Success closes the
+circuit and any failure opens it again.
+
+`stats()` returns the per-model state. Every LLM_STATS_LOG_SECONDS the router
+also prints one CloudWatch EMF line per model.
+
+Hedging (opt-in, LLM_HEDGING=true): when the chosen model has not answered
+within its observed p{LLM_HEDGE_PERCENTILE} latency, the same request also
+goes to the next best model. The first complete answer wins and the other
+call is abandoned; an in-flight HTTP request cannot be aborted, so the loser
+stops failing over and its response is closed unread when it arrives. Each
+call earns LLM_HEDGE_MAX_RATE of a hedge token and a hedge spends a whole
+one, so at most that share of calls is hedged.
+
+`stream` is the invoke_model_with_response_stream variant: the caller's
+parser sees the text as it arrives and the stream is closed as soon as the
+parser has what it needs. A hedged stream loser is closed mid-generation.
+
+Latency is tracked per call kind: "invoke" samples are complete answers and
+"stream" samples the time until the caller's parser was satisfied, so an
+early-closed stream never drags down the invoke latency that routing and
+hedge deadlines use for invoke calls. An abandoned hedge loser counts as a
+success but adds no latency sample.
+
+Environment variables:
+- LLM_EWMA_ALPHA                 → weight of the newest sample (default 0.2)
+- LLM_BREAKER_THRESHOLD          → consecutive throttles that open a circuit (default 3)
+- LLM_BREAKER_COOLDOWN_SECONDS   → seconds a circuit stays open before the probe (default 30)
+- LLM_STATS_LOG_SECONDS          → interval of the stats log lines, 0 disables (default 60)
+- LLM_HEDGING                    → "true" to hedge slow calls (default "false")
+- LLM_HEDGE_PERCENTILE           → latency percentile of the model used as the hedge deadline (default 90)
+- LLM_HEDGE_DELAY_MS             → fixed hedge deadline instead of the percentile (default 0, unset)
+- LLM_HEDGE_MIN_SAMPLES          → latency samples a model needs before it is hedged (default 20)
+- LLM_HEDGE_MAX_RATE             → max share of calls that are hedged (default 0.1)
+- LLM_LATENCY_WINDOW             → recent latencies kept per model for the percentile (default 200)
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from clients import get_bedrock_client
+from timing import span, count, propagate, TIMING_METRICS_NAMESPACE
+
+
+LLM_EWMA_ALPHA = float(os.environ.get("LLM_EWMA_ALPHA", 0.2))
+LLM_BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", 3))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.environ.get("LLM_BREAKER_COOLDOWN_SECONDS", 30))
+LLM_STATS_LOG_SECONDS = float(os.environ.get("LLM_STATS_LOG_SECONDS", 60))
+LLM_HEDGING = os.environ.get("LLM_HEDGING", "false") == "true"
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", 90))
+LLM_HEDGE_DELAY_MS = float(os.environ.get("LLM_HEDGE_DELAY_MS", 0))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_MAX_RATE = float(os.environ.get("LLM_HEDGE_MAX_RATE", 0.1))
+LLM_LATENCY_WINDOW = int(os.environ.get("LLM_LATENCY_WINDOW", 200))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Errors worth retrying on another model; anything else is returned to the caller.
+# botocore's own retries are off (clients.get_bedrock_client), so transport errors
+# are retried here, on the next model
+THROTTLE_ERRORS = {"ThrottlingException", "TooManyRequestsException"}
+TRANSPORT_ERRORS = {"ReadTimeoutError", "ConnectTimeoutError", "ConnectionClosedError", "EndpointConnectionError"}
+FAILOVER_ERRORS = THROTTLE_ERRORS | TRANSPORT_ERRORS | {"ServiceUnavailableException", "ModelNotReadyException", "ModelTimeoutException"}
+
+
+def error_code(error):
+    # botocore's HTTPClientError subclasses carry response=None
+    code = (getattr(error, "response", None) or {}).get("Error", {}).get("Code")
+    if code:
+        return code
+    # Fall back to the exception text, as the old throttle check did
+    for name in FAILOVER_ERRORS:
+        if name in str(error):
+            return name
+    return type(error).__name__
+
+
+class StreamError(Exception):
+    """
+    An exception event inside a response stream, shaped like botocore's
+    ClientError so error_code reads it the same way.
+    """
+
+    def __init__(self, name, detail):
+        code = name[:1].upper() + name[1:]
+        self.response = {"Error": {"Code": code, "Message": str((detail or {}).get("message", ""))}}
+        super().__init__(f"{code}: {self.response['Error']['Message']}")
+
+
+def stream_text(event):
+    """
+    Text carried by one invoke_model_with_response_stream event ("" for
+    message bookkeeping events).
+    """
+    chunk = event.get("chunk")
+    if chunk is None:
+        (name, detail), = event.items()
+        raise StreamError(name, detail)
+    payload = json.loads(chunk["bytes"])
+    if payload.get("type") == "content_block_delta":
+        return payload["delta"].get("text", "")
+    return ""
+
+
+class ModelStats:
+    def __init__(self, model_id):
+        self.model_id = model_id
+        self.state = CLOSED
+        self.requests = 0
+        self.throttles = 0
+        self.errors = 0
+        # Per call kind ("invoke" or "stream")
+        self.latency_ms = {}
+        self.throttle_rate = 0.0
+        self.error_rate = 0.0
+        self.consecutive_throttles = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.latencies = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def expected_ms(self, kind="invoke"):
+        latency_ms = self.latency_ms.get(kind)
+        if latency_ms is None:
+            return 0.0
+        success = max(1.0 - self.throttle_rate - self.error_rate, 0.05)
+        return latency_ms / success
+
+    def as_dict(self):
+        return {
+            "model_id": self.model_id,
+            "state": self.state,
+            "requests": self.requests,
+            "throttles": self.throttles,
+            "errors": self.errors,
+            "latency_ewma_ms": self.latency_ms.get("invoke"),
+            "stream_latency_ewma_ms": self.latency_ms.get("stream"),
+            "throttle_rate": self.throttle_rate,
+            "error_rate": self.error_rate,
+            "consecutive_throttles": self.consecutive_throttles,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class ModelRouter:
+    def __init__(self, model_ids, alpha=LLM_EWMA_ALPHA, breaker_threshold=LLM_BREAKER_THRESHOLD,
+                 cooldown_seconds=LLM_BREAKER_COOLDOWN_SECONDS, stats_log_seconds=LLM_STATS_LOG_SECONDS,
+                 hedging=LLM_HEDGING, hedge_percentile=LLM_HEDGE_PERCENTILE, hedge_delay_ms=LLM_HEDGE_DELAY_MS,
+                 hedge_max_rate=LLM_HEDGE_MAX_RATE):
+        self.model_ids = list(model_ids)
+        self.alpha = alpha
+        self.breaker_threshold = breaker_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.stats_log_seconds = stats_log_seconds
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay_ms = hedge_delay_ms
+        self.hedge_max_rate = hedge_max_rate
+        self.models = {model_id: ModelStats(model_id) for model_id in self.model_ids}
+        self._lock = threading.Lock()
+        self._logged_at = time.monotonic()
+        self._hedge_tokens = 0.0
+
+    def choose(self, exclude=(), kind="invoke"):
+        """
+        Returns the model ID to call next for a `kind` call, or None when every
+        model not in `exclude` has an open circuit.
+        """
+        now = time.monotonic()
+        with self._lock:
+            best = None
+            for position, model_id in enumerate(self.model_ids):
+                if model_id in exclude:
+                    continue
+                stats = self.models[model_id]
+                if stats.state == OPEN and now - stats.opened_at >= self.cooldown_seconds:
+                    stats.state = HALF_OPEN
+                    stats.probing = False
+                if stats.state == OPEN or (stats.state == HALF_OPEN and stats.probing):
+                    continue
+                # A pending probe goes first; otherwise the cheapest model, then list order
+                key = (-1.0 if stats.state == HALF_OPEN else stats.expected_ms(kind), position)
+                if best is None or key < best[0]:
+                    best = (key, stats)
+            if best is None:
+                return None
+            stats = best[1]
+            if stats.state == HALF_OPEN:
+                stats.probing = True
+            return stats.model_id
+
+    def record(self, model_id, outcome, latency_ms=None, kind="invoke"):
+        """
+        Folds one call's outcome ("ok", "throttle" or "error") into the model's
+        stats; `latency_ms` of an "ok" call is a sample for the `kind` latency.
+        """
+        with self._lock:
+            stats = self.models[model_id]
+            stats.requests += 1
+            alpha = self.alpha
+            stats.throttle_rate += alpha * ((outcome == "throttle") - stats.throttle_rate)
+            stats.error_rate += alpha * ((outcome == "error") - stats.error_rate)
+
+            if outcome == "ok":
+                if latency_ms is not None:
+                    stats.latencies.setdefault(kind, deque(maxlen=LLM_LATENCY_WINDOW)).append(latency_ms)
+                    previous = stats.latency_ms.get(kind)
+                    stats.latency_ms[kind] = latency_ms if previous is None else previous + alpha * (latency_ms - previous)
+                stats.consecutive_throttles = 0
+                stats.state = CLOSED
+            else:
+                if outcome == "throttle":
+                    stats.throttles += 1
+                    stats.consecutive_throttles += 1
+                else:
+                    stats.errors += 1
+                if stats.state == HALF_OPEN or stats.consecutive_throttles >= self.breaker_threshold:
+                    stats.state = OPEN
+                    stats.opened_at = time.monotonic()
+            stats.probing = False
+        self._maybe_log()
+
+    def invoke(self, native_request):
+        """
+        Sends an Anthropic messages request to the healthiest model, failing
+        over on throttles and unavailability, and hedging when enabled.
+        Returns the answer text, or an "ERROR: ..." string as invoke_claude_x
+        always has.
+        """
+        text, _ = self._run(json.dumps(native_request), self._invoke_once, "invoke")
+        return text
+
+    def stream(self, native_request, make_parser):
+        """
+        Streaming variant of `invoke`: each attempt feeds the text deltas to a
+        fresh `make_parser()` and the stream is closed as soon as the parser's
+        feed() returns True. Returns (text received, parser), or
+        ("ERROR: ...", None).
+        """
+        return self._run(json.dumps(native_request), functools.partial(self._stream_once, make_parser=make_parser), "stream")
+
+    def _run(self, body, call, kind):
+        if self.hedging:
+            return self._hedged(body, call, kind)
+        return self._chain(body, call, kind, self.choose(kind=kind), [])
+
+    def _invoke_once(self, client, model_id, body, abandoned):
+        response = client.invoke_model(modelId=model_id, body=body)
+        if abandoned is not None and abandoned.is_set():
+            response["body"].close()
+            return None
+        return json.loads(response["body"].read())["content"][0]["text"], None
+
+    def _stream_once(self, client, model_id, body, abandoned, make_parser):
+        parser = make_parser()
+        received = []
+        stream = client.invoke_model_with_response_stream(modelId=model_id, body=body)["body"]
+        try:
+            for event in stream:
+                if abandoned is not None and abandoned.is_set():
+                    return None
+                text = stream_text(event)
+                if text:
+                    received.append(text)
+                    if parser.feed(text):
+                        count("llm_stream_early_stops")
+                        break
+        finally:
+            # Stops generation (and billing) for whatever the model had left to say
+            stream.close()
+        return "".join(received), parser
+
+    def _chain(self, body, call, kind, model_id, tried, abandoned=None):
+        """
+        Calls `model_id`, then the next best untried model after each
+        throttle. Returns None once `abandoned` is set (the other hedged call won).
+        """
+        client = get_bedrock_client()
+        while model_id is not None:
+            tried.append(model_id)
+
+            start = time.perf_counter()
+            try:
+                with span("llm"):
+                    result = call(client, model_id, body, abandoned)
+            except Exception as e:
+                code = error_code(e)
+                self.record(model_id, "throttle" if code in THROTTLE_ERRORS else "error")
+                if code not in FAILOVER_ERRORS:
+                    print(f"ERROR: Unable to invoke model {model_id}. Reason: {str(e)}")
+                    return f"ERROR: {str(e)}", None
+                count("llm_throttles" if code in THROTTLE_ERRORS else "llm_failovers")
+                if abandoned is not None and abandoned.is_set():
+                    return None
+                model_id = self.choose(exclude=tried, kind=kind)
+                continue
+
+            if result is None:
+                # Abandoned: the call was fine, but its elapsed time is not a latency sample
+                self.record(model_id, "ok", kind=kind)
+                return None
+            self.record(model_id, "ok", (time.perf_counter() - start) * 1000, kind)
+            return result
+
+        return "ERROR: All models throttled or unavailable.", None
+
+    def hedge_deadline_ms(self, model_id, kind="invoke"):
+        """
+        How long to wait on a `kind` call to `model_id` before hedging, or None
+        while it has too few samples.
+        """
+        if self.hedge_delay_ms:
+            return self.hedge_delay_ms
+        with self._lock:
+            samples = sorted(self.models[model_id].latencies.get(kind, ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))]
+
+    def _hedge_model(self, tried, kind):
+        # Spend a hedge token first, so a model chosen here is always called
+        with self._lock:
+            if self._hedge_tokens < 1.0:
+                return None
+            self._hedge_tokens -= 1.0
+        model_id = self.choose(exclude=tried, kind=kind)
+        if model_id is None:
+            with self._lock:
+                self._hedge_tokens += 1.0
+        return model_id
+
+    def _hedged(self, body, call, kind):
+        with self._lock:
+            self._hedge_tokens = min(1.0, self._hedge_tokens + self.hedge_max_rate)
+        primary = self.choose(kind=kind)
+        if primary is None:
+            return "ERROR: All models throttled or unavailable.", None
+
+        tried = []
+        abandoned = threading.Event()
+        first = _executor().submit(propagate(self._chain), body, call, kind, primary, tried, abandoned)
+        delay = self.hedge_deadline_ms(primary, kind)
+        if delay is None or wait([first], timeout=delay / 1000).done:
+            return first.result()
+
+        hedge = self._hedge_model(tried, kind)
+        if hedge is None:
+            return first.result()
+        count("llm_hedges")
+        with self._lock:
+            self.models[hedge].hedges += 1
+        second = _executor().submit(propagate(self._chain), body, call, kind, hedge, tried, abandoned)
+
+        # First complete answer wins; an error only counts once both calls are done
+        result = None
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcome = future.result()
+                if outcome is not None and not outcome[0].startswith("ERROR"):
+                    abandoned.set()
+                    for loser in pending:
+                        loser.cancel()
+                    if future is second:
+                        count("llm_hedge_wins")
+                        with self._lock:
+                            self.models[hedge].hedge_wins += 1
+                    return outcome
+                if future is first or result is None:
+                    result = outcome
+        return result
+
+    def stats(self):
+        with self._lock:
+            return [self.models[model_id].as_dict() for model_id in self.model_ids]
+
+    def _maybe_log(self):
+        if not self.stats_log_seconds:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._logged_at < self.stats_log_seconds:
+                return
+            self._logged_at = now
+        for entry in self.stats():
+            print(json.dumps({
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": TIMING_METRICS_NAMESPACE,
+                        "Dimensions": [["model_id"]],
+                        "Metrics": [
+                            {"Name": "latency_ewma_ms", "Unit": "Milliseconds"},
+                            {"Name": "stream_latency_ewma_ms", "Unit": "Milliseconds"},
+                            {"Name": "throttle_rate", "Unit": "None"},
+                            {"Name": "error_rate", "Unit": "None"},
+                            {"Name": "circuit_open", "Unit": "Count"},
+                        ],
+                    }],
+                },
+                **entry,
+                "latency_ewma_ms": entry["latency_ewma_ms"] or 0.0,
+                "stream_latency_ewma_ms": entry["stream_latency_ewma_ms"] or 0.0,
+                "circuit_open": int(entry["state"] == OPEN),
+            }))
+
+
+_router = None
+_router_lock = threading.Lock()
+_hedge_executor = None
+
+
+def _executor():
+    global _hedge_executor
+
+    with _router_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+        return _hedge_executor
+
+
+def get_router():
+    global _router
+
+    with _router_lock:
+        if _router is None:
+            from models import CLAUDE_MODEL_IDS
+            _router = ModelRouter(CLAUDE_MODEL_IDS)
+        return _router
+
+
+def stats():
+    return get_router().stats()
@@ -1,50 +1,121 @@
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-import time
-import os
 import json
-import boto3
-from openai import OpenAI
-import random
+import os
+from clients import get_openai_client, get_bedrock_client
+from embedding_cache import get_embedding_cache, embedding_key
+from timing import span, count
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+FULL_EMBEDDING_DIMENSIONS = 3072
+
+# Matryoshka-truncated size requested from OpenAI. Anything below 3072 reads and writes the
+# "<kind>_embeddings_<dims>" fields and "vector_index_<dims>" index created by utils/migrate_dimensions.py
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", FULL_EMBEDDING_DIMENSIONS))
+
+# Inputs per multi-input embeddings request in create_embeddings_batch
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 256))
+
+# Models invoke_claude_x routes between (see llm_router.py); LLM_MODEL_IDS overrides, comma separated
+CLAUDE_MODEL_IDS = [
+    model_id.strip() for model_id in os.environ.get("LLM_MODEL_IDS", ",".join([
+        "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+        "us.anthropic.claude-3-5-sonnet-20241022-v2:0",
+        "us.anthropic.claude-3-5-sonnet-20240620-v1:0",
+    ])).split(",") if model_id.strip()
+]
+
+
+def embedding_field(kind, dimensions=None):
+    """
+    Returns the document field holding the `kind` ("narrative" or "contextual") vector.
+    """
+    dimensions = dimensions or EMBEDDING_DIMENSIONS
+    if dimensions == FULL_EMBEDDING_DIMENSIONS:
+        return f"{kind}_embeddings"
+    return f"{kind}_embeddings_{dimensions}"
+
+
+def text_hash_field(kind):
+    """
+    Returns the document field holding the hash of the text the `kind` vector was built from.
+    """
+    return f"{kind}_text_hash"
 
-# Get secret name from environment variable
-secret_name = os.environ["SECRET_NAME"]
-region_name = os.environ.get("AWS_REGION", "us-west-2")  # fallback default
 
-# Create a Secrets Manager client
-session = boto3.session.Session()
-secret_client = session.client(service_name="secretsmanager", region_name=region_name)
+def embedding_text_hash(text):
+    # Covers the model and dimensions too, so a dimension migration re-embeds on the next write
+    return embedding_key(text, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
 
-# Retrieve secret value
-get_secret_value_response = secret_client.get_secret_value(SecretId=secret_name)
-secrets = json.loads(get_secret_value_response["SecretString"])
 
-# Use the new OpenAI API key
-openai_api_key = secrets["OPENAI_API_KEY"]
-uri = secrets["MONGODB_URI"]
+def vector_index_name(dimensions=None):
+    dimensions = dimensions or EMBEDDING_DIMENSIONS
+    if dimensions == FULL_EMBEDDING_DIMENSIONS:
+        return "vector_index"
+    return f"vector_index_{dimensions}"
 
-# Create OpenAI client
-client = OpenAI(api_key=openai_api_key)
 
-# Connect to MongoDB
-mongo_client = MongoClient(uri, server_api=ServerApi('1'))
+def embedding_projection_exclusions():
+    """
+    Projection that hides every stored vector field from API responses.
+    """
+    fields = {embedding_field(kind, dims) for kind in ("narrative", "contextual")
+              for dims in (FULL_EMBEDDING_DIMENSIONS, EMBEDDING_DIMENSIONS)}
+    return {field: 0 for field in sorted(fields)}
 
 
-#creates vector embeddings with text-embedding-3-large
+#creates vector embeddings with text-embedding-3-large, served from the embedding cache when possible
 def create_embeddings(text):
-    print (f"creating embeddings, text: {text}")
+    cache = get_embedding_cache()
+    embedding = cache.get(text, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    if embedding is not None:
+        count("embedding_cache_hits")
+        return embedding
+
     try:
-        response = client.embeddings.create(
-            model="text-embedding-3-large",
-            input=[text]
-        )
+        with span("embedding"):
+            response = get_openai_client().embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=[text],
+                dimensions=EMBEDDING_DIMENSIONS
+            )
         embedding = response.data[0].embedding
+        cache.put(text, EMBEDDING_MODEL, embedding, EMBEDDING_DIMENSIONS)
         return embedding
     except Exception as e:
         print(f"[Embedding Error] Failed to create embedding: {e}")
         return None
 
 
+def create_embeddings_batch(texts):
+    """
+    Embeds many texts with multi-input requests of up to EMBEDDING_BATCH_SIZE
+    inputs, skipping texts the embedding cache already has. Returns one vector
+    per text, or None for texts whose request failed.
+    """
+    cache = get_embedding_cache()
+    vectors = cache.get_many(texts, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        chunk = missing[start:start + EMBEDDING_BATCH_SIZE]
+        inputs = [texts[i] for i in chunk]
+        try:
+            with span("embedding"):
+                response = get_openai_client().embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=inputs,
+                    dimensions=EMBEDDING_DIMENSIONS
+                )
+        except Exception as e:
+            print(f"[Embedding Error] Failed to embed {len(inputs)} texts: {e}")
+            continue
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        cache.put_many(inputs, embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+        for i, embedding in zip(chunk, embeddings):
+            vectors[i] = embedding
+
+    return vectors
+
+
 # Function that gets a strig and xml tag idemtifier and returns the text between the tags or empty if the tag is not found, in case of any error, return empty string
 def get_tag(text, tag):
     try:
@@ -60,6 +131,52 @@ def get_tag(text, tag):
         return ""
 
 
+class TagStreamParser:
+    """
+    get_tag for text that arrives in pieces. `feed` each delta as it comes;
+    every tag's value is reported to `on_tag(tag, value)` the moment its
+    closing tag arrives, and feed returns True once all `tags` are closed.
+    Only the unscanned tail of the text is searched on each feed.
+    """
+
+    def __init__(self, tags, on_tag=None):
+        self.values = {}
+        self.on_tag = on_tag
+        self._text = ""
+        # tag -> [offset to resume the search from, index where the value starts or None]
+        self._pending = {tag: [0, None] for tag in tags}
+
+    def feed(self, delta):
+        self._text += delta
+        for tag in list(self._pending):
+            state = self._pending[tag]
+            if state[1] is None:
+                start_tag = f"<{tag}>"
+                start = self._text.find(start_tag, state[0])
+                if start == -1:
+                    state[0] = max(0, len(self._text) - len(start_tag) + 1)
+                    continue
+                state[0] = state[1] = start + len(start_tag)
+
+            end_tag = f"</{tag}>"
+            end = self._text.find(end_tag, state[0])
+            if end == -1:
+                state[0] = max(state[1], len(self._text) - len(end_tag) + 1)
+                continue
+
+            del self._pending[tag]
+            self.values[tag] = self._text[state[1]:end]
+            if self.on_tag is not None:
+                self.on_tag(tag, self.values[tag])
+        return self.done
+
+    @property
+    def done(self):
+        return not self._pending
+
+    def get(self, tag):
+        return self.values.get(tag, "")
+
 
 def extract_first_xml_element(input_str):
     """
@@ -116,8 +233,8 @@ def invoke_claude_sonnet_37(prompt):
     :param prompt: A string representing the user query.
     :return: A string containing the AI-generated response.
     """
-    # Create a Bedrock Runtime client in the AWS Region of your choice.
-    client = boto3.client("bedrock-runtime")
+    # Reuse the shared Bedrock Runtime client.
+    client = get_bedrock_client()
 
     # Set the model ID for Claude 3 Sonnet.
     model_id = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
@@ -146,7 +263,8 @@ def invoke_claude_sonnet_37(prompt):
 
     try:
         # Invoke the model with the request.
-        response = client.invoke_model(modelId=model_id, body=json.dumps(native_request))
+        with span("llm"):
+            response = client.invoke_model(modelId=model_id, body=json.dumps(native_request))
         model_response = json.loads(response["body"].read())
 
         # Extract and return the response text.
@@ -162,21 +280,14 @@ def invoke_claude_sonnet_37(prompt):
 def invoke_claude_x(prompt):
     """
     Invokes one of the Anthropic Claude x models via AWS Bedrock to generate a response.
-    It randomly selects a starting model and, in case of a ThrottlingException,
-    tries the next model in a round-robin manner.
+    llm_router picks the model with the best recent latency and throttle record,
+    fails over to the next one on a ThrottlingException and, with LLM_HEDGING=true,
+    sends a slow call to a second model as well.
 
     :param prompt: A string representing the user query.
     :return: A string containing the AI-generated response or an error message.
     """
-    # Create a Bedrock Runtime client in the AWS Region of your choice.
-    client = boto3.client("bedrock-runtime")
-
-    # List of model IDs.
-    model_ids = [
-        "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
-        "us.anthropic.claude-3-5-sonnet-20241022-v2:0",
-        "us.anthropic.claude-3-5-sonnet-20240620-v1:0"
-    ]
+    from llm_router import get_router
 
     # Define the request payload.
     native_request = {
@@ -191,30 +302,33 @@ def invoke_claude_x(prompt):
         ],
     }
 
-    # Pick a random starting index.
-    start_index = random.randint(0, len(model_ids) - 1)
-    attempts = 0
+    return get_router().invoke(native_request)
 
-    # Try each model in a round-robin fashion.
-    while attempts < len(model_ids):
-        current_index = (start_index + attempts) % len(model_ids)
-        model_id = model_ids[current_index]
-        print(f"using FM: {model_id}")
-        try:
-            response = client.invoke_model(modelId=model_id, body=json.dumps(native_request))
-            model_response = json.loads(response["body"].read())
-            return model_response["content"][0]["text"]
-        except Exception as e:
-            # If a ThrottlingException is encountered, try the next model.
-            if "ThrottlingException" in str(e):
-                print(f"Model {model_id} throttled. Trying next model.")
-                attempts += 1
-                continue
-            else:
-                print(f"ERROR: Unable to invoke model {model_id}. Reason: {str(e)}")
-                return f"ERROR: {str(e)}"
 
-    return "ERROR: All models throttled or unavailable."
+def invoke_claude_x_streaming(prompt, tags, on_tag=None):
+    """
+    invoke_claude_x for answers made of XML tags: the response is streamed
+    through a TagStreamParser, `on_tag(tag, value)` fires as each tag closes,
+    and the stream is cut once every tag in `tags` has arrived.
+
+    :return: (text received, parser); the text is an "ERROR: ..." string and
+             the parser None when every model failed.
+    """
+    from llm_router import get_router
+
+    native_request = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 10000,
+        "temperature": 0,
+        "messages": [
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": prompt}],
+            }
+        ],
+    }
+
+    return get_router().stream(native_request, lambda: TagStreamParser(tags, on_tag))
 
 
 
@@ -240,9 +354,7 @@ def build_narrative_text(doc):
     if full_plot and full_plot != plot:
         parts.append(f"In more detail, the full plot is as follows: {full_plot}")
 
-    text = " ".join(parts)
-    print(f"[Build] Narrative text: {text[:100]}...")  # Print a preview
-    return text
+    return " ".join(parts)
 
 
 
@@ -322,9 +434,7 @@ def build_contextual_text(doc):
         parts.append(f"This is a {movie_type.lower()}.")
 
     # Final output
-    text = " ".join(parts)
-    print(f"[Build] Contextual text: {text[:100]}...")
-    return text
+    return " ".join(parts)
 
 
 
@@ -9,24 +9,144 @@ Routes:
 - POST /movies/search
 - GET /movies
 - POST /movies
+- POST /movies/bulk
 - GET /movies/{id}
 - PUT /movies/{id}
 - DELETE /movies/{id}
+
+Route modules are imported on first use so a cold start only pays for the
+code its route needs: CRUD reads never load the OpenAI SDK and only the
+agent=true search path loads the Bedrock code.
+
+Sampled requests (TIMING_SAMPLE_RATE) get a Server-Timing header and one EMF
+metrics log line with per-stage durations; see timing.py.
 """
 
 
 import json
-from datetime import datetime
-from semantic_search import semantic_search
-from hybrid_search import hybrid_search
-from resource_movie import create_movie, delete_movie, update_movie, get_movie, list_movies
+import os
 from utils import response
-from agent import intelligent_search
+from timing import start_trace, finish, route_name
 import logging
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# The cross-encoder model is loaded during init rather than by the first rerank request
+if os.environ.get("RERANK_BACKEND") == "cross-encoder":
+    from reranking import load_cross_encoder
+    load_cross_encoder()
+
+
+def search_events(query, hybrid, agent, n, fields=None):
+    """
+    Ranking events for stream=true. Agent requests resolve the query with the
+    LLM first and then stream a hybrid search over its output.
+    """
+    from search_stream import stream_search
+
+    if agent:
+        from agent import understand_query
+        semantic_search_text, keyword_search_text, keyword_categories = understand_query(query)
+        return stream_search(semantic_search_text, hybrid=True, keyword_search_text=keyword_search_text,
+                             keyword_search_categories=keyword_categories, limit=n, fields=fields)
+    return stream_search(query, hybrid=hybrid, limit=n, fields=fields)
+
+
+def parse_search_request(event):
+    """
+    Validates a POST /movies/search event. Returns (params, None), or
+    (None, error response).
+    """
+    body = json.loads(event.get("body") or "{}")
+    query = body.get("request", "").strip()
+
+    if not query:
+        return None, response(400, {
+            "error": "Query cannot be empty."
+        })
+
+    MAX_QUERY_LENGTH = 2048
+    if len(query) > MAX_QUERY_LENGTH:
+        return None, response(400, {
+            "error": f"Query too long. Max length is {MAX_QUERY_LENGTH} characters."
+        })
+    logger.info("Searching movies. Search query: %s", query)
+
+    # Get query parameters
+    query_params = event.get("queryStringParameters") or {}
+    params = {
+        "query": query,
+        "hybrid": query_params.get("hybrid") == "true",
+        "agent": query_params.get("agent") == "true",
+        "reranking": query_params.get("reranking") == "true",
+        "n": max(1, int(query_params.get("n", 10))),
+        "stream": query_params.get("stream") == "true",
+    }
+
+    from projections import parse_fields
+    try:
+        params["fields"] = parse_fields(query_params.get("fields"))
+    except ValueError as e:
+        return None, response(400, {"error": str(e)})
+
+    params["retrievers"] = tuple(r.strip() for r in query_params.get("retrievers", "").split(",") if r.strip()) or None
+    params["fusion"] = query_params.get("fusion")
+    if params["retrievers"] or params["fusion"]:
+        from fusion import RETRIEVERS, FUSION_METHODS
+        if any(r not in RETRIEVERS for r in params["retrievers"] or ()) or (params["fusion"] and params["fusion"] not in FUSION_METHODS):
+            return None, response(400, {
+                "error": f"retrievers must be from {list(RETRIEVERS)} and fusion one of {list(FUSION_METHODS)}."
+            })
+        params["hybrid"] = True
+
+    if params["stream"] and (params["reranking"] or params["retrievers"] or params["fusion"]):
+        return None, response(400, {
+            "error": "stream=true cannot be combined with reranking, retrievers or fusion."
+        })
+    return params, None
+
+
+def stream_handler(event):
+    """
+    POST /movies/search?stream=true for server.py, the only front end that can
+    send a chunked response (API Gateway buffers the whole Lambda response, so
+    `handler` rejects stream=true). Returns (error response, None) or
+    (None, NDJSON lines). The request is traced like any other; an error once
+    the request is valid, including in query understanding or the embedding
+    call, ends the stream with an "error" event.
+    """
+    trace = start_trace()
+    route = route_name(event)
+    try:
+        params, error = parse_search_request(event)
+    except Exception as e:
+        logger.error("Unexpected error: %s", str(e), exc_info=True)
+        params, error = None, response(500, {'error': 'Unexpected server error', 'details': str(e)})
+    if error is not None:
+        return finish(trace, route, error), None
+    return None, _traced_lines(trace, route, lambda: search_events(
+        params["query"], params["hybrid"], params["agent"], params["n"], params["fields"]
+    ))
+
+
+def _traced_lines(trace, route, make_events):
+    from utils import ndjson_line
+
+    lines = []
+    status = 200
+    try:
+        for search_event in make_events():
+            lines.append(ndjson_line(search_event))
+            yield lines[-1]
+    except Exception as e:
+        logger.error("Unexpected error: %s", str(e), exc_info=True)
+        status = 500
+        lines.append(ndjson_line({"event": "error", "error": "Unexpected server error", "details": str(e)}))
+        yield lines[-1]
+    finally:
+        finish(trace, route, {"statusCode": status, "body": "".join(lines)})
+
 
 def handler(event: dict, context) -> dict:
     """
@@ -36,6 +156,7 @@ def handler(event: dict, context) -> dict:
     - /movies/search [POST] — Performs semantic, hybrid, or LLM-assisted search
     - /movies [GET] — Lists all movies
     - /movies [POST] — Creates a new movie
+    - /movies/bulk [POST] — Creates a list of movies, with a status per item
     - /movies/{id} [GET, PUT, DELETE] — Retrieves, updates, or deletes a movie
 
     Query Parameters:
@@ -43,6 +164,11 @@ def handler(event: dict, context) -> dict:
     - agent=true         → enable LLM-assisted search
     - reranking=true     → enable reranking
     - n={number}         → number of search results
+    - stream=true        → NDJSON ranking events as each retriever finishes; server.py
+                           only (see stream_handler), rejected here with 400
+    - fields={list}      → returned fields, names or presets (card, detail); also on GET /movies
+    - retrievers={list}  → fuse any of contextual, narrative, text (implies hybrid search)
+    - fusion={method}    → rrf (default), combsum or normalized
 
     Parameters:
         event (dict): AWS Lambda event
@@ -51,6 +177,11 @@ def handler(event: dict, context) -> dict:
     Returns:
         dict: API Gateway-compatible response object
     """
+    trace = start_trace()
+    return finish(trace, route_name(event), route(event))
+
+
+def route(event):
     http_method = event['httpMethod']
     path = event['path']
     path_params = event.get('pathParameters') or {}
@@ -59,39 +190,61 @@ def handler(event: dict, context) -> dict:
 
     try:
         if path == "/movies/search" and http_method == "POST":
-            body = json.loads(event.get("body", "{}"))
-            query = body.get("request", "").strip()
-
-            if not query:
-                return response(400, {
-                    "error": "Query cannot be empty."
-                })
-            
-            MAX_QUERY_LENGTH = 2048
-            if len(query) > MAX_QUERY_LENGTH:
+            params, error = parse_search_request(event)
+            if error is not None:
+                return error
+            if params["stream"]:
                 return response(400, {
-                    "error": f"Query too long. Max length is {MAX_QUERY_LENGTH} characters."
+                    "error": "stream=true is only served by the standalone server (server.py); API Gateway buffers Lambda responses."
                 })
-            logger.info("Searching movies. Search query: %s", query)
+            query, hybrid, agent, reranking, n = params["query"], params["hybrid"], params["agent"], params["reranking"], params["n"]
+            fields, retrievers, fusion_method = params["fields"], params["retrievers"], params["fusion"]
 
-            # Get query parameters
-            query_params = event.get("queryStringParameters") or {}
-            hybrid = query_params.get("hybrid") == "true"
-            agent = query_params.get("agent") == "true"
-            reranking = query_params.get("reranking") == "true"
-            n = max(1, int(query_params.get("n", 10)))
+            # Serve repeated requests from the result cache
+            from search_cache import search_cache_key, get_catalog_version, get_cached_search, put_cached_search
+            cache_key = search_cache_key(query, hybrid, agent, reranking, n, fields=fields,
+                                         retrievers=retrievers, fusion=fusion_method)
+            catalog_version = get_catalog_version()
+            cached = get_cached_search(cache_key, catalog_version, fields)
+            if cached is not None:
+                search_type, results = cached
+                return response(200, {
+                    "message": f"Request completed with {search_type}.",
+                    "movies": results
+                })
 
             # Route to appropriate function
+            failed_retrievers = []
+            degraded = []
             if agent:
-                results = intelligent_search(query)
+                from agent import intelligent_search
+                results = intelligent_search(query, fields=fields, failed_retrievers=failed_retrievers, degraded=degraded)
                 search_type = "Hybrid Search (LLM-Assisted). [Note: LLM-assisted search is experimental and may not always yield optimal results.]"
             elif hybrid:
-                results = hybrid_search(query, limit=n, reranking=reranking)
+                from hybrid_search import hybrid_search
+                results = hybrid_search(query, limit=n, reranking=reranking, fields=fields,
+                                        retrievers=retrievers, method=fusion_method, failed_retrievers=failed_retrievers)
                 search_type = "Hybrid Search"
             else:
-                results = semantic_search(query, limit=n, reranking=reranking)
+                from semantic_search import semantic_search
+                results = semantic_search(query, limit=n, reranking=reranking, fields=fields)
                 search_type = "Semantic Search"
 
+            # Results missing a failed retriever or the LLM query understanding are
+            # flagged and never cached, so the full ranking is back once the service is
+            if failed_retrievers or degraded:
+                missing = [f"the {', '.join(failed_retrievers)} retriever(s)"] if failed_retrievers else []
+                if degraded:
+                    missing.append("query understanding")
+                return response(200, {
+                    "message": f"Request completed with {search_type}, without {' and '.join(missing)}.",
+                    "partial": True,
+                    "failed_retrievers": failed_retrievers,
+                    "degraded": degraded,
+                    "movies": results
+                })
+
+            put_cached_search(cache_key, catalog_version, search_type, results)
             return response(200, {
                 "message": f"Request completed with {search_type}.",
                 "movies": results
@@ -99,14 +252,22 @@ def handler(event: dict, context) -> dict:
 
 
         elif path == "/movies" and http_method == "GET":
+            from resource_movie import list_movies
             return list_movies(event)
 
         elif path == "/movies" and http_method == "POST":
+            from resource_movie import create_movie
             body = json.loads(event['body'])
             return create_movie(body)
 
+        elif path == "/movies/bulk" and http_method == "POST":
+            from resource_movie import create_movies_bulk
+            body = json.loads(event['body'])
+            return create_movies_bulk(body)
+
         elif path.startswith("/movies/") and movie_id:
-            
+            from resource_movie import get_movie, update_movie, delete_movie
+
             if http_method == "GET":
                 return get_movie(movie_id)
             
@@ -0,0 +1,85 @@
+"""
+Client-selectable field projections for the search and list endpoints.
+
+`fields=` accepts a comma-separated mix of movie field names and presets:
+
+    fields=card                 → title, poster, year and a few badges for a results grid
+    fields=detail               → every movie field (the default for search)
+    fields=card,plot            → the card preset plus the short plot
+
+The resolved list is pushed into the `$project` stages of the search
+pipelines and into the `find` projection of GET /movies, so unused fields
+are never read from Mongo, serialized or sent through API Gateway.
+"""
+
+
+MOVIE_FIELDS = [
+    "title", "plot", "fullplot", "genres", "runtime", "cast", "poster", "languages",
+    "released", "directors", "rated", "awards", "year", "imdb", "countries", "type",
+    "tomatoes", "num_mflix_comments", "lastupdated"
+]
+
+PRESETS = {
+    "card": ["title", "poster", "year", "genres", "rated", "runtime", "imdb"],
+    "detail": MOVIE_FIELDS,
+}
+
+DEFAULT_FIELDS = PRESETS["detail"]
+
+# Per-result fields produced by the search pipelines rather than stored on the movie
+SCORE_FIELDS = ("score", "vs_score", "fts_score", "rerank_score", "embedding_type", "source_embedding")
+
+# Text the cross-encoder reranker reads, fetched even when the client did not ask for it
+RERANK_TEXT_FIELDS = ["title", "plot", "fullplot"]
+
+
+def parse_fields(value):
+    """
+    Resolves a `fields=` parameter into an ordered list of movie fields.
+    Returns None when the parameter is absent; raises ValueError on unknown names.
+    """
+    if value is None or not value.strip():
+        return None
+
+    fields = []
+    for name in (part.strip() for part in value.split(",")):
+        if not name or name == "_id":
+            continue
+        if name in PRESETS:
+            expanded = PRESETS[name]
+        elif name in MOVIE_FIELDS:
+            expanded = [name]
+        else:
+            raise ValueError(f"Unknown field '{name}'")
+        fields.extend(field for field in expanded if field not in fields)
+    return fields
+
+
+def build_projection(fields=None, extra=()):
+    """
+    Inclusion projection for `fields` (default: every movie field) plus any
+    pipeline-computed `extra` fields such as scores.
+    """
+    projection = {"_id": 1}
+    for field in list(fields or DEFAULT_FIELDS) + list(extra):
+        projection[field] = 1
+    return projection
+
+
+def with_rerank_fields(fields):
+    if fields is None:
+        return None
+    return fields + [field for field in RERANK_TEXT_FIELDS if field not in fields]
+
+
+def strip_fields(results, fields, extra=SCORE_FIELDS):
+    """
+    Drops fields fetched only for internal use (e.g. reranking) from the results.
+    """
+    if fields is None:
+        return results
+    keep = {"_id", *fields, *extra}
+    for doc in results:
+        for field in [field for field in doc if field not in keep]:
+            del doc[field]
+    return results
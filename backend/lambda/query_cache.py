@@ -0,0 +1,94 @@
+"""
+Memo for the LLM query-understanding step in agent.intelligent_search.
+
+The extraction prompt runs at temperature 0, so the parsed
+(semantic text, keyword text, keyword categories) triple is cached by
+normalized user input: in process first, then in a shared Mongo collection
+with a TTL index so every Lambda instance benefits.
+
+Environment variables:
+- QUERY_CACHE_ENABLED       → "false" to always call the model (default "true")
+- QUERY_CACHE_SIZE          → max entries kept in process (default 1024)
+- QUERY_CACHE_TTL_SECONDS   → entry lifetime in both tiers (default 7 days)
+- QUERY_CACHE_COLLECTION    → Mongo collection for the shared tier (default query_understanding_cache)
+"""
+
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+
+from clients import get_collection
+from ttl_cache import TTLCache
+
+
+QUERY_CACHE_ENABLED = os.environ.get("QUERY_CACHE_ENABLED", "true") == "true"
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", 1024))
+QUERY_CACHE_TTL_SECONDS = int(os.environ.get("QUERY_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+QUERY_CACHE_COLLECTION = os.environ.get("QUERY_CACHE_COLLECTION", "query_understanding_cache")
+
+# Bump when the extraction prompt changes so old answers are not reused
+PROMPT_VERSION = 1
+
+_memory = TTLCache(max_size=QUERY_CACHE_SIZE, ttl_seconds=QUERY_CACHE_TTL_SECONDS)
+_indexed = False
+stats = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+
+
+def query_key(user_input):
+    normalized = " ".join(user_input.casefold().split())
+    return hashlib.sha256(f"{PROMPT_VERSION}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+def get_understanding(user_input):
+    """
+    Returns the cached (semantic_search_text, keyword_search_text, keyword_categories)
+    for `user_input`, or None.
+    """
+    if not QUERY_CACHE_ENABLED:
+        return None
+
+    key = query_key(user_input)
+    cached = _memory.get(key)
+    if cached is not None:
+        stats["memory_hits"] += 1
+        return cached
+
+    try:
+        doc = get_collection(QUERY_CACHE_COLLECTION).find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+        )
+    except Exception as e:
+        print(f"[Query Cache] Store lookup failed: {e}")
+        doc = None
+
+    if doc is None:
+        stats["misses"] += 1
+        return None
+
+    understanding = (doc["semantic_search_text"], doc["keyword_search_text"], doc["keyword_categories"])
+    _memory.put(key, understanding)
+    stats["store_hits"] += 1
+    return understanding
+
+
+def put_understanding(user_input, semantic_search_text, keyword_search_text, keyword_categories):
+    global _indexed
+
+    if not QUERY_CACHE_ENABLED:
+        return
+
+    key = query_key(user_input)
+    _memory.put(key, (semantic_search_text, keyword_search_text, keyword_categories))
+    try:
+        collection = get_collection(QUERY_CACHE_COLLECTION)
+        if not _indexed:
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            _indexed = True
+        collection.update_one({"_id": key}, {"$set": {
+            "semantic_search_text": semantic_search_text,
+            "keyword_search_text": keyword_search_text,
+            "keyword_categories": keyword_categories,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=QUERY_CACHE_TTL_SECONDS),
+        }}, upsert=True)
+    except Exception as e:
+        print(f"[Query Cache] Store write failed: {e}")
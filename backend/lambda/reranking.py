@@ -0,0 +1,155 @@
+"""
+Rerank stage for search results (enabled with `reranking=true`).
+
+The search functions over-fetch candidates, then `rerank` rescores the top
+RERANK_MAX_CANDIDATES in batches of RERANK_BATCH_SIZE until RERANK_BUDGET_MS,
+counted from the start of the call, runs out. Unscored candidates keep their
+retrieval order behind the scored ones, so a request never waits longer than
+the budget plus one batch.
+
+Backends:
+- "cosine"        → exact cosine between the query vector and both stored vectors (max of the two)
+- "cross-encoder" → local CPU cross-encoder over (query, title + plot); needs sentence-transformers
+
+The cross-encoder model is loaded at init (movies_api_handler calls
+load_cross_encoder on import when RERANK_BACKEND=cross-encoder), never inside
+a request; until it is loaded, rerank scores with cosine instead.
+sentence-transformers and torch are not in the Lambda layer (torch alone
+exceeds the 250 MB layer limit), so the deployed function always uses cosine;
+the cross-encoder is for server.py and local runs, after
+`pip install -r requirements-cross-encoder.txt`.
+
+Environment variables:
+- RERANK_BACKEND         → "cosine" (default) or "cross-encoder"
+- RERANK_OVERFETCH       → candidates fetched per requested result (default 3)
+- RERANK_MAX_CANDIDATES  → hard cap on candidates scored (default 50)
+- RERANK_BATCH_SIZE      → candidates scored per batch (default 16)
+- RERANK_BUDGET_MS       → latency budget for the whole stage (default 150)
+- CROSS_ENCODER_MODEL    → model name for the cross-encoder backend
+"""
+
+import os
+import time
+
+from models import embedding_field
+from timing import span, count
+
+
+RERANK_BACKEND = os.environ.get("RERANK_BACKEND", "cosine")
+RERANK_OVERFETCH = int(os.environ.get("RERANK_OVERFETCH", 3))
+RERANK_MAX_CANDIDATES = int(os.environ.get("RERANK_MAX_CANDIDATES", 50))
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", 16))
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", 150))
+CROSS_ENCODER_MODEL = os.environ.get("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+_cross_encoder = None
+
+
+def candidate_limit(limit):
+    """
+    Number of candidates to retrieve so the rerank stage has something to reorder.
+    """
+    return max(limit, min(limit * RERANK_OVERFETCH, RERANK_MAX_CANDIDATES))
+
+
+def cosine_scores(query_text, query_vector, docs):
+    import numpy as np
+    from clients import get_collection
+
+    fields = [embedding_field("narrative"), embedding_field("contextual")]
+    cursor = get_collection("movies").find(
+        {"_id": {"$in": [doc["_id"] for doc in docs]}},
+        {field: 1 for field in fields}
+    )
+    vectors = {doc["_id"]: doc for doc in cursor}
+
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+
+    scores = []
+    for doc in docs:
+        best = None
+        for field in fields:
+            vector = vectors.get(doc["_id"], {}).get(field)
+            if vector:
+                vector = np.asarray(vector, dtype=np.float32)
+                cosine = float(vector @ query / (np.linalg.norm(vector) or 1.0))
+                best = cosine if best is None else max(best, cosine)
+        scores.append(best)
+    return scores
+
+
+def load_cross_encoder():
+    """
+    Loads the cross-encoder model once; returns it, or None when
+    sentence-transformers is not installed or the model cannot be loaded.
+    """
+    global _cross_encoder
+
+    if _cross_encoder is None:
+        start = time.perf_counter()
+        try:
+            from sentence_transformers import CrossEncoder
+            _cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL, device="cpu")
+            print(f"[Rerank] Loaded {CROSS_ENCODER_MODEL} in {(time.perf_counter() - start) * 1000:.0f}ms")
+        except Exception as e:
+            print(f"[Rerank] Cross-encoder unavailable, reranking with cosine: {e}")
+            _cross_encoder = False
+    return _cross_encoder or None
+
+
+def cross_encoder_scores(query_text, query_vector, docs):
+    pairs = [
+        (query_text, f"{doc.get('title', '')}. {doc.get('fullplot') or doc.get('plot') or ''}")
+        for doc in docs
+    ]
+    return [float(score) for score in _cross_encoder.predict(pairs)]
+
+
+SCORERS = {
+    "cosine": cosine_scores,
+    "cross-encoder": cross_encoder_scores,
+}
+
+
+def rerank(query_text, query_vector, results, limit, backend=None):
+    """
+    Rescores the leading candidates and returns the top `limit` results. Each
+    scored result gets a `rerank_score`; the retrieval `score` is left as is.
+    """
+    deadline = time.perf_counter() + RERANK_BUDGET_MS / 1000
+    backend = backend or RERANK_BACKEND
+    scorer = SCORERS.get(backend)
+    if scorer is None:
+        print(f"[Rerank] Unknown backend '{backend}', returning retrieval order.")
+        return results[:limit]
+    if backend == "cross-encoder" and not _cross_encoder:
+        count("rerank_cross_encoder_unloaded")
+        backend, scorer = "cosine", cosine_scores
+
+    candidates = results[:RERANK_MAX_CANDIDATES]
+
+    scored = []
+    position = 0
+    with span("rerank"):
+        while position < len(candidates) and time.perf_counter() < deadline:
+            batch = candidates[position:position + RERANK_BATCH_SIZE]
+            try:
+                scores = scorer(query_text, query_vector, batch)
+            except Exception as e:
+                print(f"[Rerank] {backend} scoring failed: {e}")
+                break
+            for doc, score in zip(batch, scores):
+                if score is None:
+                    continue
+                doc["rerank_score"] = score
+                scored.append(doc)
+            position += len(batch)
+
+    scored_ids = {doc["_id"] for doc in scored}
+    unscored = [doc for doc in results if doc["_id"] not in scored_ids]
+    if position < len(candidates):
+        count("rerank_budget_exhausted")
+
+    scored.sort(key=lambda doc: doc["rerank_score"], reverse=True)
+    return (scored + unscored)[:limit]
@@ -1,9 +1,17 @@
-from models import create_embeddings, build_contextual_text, build_narrative_text
-from mongodb import collection
+from models import create_embeddings, create_embeddings_batch, build_contextual_text, build_narrative_text, embedding_field, embedding_projection_exclusions, embedding_text_hash, text_hash_field
+from clients import get_collection, get_raw_collection, VECTOR_BACKEND
+import bson
 from bson import ObjectId
 from utils import response
-from bson import ObjectId
+from search_cache import bump_catalog_version
+from projections import parse_fields, build_projection
 from datetime import datetime
+from pymongo.errors import BulkWriteError
+import base64
+import json
+import os
+import threading
+import time
 
 
 def clean_mongo_document(doc):
@@ -21,16 +29,46 @@ def clean_mongo_document(doc):
     return {k: convert_value(v) for k, v in doc.items()}
 
 
-def add_embeddings(data):
-    narrative_text = build_narrative_text(data)
-    contextual_text = build_contextual_text(data)
-
-    narrative_embeddings = create_embeddings(narrative_text)
-    contextual_embeddings = create_embeddings(contextual_text)
-
-    # Add embeddings to data
-    data['narrative_embeddings'] = narrative_embeddings
-    data['contextual_embeddings'] = contextual_embeddings
+def sync_gazetteer(doc):
+    # New cast/director/genre names become available to the agent fast path right away
+    import gazetteer
+    gazetteer.add_document(doc)
+
+
+def sync_local_index(doc=None, deleted_id=None):
+    # Keep the in-process vector index in step with writes when it serves searches
+    if VECTOR_BACKEND != "local":
+        return
+    import vector_index
+    if doc is not None:
+        vector_index.upsert_document(doc)
+    if deleted_id is not None:
+        vector_index.remove_document(deleted_id)
+
+
+def add_embeddings(data, stored=None):
+    """
+    Adds the narrative and contextual vectors, and the hashes of the texts they
+    were built from, to `data`. For updates, `stored` is the current document:
+    the texts are built from it merged with the changes and a vector is only
+    recomputed when its text hash differs from the stored one. A vector whose
+    embedding failed is left out along with its hash, so it is retried.
+    """
+    merged = {**stored, **data} if stored else data
+    builders = {"narrative": build_narrative_text, "contextual": build_contextual_text}
+
+    for kind, build_text in builders.items():
+        text = build_text(merged)
+        text_hash = embedding_text_hash(text)
+        if stored and stored.get(text_hash_field(kind)) == text_hash:
+            continue
+        vector = create_embeddings(text)
+        if vector is None:
+            # No hash either, so the next write embeds this text again
+            data.pop(embedding_field(kind), None)
+            continue
+        data[embedding_field(kind)] = vector
+        data[text_hash_field(kind)] = text_hash
 
     return data
 
@@ -39,47 +77,201 @@ def add_embeddings(data):
 
 def create_movie(data):
     data = add_embeddings(data)
+    collection = get_collection("movies")
     result = collection.insert_one(data)
+    sync_local_index(doc=data)
+    invalidate_total_count()
+    sync_gazetteer(data)
+    bump_catalog_version()
     return response(201, {'_id': str(result.inserted_id)})
 
 
 
+# Largest accepted POST /movies/bulk payload
+MAX_BULK_MOVIES = int(os.environ.get("MAX_BULK_MOVIES", 500))
+
+
+def create_movies_bulk(items):
+    """
+    Creates many movies at once: every narrative and contextual text is
+    embedded with a few multi-input requests and the documents are written
+    with one unordered insert_many. Returns a status per input item.
+    """
+    if not isinstance(items, list) or not items:
+        return response(400, {'message': 'Body must be a non-empty list of movies'})
+    if len(items) > MAX_BULK_MOVIES:
+        return response(400, {'message': f'At most {MAX_BULK_MOVIES} movies per request'})
+
+    results = [None] * len(items)
+    valid = []
+    for i, item in enumerate(items):
+        if isinstance(item, dict) and item:
+            valid.append(i)
+        else:
+            results[i] = {'index': i, 'status': 'error', 'error': 'Movie must be a non-empty object'}
+
+    narrative_texts = [build_narrative_text(items[i]) for i in valid]
+    contextual_texts = [build_contextual_text(items[i]) for i in valid]
+    vectors = create_embeddings_batch(narrative_texts + contextual_texts)
+
+    docs, doc_indexes = [], []
+    for n, i in enumerate(valid):
+        narrative, contextual = vectors[n], vectors[len(valid) + n]
+        if narrative is None or contextual is None:
+            results[i] = {'index': i, 'status': 'error', 'error': 'Embedding failed'}
+            continue
+        doc = dict(items[i])
+        doc[embedding_field("narrative")] = narrative
+        doc[embedding_field("contextual")] = contextual
+        doc[text_hash_field("narrative")] = embedding_text_hash(narrative_texts[n])
+        doc[text_hash_field("contextual")] = embedding_text_hash(contextual_texts[n])
+        docs.append(doc)
+        doc_indexes.append(i)
+
+    failed_writes = {}
+    if docs:
+        try:
+            get_collection("movies").insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed_writes = {error['index']: error.get('errmsg', 'Write failed') for error in e.details.get('writeErrors', [])}
+
+    inserted = 0
+    for position, (doc, i) in enumerate(zip(docs, doc_indexes)):
+        if position in failed_writes:
+            results[i] = {'index': i, 'status': 'error', 'error': failed_writes[position]}
+            continue
+        results[i] = {'index': i, 'status': 'created', '_id': str(doc['_id'])}
+        inserted += 1
+        sync_local_index(doc=doc)
+        sync_gazetteer(doc)
+
+    if inserted:
+        invalidate_total_count()
+        bump_catalog_version()
+
+    status = 201 if inserted == len(items) else 207
+    return response(status, {'inserted': inserted, 'failed': len(items) - inserted, 'results': results})
+
+
+
 def update_movie(movie_id, data):
-    data = add_embeddings(data)
+    collection = get_collection("movies")
+    stored = collection.find_one({'_id': ObjectId(movie_id)}, embedding_projection_exclusions())
+    if stored is None:
+        return response(404, {'message': 'Movie not found'})
+    data = add_embeddings(data, stored)
     result = collection.update_one({'_id': ObjectId(movie_id)}, {'$set': data})
     if result.matched_count == 0:
         return response(404, {'message': 'Movie not found'})
+    sync_local_index(doc={'_id': ObjectId(movie_id), **data})
+    sync_gazetteer(data)
+    bump_catalog_version()
     return response(200, {'message': 'Movie updated'})
 
 
 
 def delete_movie(movie_id):
+    collection = get_collection("movies")
     result = collection.delete_one({'_id': ObjectId(movie_id)})
     if result.deleted_count == 0:
         return response(404, {'message': 'Movie not found'})
+    sync_local_index(deleted_id=ObjectId(movie_id))
+    invalidate_total_count()
+    bump_catalog_version()
     return response(204, {'message': 'Movie Deleted.'})
 
 
 
 def get_movie(movie_id):
-    projection = {
-        "contextual_embeddings": 0,
-        "narrative_embeddings": 0
-    }
+    projection = embedding_projection_exclusions()
 
+    # Raw BSON goes straight to the JSON body without being decoded into dicts
+    collection = get_raw_collection("movies")
     movie = collection.find_one({'_id': ObjectId(movie_id)}, projection)
 
-    if not movie:
+    # `not movie` would inflate the RawBSONDocument only for it to be decoded again by the encoder
+    if movie is None:
         return response(404, {'message': 'Movie not found'})
 
-    movie = clean_mongo_document(movie)
     return response(200, movie)
 
 
 
 
+# Exact count of the catalog, cached between inline refreshes
+COUNT_REFRESH_SECONDS = int(os.environ.get("COUNT_REFRESH_SECONDS", 300))
+# refreshed_at is None until the first count and after invalidate_total_count: monotonic
+# time starts near zero in a freshly booted microVM, so 0.0 could still look fresh
+_exact_count = {"value": None, "refreshed_at": None, "refreshing": False}
+_count_lock = threading.Lock()
+
+
+def _refresh_exact_count(collection):
+    try:
+        value = collection.count_documents({})
+        with _count_lock:
+            _exact_count["value"] = value
+            _exact_count["refreshed_at"] = time.monotonic()
+        return value
+    except Exception as e:
+        print(f"[Count] Exact count refresh failed: {e}")
+        return None
+    finally:
+        with _count_lock:
+            _exact_count["refreshing"] = False
+
+
+def get_total_count(collection):
+    """
+    Returns (total, is_exact). The exact count is cached for
+    COUNT_REFRESH_SECONDS; the request that finds it stale recounts inline.
+    Requests arriving during that recount, or after it failed, answer with
+    estimated_document_count (collection metadata, no scan).
+    """
+    with _count_lock:
+        value = _exact_count["value"]
+        refreshed_at = _exact_count["refreshed_at"]
+        fresh = refreshed_at is not None and time.monotonic() - refreshed_at < COUNT_REFRESH_SECONDS
+        refresh = not fresh and not _exact_count["refreshing"]
+        if refresh:
+            _exact_count["refreshing"] = True
+
+    if value is not None and fresh:
+        return value, True
+    if refresh:
+        value = _refresh_exact_count(collection)
+        if value is not None:
+            return value, True
+    return collection.estimated_document_count(), False
+
+
+def invalidate_total_count():
+    with _count_lock:
+        _exact_count["refreshed_at"] = None
+
+
+def encode_cursor(direction, _id):
+    is_oid = isinstance(_id, ObjectId)
+    payload = {"d": direction, "id": str(_id) if is_oid else _id, "oid": is_oid}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    if payload["d"] not in ("next", "prev"):
+        raise ValueError("Invalid cursor direction")
+    if payload["oid"] and not ObjectId.is_valid(payload["id"]):
+        raise ValueError("Invalid cursor id")
+    _id = ObjectId(payload["id"]) if payload["oid"] else payload["id"]
+    return payload["d"], _id
+
+
 # Example usage
-# GET /movies?page=2&limit=5
+# GET /movies?limit=5                 → first page, with a `next` cursor
+# GET /movies?limit=5&cursor=<next>   → following page (keyset on _id, no skip)
+# GET /movies?page=2&limit=5          → legacy offset pagination, still supported
+# GET /movies?limit=50&fields=card    → only the fields a results grid needs
 def list_movies(event=None):
     # Default pagination values
     default_limit = 10
@@ -89,24 +281,53 @@ def list_movies(event=None):
     try:
         page = max(int(query_params.get("page", default_page)), 1)
         limit = min(int(query_params.get("limit", default_limit)), 100)
-    except ValueError:
+        limit = max(limit, 1)
+        cursor_token = query_params.get("cursor")
+        direction, anchor = decode_cursor(cursor_token) if cursor_token else (None, None)
+    except (ValueError, KeyError, TypeError):
         return response(400, {"message": "Invalid pagination parameters"})
 
-    skip = (page - 1) * limit
-
-    # 👇 Exclude these 3072-dim vectors
-    projection = {
-        "contextual_embeddings": 0,
-        "narrative_embeddings": 0
-    }
-
-    total = collection.count_documents({})
-    cursor = collection.find({}, projection).skip(skip).limit(limit)
-    movies = [clean_mongo_document(doc) for doc in cursor]
-
-    return response(200, {
-        "page": page,
+    try:
+        fields = parse_fields(query_params.get("fields"))
+    except ValueError as e:
+        return response(400, {"message": str(e)})
+
+    # 👇 Exclude the stored vectors, or only read the requested fields
+    projection = build_projection(fields) if fields else embedding_projection_exclusions()
+
+    collection = get_raw_collection("movies")
+    total, total_is_exact = get_total_count(collection)
+
+    if direction == "prev":
+        cursor = collection.find({"_id": {"$lt": anchor}}, projection).sort("_id", -1).limit(limit + 1)
+        docs = list(cursor)
+        has_more_before = len(docs) > limit
+        docs = list(reversed(docs[:limit]))
+        has_more_after = True
+    else:
+        query = {"_id": {"$gt": anchor}} if direction == "next" else {}
+        cursor = collection.find(query, projection).sort("_id", 1)
+        if direction is None and page > 1:
+            cursor = cursor.skip((page - 1) * limit)
+        docs = list(cursor.limit(limit + 1))
+        has_more_after = len(docs) > limit
+        docs = docs[:limit]
+        has_more_before = direction == "next" or page > 1
+
+    # The cursors need the _id of the first and last documents: decode those two once
+    # and serialize them from the decoded dicts, the rest stay raw
+    if docs:
+        docs[0] = bson.decode(docs[0].raw)
+        docs[-1] = bson.decode(docs[-1].raw) if len(docs) > 1 else docs[0]
+
+    body = {
         "limit": limit,
         "total": total,
-        "movies": movies
-    })
+        "total_is_exact": total_is_exact,
+        "next": encode_cursor("next", docs[-1]["_id"]) if docs and has_more_after else None,
+        "prev": encode_cursor("prev", docs[0]["_id"]) if docs and has_more_before else None,
+        "movies": docs
+    }
+    if direction is None:
+        body["page"] = page
+    return response(200, body)
@@ -0,0 +1,114 @@
+"""
+Result cache for POST /movies/search.
+
+Entries are keyed by the normalized request (query text, hybrid/agent/
+reranking flags, n and the requested fields) plus the catalog version, and hold only the ranked
+result ids with their scores. On a hit the documents are re-hydrated with a
+single `$in` lookup, skipping the embedding call, the vector/full-text
+aggregations and any Bedrock call.
+
+Every create/update/delete bumps the catalog version stored in the
+`catalog_meta` collection, so entries written before a change can never be
+served again, on this instance or any other.
+
+Environment variables:
+- SEARCH_CACHE_ENABLED      → "false" to bypass the cache (default "true")
+- SEARCH_CACHE_SIZE         → max cached requests per instance (default 512)
+- SEARCH_CACHE_TTL_SECONDS  → entry lifetime (default 300)
+"""
+
+import hashlib
+import json
+import os
+
+from clients import get_collection
+from projections import SCORE_FIELDS, build_projection
+from timing import count
+from ttl_cache import TTLCache
+
+
+SEARCH_CACHE_ENABLED = os.environ.get("SEARCH_CACHE_ENABLED", "true") == "true"
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 512))
+SEARCH_CACHE_TTL_SECONDS = int(os.environ.get("SEARCH_CACHE_TTL_SECONDS", 300))
+
+CATALOG_META_COLLECTION = "catalog_meta"
+CATALOG_VERSION_ID = "movies"
+
+_cache = TTLCache(max_size=SEARCH_CACHE_SIZE, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+stats = {"hits": 0, "misses": 0}
+
+
+def get_catalog_version():
+    if not SEARCH_CACHE_ENABLED:
+        return 0
+    meta = get_collection(CATALOG_META_COLLECTION).find_one({"_id": CATALOG_VERSION_ID}, {"version": 1})
+    return (meta or {}).get("version", 0)
+
+
+def bump_catalog_version():
+    """
+    Invalidates every cached search result. Called after each catalog write.
+    """
+    get_collection(CATALOG_META_COLLECTION).update_one(
+        {"_id": CATALOG_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True
+    )
+    _cache.clear()
+
+
+def search_cache_key(query, hybrid, agent, reranking, n, **options):
+    request = {
+        "query": " ".join(query.casefold().split()),
+        "hybrid": hybrid,
+        "agent": agent,
+        "reranking": reranking,
+        "n": n,
+        **options,
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_cached_search(key, version, fields=None):
+    """
+    Returns (search_type, results) for a cached request, or None on a miss.
+    `version` is the catalog version read before the search started and
+    `fields` the projection the request asked for.
+    """
+    if not SEARCH_CACHE_ENABLED:
+        return None
+
+    entry = _cache.get((key, version))
+    if entry is None:
+        stats["misses"] += 1
+        return None
+
+    search_type, ranked = entry
+    ids = [_id for _id, _ in ranked]
+    docs = {doc["_id"]: doc for doc in get_collection("movies").find({"_id": {"$in": ids}}, build_projection(fields))}
+
+    results = []
+    for _id, scores in ranked:
+        doc = docs.get(_id)
+        if doc is None:
+            # Deleted after caching without a version bump; treat as a miss
+            stats["misses"] += 1
+            return None
+        doc.update(scores)
+        results.append(doc)
+
+    stats["hits"] += 1
+    count("search_cache_hits")
+    return search_type, results
+
+
+def put_cached_search(key, version, search_type, results):
+    """
+    Caches a computed result under the catalog version read before the search,
+    so a write that lands mid-search leaves the entry unreachable.
+    """
+    if not SEARCH_CACHE_ENABLED:
+        return
+    ranked = [
+        (doc["_id"], {field: doc[field] for field in SCORE_FIELDS if field in doc})
+        for doc in results
+    ]
+    _cache.put((key, version), (search_type, ranked))
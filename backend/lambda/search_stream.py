@@ -0,0 +1,136 @@
+"""
+Streaming variant of POST /movies/search (`stream=true`), served by server.py
+only: API Gateway buffers Lambda responses, so the Lambda handler rejects it.
+
+Each retriever (contextual vector, narrative vector and, for hybrid search,
+Atlas full-text) runs on its own thread. As soon as the fastest one returns,
+a first ranked batch is emitted; every later retriever emits a refined
+ranking that merges everything seen so far, and the last event is marked
+final. Retriever names are the fusion engine's (contextual, narrative, text).
+Events are dicts that the handler serializes as NDJSON:
+
+    {"event": "partial", "retriever": "text", "movies": [...]}
+    {"event": "final", "retriever": "narrative", "movies": [...]}
+
+A failed retriever still emits its event, with the names of every failed
+retriever so far in "failed_retrievers"; when all of them fail the stream
+ends with an error event instead.
+
+The full-text branch does not need the query embedding, so for hybrid
+search it usually produces the first batch while the embedding call and
+vector searches are still in flight.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from clients import get_collection
+from models import create_embeddings, embedding_field, vector_index_name
+from fusion import default_weights, RetrieverError, FUSION_RRF_K, DEFAULT_KEYWORD_CATEGORIES
+from projections import build_projection
+from semantic_search import build_vector_search_stage
+from timing import span, propagate
+
+
+def _vector_retriever(kind, embedding_future, limit, fields=None):
+    def run():
+        search_embedding = embedding_future.result()
+        if not search_embedding:
+            return []
+        pipeline = build_vector_search_stage(
+            query_vector=search_embedding,
+            embedding_path=embedding_field(kind),
+            index_name=vector_index_name(),
+            embedding_type_tag=kind,
+            limit=limit,
+            fields=fields
+        )
+        with span(f"retriever_{kind}"):
+            return list(get_collection("movies").aggregate(pipeline))
+    return run
+
+
+def _text_retriever(keyword_search_text, keyword_search_categories, limit, fields=None):
+    def run():
+        pipeline = [
+            {"$search": {
+                "index": "movies_text_search_v2",
+                "text": {"query": keyword_search_text, "path": keyword_search_categories}
+            }},
+            {"$limit": limit},
+            {"$addFields": {"score": {"$meta": "searchScore"}}},
+            {"$project": build_projection(fields, extra=("score",))},
+        ]
+        with span("retriever_text"):
+            return list(get_collection("movies").aggregate(pipeline))
+    return run
+
+
+def _max_score_merge(ranked_lists, limit):
+    merged = {}
+    for results in ranked_lists.values():
+        for doc in results:
+            if doc["_id"] not in merged or doc["score"] > merged[doc["_id"]]["score"]:
+                merged[doc["_id"]] = doc
+    return sorted(merged.values(), key=lambda d: d["score"], reverse=True)[:limit]
+
+
+def _rrf_merge(ranked_lists, weights, limit):
+    merged = {}
+    for name, results in ranked_lists.items():
+        score_field = "fts_score" if name == "text" else "vs_score"
+        for rank, doc in enumerate(results):
+            entry = merged.setdefault(doc["_id"], {**doc, "vs_score": 0, "fts_score": 0})
+            entry[score_field] = max(entry[score_field], weights[name] / (rank + FUSION_RRF_K))
+    for entry in merged.values():
+        entry["score"] = entry["vs_score"] + entry["fts_score"]
+    return sorted(merged.values(), key=lambda d: d["score"], reverse=True)[:limit]
+
+
+def stream_search(text, hybrid=False, keyword_search_text="", keyword_search_categories=None, limit=10, fields=None):
+    """
+    Yields ranking events as each retriever finishes; see the module docstring.
+    """
+    if hybrid:
+        keyword_search_text = keyword_search_text or text
+        keyword_search_categories = keyword_search_categories or DEFAULT_KEYWORD_CATEGORIES
+        # Same weighting as hybrid_search
+        fusion_weights = default_weights(text, keyword_search_text, ("narrative", "text"))
+        merge = lambda ranked: _rrf_merge(ranked, fusion_weights, limit)
+    else:
+        merge = lambda ranked: _max_score_merge(ranked, limit)
+
+    ranked = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # One embedding call shared by every vector retriever
+        embedding_future = executor.submit(propagate(create_embeddings), text)
+        if hybrid:
+            retrievers = {
+                "narrative": _vector_retriever("narrative", embedding_future, max(20, limit), fields),
+                "text": _text_retriever(keyword_search_text, keyword_search_categories, max(20, limit), fields),
+            }
+        else:
+            retrievers = {
+                "contextual": _vector_retriever("contextual", embedding_future, limit, fields),
+                "narrative": _vector_retriever("narrative", embedding_future, limit, fields),
+            }
+
+        failed = []
+        futures = {executor.submit(propagate(run)): name for name, run in retrievers.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                ranked[name] = future.result()
+            except Exception as e:
+                print(f"[Stream] Retriever {name} failed: {e}")
+                ranked[name] = []
+                failed.append(name)
+                if len(failed) == len(retrievers):
+                    raise RetrieverError(f"All retrievers failed, last {name}: {e}") from e
+            search_event = {
+                "event": "final" if len(ranked) == len(retrievers) else "partial",
+                "retriever": name,
+                "movies": merge(ranked),
+            }
+            if failed:
+                search_event["failed_retrievers"] = list(failed)
+            yield search_event
@@ -1,55 +1,54 @@
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-import time
-import os
-import json
-import boto3
-from openai import OpenAI
-from models import create_embeddings
-
-# Get secret name from environment variable
-secret_name = os.environ["SECRET_NAME"]
-region_name = os.environ.get("AWS_REGION", "us-west-2")  # fallback default
+"""
+Semantic search over the contextual and narrative embeddings.
 
-# Create a Secrets Manager client
-session = boto3.session.Session()
-secret_client = session.client(service_name="secretsmanager", region_name=region_name)
+Both vector searches normally run in one aggregation, the narrative one in
+a $unionWith sub-pipeline. Atlas only accepts $vectorSearch inside
+$unionWith on MongoDB 8.0 and later; on older clusters the two searches run
+as separate aggregations, run concurrently and merged in Python. Set
+SEMANTIC_SEARCH_UNION=false to always do that; a cluster that rejects the
+union pipeline with one of UNION_REJECTED_CODES also switches the container
+to the two-query path after logging it.
 
-# Retrieve secret value
-get_secret_value_response = secret_client.get_secret_value(SecretId=secret_name)
-secrets = json.loads(get_secret_value_response["SecretString"])
+Environment variables:
+- SEMANTIC_SEARCH_UNION  → "true" (default, needs MongoDB 8.0+) or "false" (two aggregations)
+"""
 
-# Use the new OpenAI API key
-openai_api_key = secrets["OPENAI_API_KEY"]
-uri = secrets["MONGODB_URI"]
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-# Create OpenAI client
-client = OpenAI(api_key=openai_api_key)
+from pymongo.errors import OperationFailure
 
-# Connect to MongoDB
-mongo_client = MongoClient(uri, server_api=ServerApi('1'))
+from clients import get_collection, VECTOR_BACKEND
+from models import create_embeddings, embedding_field, vector_index_name
+from projections import build_projection, with_rerank_fields, strip_fields
+from timing import span, propagate
 
 
+SEMANTIC_SEARCH_UNION = os.environ.get("SEMANTIC_SEARCH_UNION", "true").lower() == "true"
+_union_supported = SEMANTIC_SEARCH_UNION
 
-def semantic_search(text, limit=50, filters=None, reranking = False):
-    database_name = "sample_mflix"
-    document_chunks_collection = "movies"
+# OperationFailure codes of a server that cannot run $vectorSearch in $unionWith:
+# 31441 "... is not allowed within a $unionWith's sub-pipeline",
+# 40602 "... is only valid as the first stage in a pipeline"
+UNION_REJECTED_CODES = {31441, 40602}
 
-    db = mongo_client[database_name]
-    collection = db[document_chunks_collection]
-    print("semantic_search")
 
-    search_embedding = create_embeddings(text)
-    if not search_embedding:
-        return []
+def build_vector_search_stage(query_vector, embedding_path, index_name, embedding_type_tag, limit, filters=None, fields=None,
+                              num_candidates=100):
+    search_stages = None
+    if VECTOR_BACKEND == "local":
+        from vector_index import local_vector_search_stages
 
-    def build_vector_search_stage(query_vector, embedding_path, index_name, embedding_type_tag):
-        print(f"build_vector_search_stage: {embedding_type_tag}")
+        search_stages = local_vector_search_stages(
+            query_vector, embedding_path, limit, num_candidates=num_candidates, filters=filters
+        )
+        score = "$vector_search_score"
+    if search_stages is None:
         stage = {
             "$vectorSearch": {
                 "queryVector": query_vector,
                 "path": embedding_path,
-                "numCandidates": 100,
+                "numCandidates": max(num_candidates, limit),
                 "limit": limit,
                 "index": index_name
             }
@@ -61,74 +60,121 @@ def semantic_search(text, limit=50, filters=None, reranking = False):
         if combined_filter:
             stage["$vectorSearch"]["filter"] = combined_filter
 
-        return [
-            stage,
-            {
-                "$addFields": {
-                    "embedding_type": embedding_type_tag,
-                    "score": {"$meta": "vectorSearchScore"},
-                    "source_embedding": embedding_type_tag
-                }
-            },
-            {
-                "$project": {
-                    "_id": 1,
-                    "title": 1,
-                    "plot": 1,
-                    "fullplot": 1,
-                    "genres": 1,
-                    "runtime": 1,
-                    "cast": 1,
-                    "poster": 1,
-                    "languages": 1,
-                    "released": 1,
-                    "directors": 1,
-                    "rated": 1,
-                    "awards": 1,
-                    "year": 1,
-                    "imdb": 1,
-                    "countries": 1,
-                    "type": 1,
-                    "tomatoes": 1,
-                    "num_mflix_comments": 1,
-                    "lastupdated": 1,
-                    "embedding_type": 1,
-                    "score": 1,
-                    "source_embedding": 1
-                }
+        search_stages = [stage]
+        score = {"$meta": "vectorSearchScore"}
+
+    return search_stages + [
+        {
+            "$addFields": {
+                "embedding_type": embedding_type_tag,
+                "score": score,
+                "source_embedding": embedding_type_tag
             }
-        ]
-
-    # Pipelines using the same embedding for both paths
-    contextual_pipeline = build_vector_search_stage(
-        query_vector=search_embedding,
-        embedding_path="contextual_embeddings",
-        index_name="vector_index",
-        embedding_type_tag="contextual"
+        },
+        {"$project": build_projection(fields, extra=("embedding_type", "score", "source_embedding"))}
+    ]
+
+
+
+def build_semantic_search_pipelines(query_vector, limit, filters=None, fields=None, num_candidates=100):
+    """
+    The contextual and narrative vector search pipelines, using the same embedding.
+    """
+    return tuple(
+        build_vector_search_stage(
+            query_vector=query_vector,
+            embedding_path=embedding_field(kind),
+            index_name=vector_index_name(),
+            embedding_type_tag=kind,
+            limit=limit,
+            filters=filters,
+            fields=fields,
+            num_candidates=num_candidates
+        )
+        for kind in ("contextual", "narrative")
     )
 
-    narrative_pipeline = build_vector_search_stage(
-        query_vector=search_embedding,
-        embedding_path="narrative_embeddings",
-        index_name="vector_index",
-        embedding_type_tag="narrative"
-    )
 
-    # Run both searches
-    contextual_results = list(collection.aggregate(contextual_pipeline))
-    narrative_results = list(collection.aggregate(narrative_pipeline))
+def build_semantic_search_pipeline(query_vector, limit, filters=None, fields=None, num_candidates=100):
+    """
+    Builds one aggregation that runs the contextual and narrative vector
+    searches in a single round trip ($unionWith) and keeps the best score
+    per movie before sorting and limiting. Needs MongoDB 8.0+ on Atlas.
+    """
+    contextual_pipeline, narrative_pipeline = build_semantic_search_pipelines(
+        query_vector, limit, filters, fields, num_candidates
+    )
 
-    # Deduplicate and keep best scored doc
+    return contextual_pipeline + [
+        {"$unionWith": {"coll": "movies", "pipeline": narrative_pipeline}},
+        # Deduplicate and keep best scored doc
+        {"$sort": {"score": -1}},
+        {"$group": {"_id": "$_id", "doc": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$doc"}},
+        {"$sort": {"score": -1, "_id": 1}},
+        {"$limit": limit}
+    ]
+
+
+def merge_best_scores(results, limit):
+    """
+    The Python side of the two-query path: keeps the best scored document
+    per movie, ordered like the $unionWith pipeline.
+    """
     merged_results = {}
-    for result in contextual_results + narrative_results:
+    for result in results:
         _id = result["_id"]
         if _id not in merged_results or result["score"] > merged_results[_id]["score"]:
             merged_results[_id] = result
+    return sorted(merged_results.values(), key=lambda x: (-x["score"], str(x["_id"])))[:limit]
+
+
+def two_query_search(collection, query_vector, limit, filters=None, fields=None, num_candidates=100):
+    """
+    The contextual and narrative searches as two aggregations on concurrent
+    cursors, for clusters without $vectorSearch in $unionWith.
+    """
+    pipelines = build_semantic_search_pipelines(query_vector, limit, filters, fields, num_candidates)
+    with ThreadPoolExecutor(max_workers=len(pipelines)) as executor:
+        futures = [executor.submit(propagate(lambda pipeline: list(collection.aggregate(pipeline))), pipeline)
+                   for pipeline in pipelines]
+        results = [doc for future in futures for doc in future.result()]
+    return merge_best_scores(results, limit)
+
 
-    deduplicated_sorted_results = sorted(merged_results.values(), key=lambda x: x["score"], reverse=True)
 
+def semantic_search(text, limit=50, filters=None, reranking = False, fields=None, num_candidates=100):
+    collection = get_collection("movies")
 
-    #removed duplicates
-    deduplicated_sorted_results = list({doc['_id']: doc for doc in deduplicated_sorted_results}.values())
+    search_embedding = create_embeddings(text)
+    if not search_embedding:
+        return []
 
-    return deduplicated_sorted_results[:limit]
+    fetch_limit = limit
+    project_fields = fields
+    if reranking:
+        from reranking import candidate_limit
+        fetch_limit = candidate_limit(limit)
+        project_fields = with_rerank_fields(fields)
+
+    global _union_supported
+    with span("vector_search"):
+        results = None
+        if _union_supported:
+            # Run both searches and the max-score merge in one round trip
+            pipeline = build_semantic_search_pipeline(search_embedding, fetch_limit, filters, project_fields, num_candidates)
+            try:
+                results = list(collection.aggregate(pipeline))
+            except OperationFailure as e:
+                if e.code not in UNION_REJECTED_CODES:
+                    raise
+                print(f"[Semantic Search] $vectorSearch in $unionWith rejected (MongoDB < 8.0?), using two queries: {e}")
+                _union_supported = False
+        if results is None:
+            results = two_query_search(collection, search_embedding, fetch_limit, filters, project_fields, num_candidates)
+
+    if reranking:
+        from reranking import rerank
+        results = strip_fields(rerank(text, search_embedding, results, limit), fields)
+
+    return results
@@ -0,0 +1,96 @@
+"""
+Standalone HTTP server for running the Movie API outside Lambda.
+
+Wraps movies_api_handler.handler: each request is translated into an API
+Gateway proxy event. `POST /movies/search?stream=true` goes through
+movies_api_handler.stream_handler instead and is served with chunked
+transfer encoding, one NDJSON ranking event per chunk, so clients can render
+the first batch while slower retrievers are still running. Streaming is
+local only: the Lambda handler rejects stream=true.
+
+Usage:
+    SECRET_NAME=mongoagent_secrets python server.py --port 8080
+"""
+
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+from movies_api_handler import handler, stream_handler
+
+# Sub-resources of /movies that are not movie ids
+RESERVED_SEGMENTS = {"search", "bulk"}
+
+
+def build_event(method, raw_path, body):
+    url = urlsplit(raw_path)
+    path = url.path.rstrip("/") or "/"
+    segments = path.strip("/").split("/")
+    path_parameters = None
+    if len(segments) == 2 and segments[0] == "movies" and segments[1] not in RESERVED_SEGMENTS:
+        path_parameters = {"id": segments[1]}
+    return {
+        "httpMethod": method,
+        "path": path,
+        "pathParameters": path_parameters,
+        "queryStringParameters": dict(parse_qsl(url.query)) or None,
+        "body": body,
+    }
+
+
+class MovieApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else None
+        event = build_event(self.command, self.path, body)
+        params = event["queryStringParameters"] or {}
+
+        if event["path"] == "/movies/search" and self.command == "POST" and params.get("stream") == "true":
+            error, lines = stream_handler(event)
+            if error is not None:
+                self._send_result(error)
+                return
+            self._send_stream(lines)
+            return
+
+        self._send_result(handler(event, None))
+
+    def _send_result(self, result):
+        payload = (result.get("body") or "").encode("utf-8")
+        self.send_response(result["statusCode"])
+        for name, value in result.get("headers", {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self, lines):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for line in lines:
+            chunk = line.encode("utf-8")
+            self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Movie API over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    print(f"[Server] Listening on http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), MovieApiRequestHandler).serve_forever()
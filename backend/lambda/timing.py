@@ -0,0 +1,215 @@
+"""
+Per-request stage timing.
+
+A sampled request gets a Trace. `span(name)` blocks record how long each
+stage took and `count(name)` tallies events such as cache hits. When the
+request ends, `finish` adds a Server-Timing header to the response and
+prints one CloudWatch Embedded Metric Format (EMF) line with the route,
+status, stage durations and counters. Unsampled requests carry no trace,
+and then every call here costs a single ContextVar lookup.
+
+Spans with the same name add up (e.g. both vector retrievers), so parallel
+stages can sum to more than the request's wall time. Work handed to a thread
+pool is traced when the callable is wrapped with `propagate`. Mongo round
+trips, their time and the documents they returned come from a pymongo
+command listener on the shared client (`mongo_command_listener`).
+
+Tracing is opt-in: set TIMING_SAMPLE_RATE to trace a share of requests.
+
+Environment variables:
+- TIMING_SAMPLE_RATE        → share of requests traced, 0 disables (default 0)
+- TIMING_METRICS_NAMESPACE  → CloudWatch namespace for the EMF metrics (default MovieApi)
+"""
+
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+
+TIMING_SAMPLE_RATE = float(os.environ.get("TIMING_SAMPLE_RATE", 0))
+TIMING_METRICS_NAMESPACE = os.environ.get("TIMING_METRICS_NAMESPACE", "MovieApi")
+
+_current = contextvars.ContextVar("timing_trace", default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counters = {}
+        self.token = None
+        self._lock = threading.Lock()
+
+    def add(self, name, ms):
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + ms
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """
+    Context manager timing one stage of the current request.
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+
+def count(name, value=1):
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+def add_duration(name, ms):
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, ms)
+
+
+def propagate(fn):
+    """
+    Returns `fn` bound to a copy of the caller's context, so spans recorded on
+    a pool thread land in the caller's trace. Wrap once per submission.
+    """
+    if _current.get() is None:
+        return fn
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def start_trace():
+    """
+    Starts tracing the current request if it is sampled; returns the Trace or None.
+    """
+    if TIMING_SAMPLE_RATE <= 0 or (TIMING_SAMPLE_RATE < 1 and random.random() >= TIMING_SAMPLE_RATE):
+        return None
+    trace = Trace()
+    trace.token = _current.set(trace)
+    return trace
+
+
+def route_name(event):
+    """
+    "METHOD /resource", with the movie id folded into {id} when API Gateway
+    did not pass the resource template.
+    """
+    resource = event.get("resource")
+    if not resource or "{proxy+}" in resource:
+        resource = event.get("path", "")
+        if (event.get("pathParameters") or {}).get("id"):
+            resource = resource.rsplit("/", 1)[0] + "/{id}"
+    return f"{event.get('httpMethod')} {resource}"
+
+
+def server_timing(durations):
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in durations.items())
+
+
+def emf_record(trace, route, status):
+    metrics = [{"Name": f"{name}_ms", "Unit": "Milliseconds"} for name in trace.durations]
+    metrics += [{"Name": name, "Unit": "Bytes" if name.endswith("_bytes") else "Count"} for name in trace.counters]
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": TIMING_METRICS_NAMESPACE,
+                "Dimensions": [["route"]],
+                "Metrics": metrics,
+            }],
+        },
+        "route": route,
+        "status": status,
+        **{f"{name}_ms": round(ms, 3) for name, ms in trace.durations.items()},
+        **trace.counters,
+    }
+
+
+def finish(trace, route, result):
+    """
+    Ends the request's trace: adds the Server-Timing header to `result` and
+    prints the EMF line. Returns `result` unchanged when the request was not sampled.
+    """
+    if trace is None:
+        return result
+    _current.reset(trace.token)
+    trace.add("total", (time.perf_counter() - trace.started) * 1000)
+    trace.count("response_bytes", len((result.get("body") or "").encode("utf-8")))
+
+    headers = result.setdefault("headers", {})
+    headers["Server-Timing"] = server_timing(trace.durations)
+    headers["Timing-Allow-Origin"] = "*"
+    print(json.dumps(emf_record(trace, route, result.get("statusCode"))))
+    return result
+
+
+def mongo_command_listener():
+    """
+    pymongo CommandListener counting round trips, their duration and the
+    documents in each cursor batch for the traced request that issued them.
+    Only the decoded reply's batch length is read; nothing is re-encoded.
+    """
+    from pymongo.monitoring import CommandListener
+
+    class MongoCommandTimer(CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            trace = _current.get()
+            if trace is None:
+                return
+            trace.count("mongo_round_trips")
+            trace.add("mongo", event.duration_micros / 1000)
+            reply = event.reply
+            cursor = reply.get("cursor") if isinstance(reply, dict) else None
+            if isinstance(cursor, dict):
+                batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+                if batch is not None:
+                    trace.count("mongo_docs", len(batch))
+
+        def failed(self, event):
+            trace = _current.get()
+            if trace is None:
+                return
+            trace.count("mongo_round_trips")
+            trace.count("mongo_errors")
+            trace.add("mongo", event.duration_micros / 1000)
+
+    return MongoCommandTimer()
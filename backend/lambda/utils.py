@@ -1,25 +1,28 @@
-from bson import ObjectId
 import json
-from datetime import datetime
+import os
+from bson_json import dumps, json_default
+from timing import span
+
+# "true" to print the first 500 characters of every response body
+LOG_PAYLOAD_PREVIEW = os.environ.get("LOG_PAYLOAD_PREVIEW", "false") == "true"
 
 class CustomJSONEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
+        return json_default(obj)
 
 
 
 def response(status, body):
+    # Single pass: RawBSONDocuments in the body are decoded as the encoder reaches them
     try:
-        json_body = json.dumps(body, cls=CustomJSONEncoder, ensure_ascii=False)
+        with span("serialize"):
+            json_body = dumps(body)
     except Exception as e:
         print(f"[ERROR] Failed to serialize body: {e}")
         json_body = json.dumps({"error": "Internal response serialization error"})
 
-    print("Payload preview:", json_body[:500])  # Optional
+    if LOG_PAYLOAD_PREVIEW:
+        print("Payload preview:", json_body[:500])
 
     return {
         'statusCode': status,
@@ -30,3 +33,8 @@ def response(status, body):
         },
         'body': json_body
     }
+
+
+
+def ndjson_line(obj):
+    return json.dumps(obj, cls=CustomJSONEncoder, ensure_ascii=False) + "\n"
@@ -1,20 +1,46 @@
 #batch process to create vector embeddings for existing  db['movies'] in client['moviesdb']
-#the process will get a batch size of 128 chunks/documents that don't have "narrative_embeddings" at a time and will calculate:
+#the process will page through documents that don't have "narrative_embeddings" in batches of 128 (keyset on _id) and will calculate:
 #   1) Vector embeddings for Narrative_Embeddings, natural language concatenation of Type + Title + Plot + Full Plot
 #   2) Vector embeddings for Contextual_Embeddings, natural language concatenation of genres, cast, languages, year, imdb, tomatoes, type, directors, awards, countries
 #   3) [Experimental] Vector embeddings of poster (only if available) with Natural Language.
 #once batch embeddings calculated, results will be stored in same collection.
-
-from pymongo import MongoClient
+#
+#the backfill is a producer/consumer pipeline: the main thread pages documents and builds texts,
+#EMBED_CONCURRENCY workers keep several embedding requests in flight (narrative and contextual texts
+#of a batch go in one multi-input request) under a tokens/requests-per-minute limiter, and one writer
+#thread sends each batch back as a single unordered bulk_write. progress is reported as docs/sec and
+#tokens/sec.
+#
+#usage:
+#   MONGO_URI=... OPENAI_API_KEY=... EMBED_CONCURRENCY=4 OPENAI_TPM_LIMIT=1000000 python utils/batch_embeddings.py
+
+from pymongo import MongoClient, UpdateOne
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import os
+import sys
+import threading
 import time
 import requests
-from openai import OpenAI
+from openai import OpenAI, RateLimitError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_cache import EmbeddingCache, MongoEmbeddingStore
 
 # Setup
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 BATCH_SIZE = 128
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))
+# Account limits for the embedding model; the limiter keeps the pipeline under both
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", 1_000_000))
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", 3_000))
+EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 3072))
+# Same field naming as models.embedding_field
+FIELD_SUFFIX = "" if EMBEDDING_DIMENSIONS == 3072 else f"_{EMBEDDING_DIMENSIONS}"
+NARRATIVE_FIELD = f"narrative_embeddings{FIELD_SUFFIX}"
+CONTEXTUAL_FIELD = f"contextual_embeddings{FIELD_SUFFIX}"
 
 
 # Connect to MongoDB
@@ -27,6 +53,9 @@ print("[Init] Connected to MongoDB.")
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Shares the persistent tier with the Lambda's embedding cache
+embedding_cache = EmbeddingCache(store=MongoEmbeddingStore(db["embedding_cache"]))
+
 
 def build_narrative_text(doc):
     parts = []
@@ -47,9 +76,7 @@ def build_narrative_text(doc):
     if full_plot and full_plot != plot:
         parts.append(f"In more detail, the full plot is as follows: {full_plot}")
 
-    text = " ".join(parts)
-    print(f"[Build] Narrative text: {text[:100]}...")  # Print a preview
-    return text
+    return " ".join(parts)
 
 
 
@@ -129,84 +156,187 @@ def build_contextual_text(doc):
         parts.append(f"This is a {movie_type.lower()}.")
 
     # Final output
-    text = " ".join(parts)
-    print(f"[Build] Contextual text: {text[:100]}...")
-    return text
+    return " ".join(parts)
 
 
 
-def embed_texts(texts, embed_type, max_retries=5):
-    print(f"[Embed] Requesting OpenAI embeddings for {len(texts)} {embed_type} texts...")
-    retries = 0
+def estimate_tokens(text):
+    # ~4 characters per token for English text; corrected with the reported usage
+    return max(1, len(text) // 4)
 
-    while retries < max_retries:
-        try:
-            response = client.embeddings.create(
-                model="text-embedding-3-large",
-                input=texts
-            )
-            embeddings = [item.embedding for item in response.data]
-            print(f"[Embed] Received {len(embeddings)} embeddings.")
-            return embeddings
 
-        except Exception as e:
-            print(f"[Embed] Error embedding {embed_type}: {e}")
-            retries += 1
-            wait_time = 2 ** retries
-            print(f"[Embed] Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
+class RateLimiter:
+    """
+    Token buckets for tokens-per-minute and requests-per-minute. acquire()
+    blocks until a request of the estimated size fits; settle() charges the
+    difference once the API reports the real token usage.
+    """
 
-    print(f"[Embed] Failed to embed {embed_type} after {max_retries} retries.")
-    return [None] * len(texts)
+    def __init__(self, tokens_per_minute, requests_per_minute):
+        self.capacity = {"tokens": tokens_per_minute, "requests": requests_per_minute}
+        self.available = dict(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
 
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        for name, capacity in self.capacity.items():
+            self.available[name] = min(capacity, self.available[name] + elapsed * capacity / 60)
 
-total = 0
-def process_batch():
-    global total
-    print(f"[Batch] Fetching up to {BATCH_SIZE} documents without 'narrative_embeddings'...")
-    docs = list(collection.find(
-        {"narrative_embeddings": {"$exists": False}},
-        limit=BATCH_SIZE
-    ))
+    def acquire(self, tokens):
+        tokens = min(tokens, self.capacity["tokens"])
+        while True:
+            with self.lock:
+                self._refill()
+                if self.available["tokens"] >= tokens and self.available["requests"] >= 1:
+                    self.available["tokens"] -= tokens
+                    self.available["requests"] -= 1
+                    return
+                wait = max(
+                    (tokens - self.available["tokens"]) * 60 / self.capacity["tokens"],
+                    (1 - self.available["requests"]) * 60 / self.capacity["requests"],
+                )
+            time.sleep(min(max(wait, 0.01), 5))
 
-    if not docs:
-        print("[Batch] No more documents to process.")
-        return False
+    def settle(self, estimated, actual):
+        with self.lock:
+            self.available["tokens"] -= actual - estimated
 
-    print(f"[Batch] Fetched {len(docs)} documents.")
 
-    narrative_texts = [build_narrative_text(doc) for doc in docs]
-    contextual_texts = [build_contextual_text(doc) for doc in docs]
+rate_limiter = RateLimiter(OPENAI_TPM_LIMIT, OPENAI_RPM_LIMIT)
 
 
-    try:
-        narrative_embeddings = embed_texts(narrative_texts, "narrative")
-        contextual_embeddings = embed_texts(contextual_texts, "contextual")
+class Progress:
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.docs = 0
+        self.skipped = 0
+        self.tokens = 0
+        self.lock = threading.Lock()
 
-        print("[Update] Writing embeddings back to MongoDB...")
-        for i, doc in enumerate(docs):
-            if narrative_embeddings[i] is None or contextual_embeddings[i] is None:
-                print(f"[Skip] Skipping document {_id_str(doc)} due to failed embeddings.")
-                continue
+    def add(self, docs=0, skipped=0, tokens=0):
+        with self.lock:
+            self.docs += docs
+            self.skipped += skipped
+            self.tokens += tokens
 
-            update_fields = {
-                "narrative_embeddings": narrative_embeddings[i],
-                "contextual_embeddings": contextual_embeddings[i],
-            }
+    def report(self, label="Progress"):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        print(
+            f"[{label}] {self.docs} docs written, {self.skipped} skipped in {elapsed:.0f}s — "
+            f"{self.docs / elapsed:.1f} docs/sec, {self.tokens / elapsed:,.0f} tokens/sec"
+        )
 
-            result = collection.update_one({"_id": doc["_id"]}, {"$set": update_fields})
-            print(f"[Update] Updated document {_id_str(doc)}. Matched: {result.matched_count}, Modified: {result.modified_count}")
-            total += 1
 
-            if i % 10 == 0:
-                print(f"[Progress] Processed {i+1}/{len(docs)} documents...")
+progress = Progress()
 
-        print(f"[Success] Processed and updated {total} documents.")
-        return True
 
-    except Exception as e:
-        print(f"[Error] Exception during embedding or update: {e}")
-        return False
+def embed_texts(texts, embed_type, max_retries=5):
+    cached = embedding_cache.get_many(texts, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    if not missing:
+        return cached
+
+    inputs = [texts[i] for i in missing]
+    estimated = sum(estimate_tokens(text) for text in inputs)
+    retries = 0
+
+    while retries < max_retries:
+        rate_limiter.acquire(estimated)
+        try:
+            response = client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=inputs,
+                dimensions=EMBEDDING_DIMENSIONS
+            )
+            embeddings = [item.embedding for item in response.data]
+            used = response.usage.total_tokens if response.usage else estimated
+            rate_limiter.settle(estimated, used)
+            progress.add(tokens=used)
+            embedding_cache.put_many(inputs, embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+            for i, embedding in zip(missing, embeddings):
+                cached[i] = embedding
+            return cached
+
+        except Exception as e:
+            retries += 1
+            wait_time = 2 ** retries
+            kind = "Rate limited" if isinstance(e, RateLimitError) else "Error"
+            print(f"[Embed] {kind} embedding {len(inputs)} {embed_type} texts: {e}. Retrying in {wait_time} seconds...")
+            time.sleep(wait_time)
+
+    print(f"[Embed] Failed to embed {embed_type} after {max_retries} retries.")
+    return cached
+
+
+def fetch_batches():
+    """
+    Yields batches of documents without embeddings, paging on _id so that
+    documents that failed to embed are not fetched again in the same run.
+    """
+    last_id = None
+    while True:
+        query = {NARRATIVE_FIELD: {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = list(collection.find(query).sort("_id", 1).limit(BATCH_SIZE))
+        if not docs:
+            return
+        last_id = docs[-1]["_id"]
+        yield docs
+
+
+def embed_batch(docs):
+    # Narrative and contextual texts share one multi-input request
+    texts = [build_narrative_text(doc) for doc in docs] + [build_contextual_text(doc) for doc in docs]
+    embeddings = embed_texts(texts, "narrative+contextual")
+    return docs, embeddings[:len(docs)], embeddings[len(docs):]
+
+
+def write_batch(docs, narrative_embeddings, contextual_embeddings):
+    operations = []
+    for doc, narrative, contextual in zip(docs, narrative_embeddings, contextual_embeddings):
+        if narrative is None or contextual is None:
+            print(f"[Skip] Skipping document {_id_str(doc)} due to failed embeddings.")
+            continue
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+            NARRATIVE_FIELD: narrative,
+            CONTEXTUAL_FIELD: contextual,
+        }}))
+
+    if operations:
+        result = collection.bulk_write(operations, ordered=False)
+        progress.add(docs=result.matched_count)
+    progress.add(skipped=len(docs) - len(operations))
+    progress.report()
+
+
+def run_backfill():
+    """
+    Pages documents on the main thread, keeps up to 2 * EMBED_CONCURRENCY
+    embedding batches in flight and hands finished batches to a single writer.
+    """
+    max_in_flight = 2 * EMBED_CONCURRENCY
+    in_flight = deque()
+    writes = []
+
+    def drain_oldest():
+        docs, narrative, contextual = in_flight.popleft().result()
+        writes.append(writer.submit(write_batch, docs, narrative, contextual))
+
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as embedders, ThreadPoolExecutor(max_workers=1) as writer:
+        for docs in fetch_batches():
+            in_flight.append(embedders.submit(embed_batch, docs))
+            while len(in_flight) >= max_in_flight or (in_flight and in_flight[0].done()):
+                drain_oldest()
+        while in_flight:
+            drain_oldest()
+        for write in writes:
+            write.result()
+
+    progress.report("Done")
 
 
 
@@ -214,8 +344,7 @@ def _id_str(doc):
     return str(doc.get("_id", "unknown"))
 
 if __name__ == "__main__":
-    print("[Start] Beginning batch embedding process...")
-    while process_batch():
-        print("[Wait] Sleeping before next batch...\n")
-        time.sleep(1)  # Sleep to avoid overloading the API
+    print(f"[Start] Beginning batch embedding process ({EMBED_CONCURRENCY} concurrent requests, "
+          f"{OPENAI_TPM_LIMIT:,} TPM / {OPENAI_RPM_LIMIT:,} RPM)...")
+    run_backfill()
     print("[Done] All documents processed.")
@@ -0,0 +1,111 @@
+#cold-start benchmark for the Movie API Lambda client initialization
+#compares the legacy per-module init (one Secrets Manager fetch + one MongoClient per module, as
+#mongodb.py / semantic_search.py / hybrid_search.py / models.py used to do at import time)
+#against the shared registry in clients.py.
+#each run happens in a fresh interpreter so imports and connection pools are really cold.
+#secret_fetches and mongo_clients are counted from the GetSecretValue calls and MongoClient
+#constructions each run actually makes.
+#
+#usage:
+#   SECRET_NAME=mongoagent_secrets AWS_REGION=us-east-1 python utils/bench_cold_start.py --runs 5
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that used to fetch the secret and build their own MongoClient at import time.
+LEGACY_MODULES = 4
+
+
+# Counts the GetSecretValue calls and MongoClient instances a run really makes. It is part of
+# the timed code of both modes (it imports botocore and pymongo, which both modes load anyway).
+COUNTERS = """
+import botocore.client
+import pymongo.mongo_client
+
+counts = {"secret_fetches": 0, "mongo_clients": 0}
+
+_make_api_call = botocore.client.BaseClient._make_api_call
+def _counted_api_call(self, operation_name, api_params):
+    if operation_name == "GetSecretValue":
+        counts["secret_fetches"] += 1
+    return _make_api_call(self, operation_name, api_params)
+botocore.client.BaseClient._make_api_call = _counted_api_call
+
+_mongo_init = pymongo.mongo_client.MongoClient.__init__
+def _counted_mongo_init(self, *args, **kwargs):
+    counts["mongo_clients"] += 1
+    _mongo_init(self, *args, **kwargs)
+pymongo.mongo_client.MongoClient.__init__ = _counted_mongo_init
+"""
+
+LEGACY_INIT = """
+import json, os, time
+start = time.perf_counter()
+""" + COUNTERS + f"""
+import boto3
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+from openai import OpenAI
+
+for _ in range({LEGACY_MODULES}):
+    session = boto3.session.Session()
+    secret_client = session.client(service_name="secretsmanager", region_name=os.environ.get("AWS_REGION", "us-west-2"))
+    secrets = json.loads(secret_client.get_secret_value(SecretId=os.environ["SECRET_NAME"])["SecretString"])
+    OpenAI(api_key=secrets["OPENAI_API_KEY"])
+    mongo_client = MongoClient(secrets["MONGODB_URI"], server_api=ServerApi('1'))
+    mongo_client.admin.command("ping")
+print(json.dumps({{"seconds": time.perf_counter() - start, **counts}}))
+"""
+
+# Every module that used to build its own clients now asks the registry
+REGISTRY_INIT = """
+import json, time
+start = time.perf_counter()
+""" + COUNTERS + """
+import clients
+for _ in range(%d):
+    clients.get_openai_client()
+    clients.get_mongo_client().admin.command("ping")
+clients.get_bedrock_client()
+print(json.dumps({"seconds": time.perf_counter() - start, **counts}))
+""" % LEGACY_MODULES
+
+
+def run_once(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=LAMBDA_DIR,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(label, samples):
+    seconds = [s["seconds"] for s in samples]
+    print(
+        f"[{label}] runs={len(seconds)} "
+        f"median={statistics.median(seconds) * 1000:.1f}ms "
+        f"min={min(seconds) * 1000:.1f}ms max={max(seconds) * 1000:.1f}ms "
+        f"secret_fetches={samples[0]['secret_fetches']} mongo_clients={samples[0]['mongo_clients']}"
+    )
+    return statistics.median(seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare cold-start init time before and after the shared client registry.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"[Start] Running {args.runs} cold starts per mode...")
+    legacy = summarize("legacy", [run_once(LEGACY_INIT) for _ in range(args.runs)])
+    registry = summarize("registry", [run_once(REGISTRY_INIT) for _ in range(args.runs)])
+    print(f"[Done] Registry init is {legacy / registry:.2f}x faster ({(legacy - registry) * 1000:.1f}ms saved per cold start).")
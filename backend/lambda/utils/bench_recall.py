@@ -0,0 +1,280 @@
+#recall-vs-latency benchmark for the vector search parameters.
+#loads a catalog snapshot (ids + narrative/contextual vectors), computes exact top-k ground truth
+#with a NumPy brute-force scan and sweeps the search parameters against it:
+#   semantic: numCandidates (atlas target) or nprobe (local IVF target)
+#   hybrid:   candidate depth and rrf_k, fused with fusion.fuse exactly like hybrid_search
+#each configuration reports recall@k, nDCG@k and p50/p99 latency.
+#
+#the semantic ground truth is the exact max(contextual, narrative) score per movie, which is what
+#semantic_search ranks by. the hybrid ground truth fuses an exact narrative ranking with the same
+#full-text ranking, so hybrid recall isolates the loss from approximate vector retrieval.
+#hybrid sweeps need query texts (--queries) and the atlas target, since they run $search.
+#
+#usage:
+#   python utils/bench_recall.py snapshot --sample 5000 --out /tmp/catalog.npz        # dump vectors from Atlas
+#   python utils/bench_recall.py semantic --snapshot /tmp/catalog.npz --target local --nprobe 1,2,4,8,16
+#   python utils/bench_recall.py semantic --snapshot /tmp/catalog.npz --target atlas --num-candidates 50,100,200,400
+#   python utils/bench_recall.py hybrid --snapshot /tmp/catalog.npz --queries queries.txt --depth 10,20,40 --rrf-k 20,40,60
+#   python utils/bench_recall.py semantic --synthetic 20000 --dims 256 --target local     # no Atlas needed
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import embedding_field
+from vector_index import IVFIndex, encode_id, decode_id
+
+
+def parse_list(value, cast=int):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+# ---------------------------------------------------------------- catalog and queries
+
+def dump_snapshot(sample, out):
+    from clients import get_collection
+
+    fields = {"narrative": embedding_field("narrative"), "contextual": embedding_field("contextual")}
+    pipeline = [{"$match": {fields["narrative"]: {"$exists": True}, fields["contextual"]: {"$exists": True}}}]
+    if sample:
+        pipeline.append({"$sample": {"size": sample}})
+    pipeline.append({"$project": {"_id": 1, "title": 1, **{f: 1 for f in fields.values()}}})
+
+    ids, titles, narrative, contextual = [], [], [], []
+    for doc in get_collection("movies").aggregate(pipeline, allowDiskUse=True):
+        ids.append(json.dumps(encode_id(doc["_id"])))
+        titles.append(doc.get("title", ""))
+        narrative.append(doc[fields["narrative"]])
+        contextual.append(doc[fields["contextual"]])
+    np.savez(out, ids=np.array(ids), titles=np.array(titles),
+             narrative=np.asarray(narrative, dtype=np.float32), contextual=np.asarray(contextual, dtype=np.float32))
+    print(f"[Snapshot] Saved {len(ids)} movies to {out}")
+
+
+def load_snapshot(path):
+    data = np.load(path)
+    ids = [decode_id(json.loads(entry)) for entry in data["ids"]]
+    return ids, normalize(data["narrative"]), normalize(data["contextual"])
+
+
+def synthetic_catalog(docs, dims, clusters=64, seed=7):
+    # Clustered vectors, so an IVF index has structure to exploit as with real embeddings
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims))
+    assignment = rng.integers(0, clusters, size=docs)
+    narrative = centers[assignment] + 0.6 * rng.normal(size=(docs, dims))
+    contextual = centers[assignment] + 0.6 * rng.normal(size=(docs, dims))
+    ids = [f"movie-{i:06d}" for i in range(docs)]
+    return ids, normalize(narrative), normalize(contextual)
+
+
+def load_queries(args, narrative):
+    """
+    Returns (texts, vectors). Query texts are embedded like real searches;
+    without them, queries are noisy copies of catalog vectors.
+    """
+    if args.queries:
+        from models import create_embeddings
+        with open(args.queries) as f:
+            texts = [line.strip() for line in f if line.strip()][:args.num_queries]
+        return texts, normalize([create_embeddings(text) for text in texts])
+    rng = np.random.default_rng(42)
+    rows = rng.choice(len(narrative), size=min(args.num_queries, len(narrative)), replace=False)
+    vectors = narrative[rows] + 0.3 * rng.normal(size=(len(rows), narrative.shape[1])) / np.sqrt(narrative.shape[1])
+    return None, normalize(vectors)
+
+
+# ---------------------------------------------------------------- ground truth and metrics
+
+def exact_ranking(matrix, query, depth):
+    scores = matrix @ query
+    depth = min(depth, len(scores))
+    top = np.argpartition(-scores, depth - 1)[:depth]
+    return top[np.argsort(-scores[top], kind="stable")], scores
+
+
+def exact_semantic(narrative, contextual, query, k):
+    # semantic_search keeps each movie's best score across both vector fields
+    scores = np.maximum(narrative @ query, contextual @ query)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def recall_at_k(result_ids, truth_ids, k):
+    return len(set(result_ids[:k]) & set(truth_ids[:k])) / max(1, min(k, len(truth_ids)))
+
+
+def ndcg_at_k(result_ids, truth_ids, k):
+    # Graded relevance: the exact #1 result is worth k, the exact #k result 1
+    gain = {_id: k - rank for rank, _id in enumerate(truth_ids[:k])}
+    dcg = sum(gain.get(_id, 0) / np.log2(rank + 2) for rank, _id in enumerate(result_ids[:k]))
+    ideal = sum((k - rank) / np.log2(rank + 2) for rank in range(min(k, len(truth_ids))))
+    return dcg / ideal if ideal else 0.0
+
+
+def summarize(label, recalls, ndcgs, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    row = {
+        "config": label,
+        "recall": statistics.mean(recalls),
+        "ndcg": statistics.mean(ndcgs),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": p99,
+    }
+    print(f"{label:<34} recall@k={row['recall']:.3f}  nDCG@k={row['ndcg']:.3f}  "
+          f"p50={row['p50_ms']:.1f}ms  p99={row['p99_ms']:.1f}ms")
+    return row
+
+
+# ---------------------------------------------------------------- semantic sweep
+
+def semantic_local(ids, narrative, contextual, queries, k, nprobes):
+    indexes = {
+        "narrative": IVFIndex(narrative.shape[1]).build(ids, narrative),
+        "contextual": IVFIndex(contextual.shape[1]).build(ids, contextual),
+    }
+    truths = [[ids[i] for i in exact_semantic(narrative, contextual, q, k)] for q in queries]
+    rows = []
+    for nprobe in nprobes:
+        recalls, ndcgs, latencies = [], [], []
+        for query, truth in zip(queries, truths):
+            start = time.perf_counter()
+            best = {}
+            for index in indexes.values():
+                for _id, score in index.search(query, k=k, nprobe=nprobe):
+                    best[_id] = max(best.get(_id, 0.0), score)
+            result = sorted(best, key=best.get, reverse=True)[:k]
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(recall_at_k(result, truth, k))
+            ndcgs.append(ndcg_at_k(result, truth, k))
+        rows.append(summarize(f"local nprobe={nprobe}", recalls, ndcgs, latencies))
+    return rows
+
+
+def semantic_atlas(ids, narrative, contextual, queries, k, num_candidates):
+    from clients import get_collection
+    from semantic_search import build_semantic_search_pipeline
+
+    collection = get_collection("movies")
+    in_snapshot = set(ids)
+    truths = [[ids[i] for i in exact_semantic(narrative, contextual, q, k)] for q in queries]
+    rows = []
+    for candidates in num_candidates:
+        recalls, ndcgs, latencies = [], [], []
+        for query, truth in zip(queries, truths):
+            pipeline = build_semantic_search_pipeline(query.tolist(), k, fields=["title"], num_candidates=candidates)
+            start = time.perf_counter()
+            result = [doc["_id"] for doc in collection.aggregate(pipeline)]
+            latencies.append((time.perf_counter() - start) * 1000)
+            # A sampled snapshot only knows its own movies
+            result = [_id for _id in result if _id in in_snapshot]
+            recalls.append(recall_at_k(result, truth, k))
+            ndcgs.append(ndcg_at_k(result, truth, k))
+        rows.append(summarize(f"atlas numCandidates={candidates}", recalls, ndcgs, latencies))
+    return rows
+
+
+# ---------------------------------------------------------------- hybrid sweep
+
+def hybrid_atlas(ids, narrative, texts, queries, k, depths, rrf_ks, num_candidates):
+    """
+    Both sides fuse the same full-text ranking; the approximate side uses the
+    Atlas narrative vector search, the exact side a brute-force scan.
+    """
+    from fusion import default_weights, fuse, run_retrievers, text_retriever_pipeline, vector_retriever_pipeline, \
+        DEFAULT_KEYWORD_CATEGORIES
+
+    retrievers = ("narrative", "text")
+    max_depth = max(depths)
+    text_rankings = []
+    for text in texts:
+        ranked = run_retrievers({"text": text_retriever_pipeline(text, DEFAULT_KEYWORD_CATEGORIES, max_depth)})
+        text_rankings.append(ranked["text"])
+
+    rows = []
+    for depth in depths:
+        for rrf_k in rrf_ks:
+            recalls, ndcgs, latencies = [], [], []
+            for text, query, (text_ids, text_scores) in zip(texts, queries, text_rankings):
+                weights = default_weights(text, text, retrievers)
+                text_branch = (text_ids[:depth], text_scores[:depth])
+
+                top, scores = exact_ranking(narrative, query, depth)
+                exact = {"narrative": ([ids[i] for i in top], (1 + scores[top]) / 2), "text": text_branch}
+                truth, _, _ = fuse(exact, weights, "rrf", rrf_k)
+
+                start = time.perf_counter()
+                approximate = run_retrievers({
+                    "narrative": vector_retriever_pipeline("narrative", query.tolist(), depth, num_candidates=num_candidates)
+                })
+                approximate["text"] = text_branch
+                result, _, _ = fuse(approximate, weights, "rrf", rrf_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+                recalls.append(recall_at_k(result, truth, k))
+                ndcgs.append(ndcg_at_k(result, truth, k))
+            rows.append(summarize(f"hybrid depth={depth} rrf_k={rrf_k}", recalls, ndcgs, latencies))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency sweeps for semantic and hybrid search.")
+    parser.add_argument("mode", choices=["snapshot", "semantic", "hybrid"])
+    parser.add_argument("--snapshot", help="catalog .npz written by the snapshot mode")
+    parser.add_argument("--out", default="/tmp/catalog.npz", help="snapshot mode output")
+    parser.add_argument("--sample", type=int, default=0, help="snapshot mode: sample this many movies (0 = all)")
+    parser.add_argument("--synthetic", type=int, default=0, help="use a synthetic clustered catalog of this size")
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--queries", help="file with one query text per line (embedded with create_embeddings)")
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--target", choices=["atlas", "local"], default="atlas")
+    parser.add_argument("--num-candidates", default="50,100,200,400")
+    parser.add_argument("--nprobe", default="1,2,4,8,16")
+    parser.add_argument("--depth", default="10,20,40")
+    parser.add_argument("--rrf-k", default="20,40,60")
+    parser.add_argument("--json", help="write the result rows to this file")
+    args = parser.parse_args()
+
+    if args.mode == "snapshot":
+        dump_snapshot(args.sample, args.out)
+        sys.exit(0)
+
+    if args.synthetic:
+        ids, narrative, contextual = synthetic_catalog(args.synthetic, args.dims)
+    elif args.snapshot:
+        ids, narrative, contextual = load_snapshot(args.snapshot)
+    else:
+        parser.error("pass --snapshot or --synthetic")
+
+    texts, queries = load_queries(args, narrative)
+    print(f"[Start] {len(ids)} movies, {narrative.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    if args.mode == "semantic" and args.target == "local":
+        rows = semantic_local(ids, narrative, contextual, queries, args.k, parse_list(args.nprobe))
+    elif args.mode == "semantic":
+        rows = semantic_atlas(ids, narrative, contextual, queries, args.k, parse_list(args.num_candidates))
+    elif texts is None or args.target != "atlas":
+        parser.error("hybrid sweeps need --queries and --target atlas ($search has no local stand-in)")
+    else:
+        rows = hybrid_atlas(ids, narrative, texts, queries, args.k, parse_list(args.depth),
+                            parse_list(args.rrf_k), max(parse_list(args.num_candidates)))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"[Done] Wrote {len(rows)} rows to {args.json}")
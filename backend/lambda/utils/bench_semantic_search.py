@@ -0,0 +1,100 @@
+#latency comparison harness for semantic_search on a local stand-in collection.
+#compares the legacy path (two sequential $vectorSearch aggregations merged in Python) with the
+#single-round-trip $unionWith pipeline from semantic_search.build_semantic_search_pipeline.
+#the stand-in collection simulates a fixed network round trip per aggregate() call, so the
+#difference reflects the round trips saved rather than Atlas server time.
+#
+#usage:
+#   python utils/bench_semantic_search.py --docs 2000 --dims 256 --rtt-ms 20 --runs 50
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The in-memory stand-ins live in backend/dev, outside the Lambda bundle
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "dev"))
+
+from memory_collection import InMemoryDatabase
+from semantic_search import build_semantic_search_pipeline, build_vector_search_stage
+
+
+def random_vector(dims, rng):
+    return [rng.gauss(0, 1) for _ in range(dims)]
+
+
+def build_catalog(collection, docs, dims, seed=7):
+    rng = random.Random(seed)
+    collection.documents = [
+        {
+            "_id": f"movie-{i:06d}",
+            "title": f"Movie {i}",
+            "year": 1950 + i % 70,
+            "narrative_embeddings": random_vector(dims, rng),
+            "contextual_embeddings": random_vector(dims, rng),
+        }
+        for i in range(docs)
+    ]
+
+
+def legacy_search(collection, query_vector, limit):
+    contextual_results = list(collection.aggregate(build_vector_search_stage(
+        query_vector, "contextual_embeddings", "vector_index", "contextual", limit)))
+    narrative_results = list(collection.aggregate(build_vector_search_stage(
+        query_vector, "narrative_embeddings", "vector_index", "narrative", limit)))
+
+    merged_results = {}
+    for result in contextual_results + narrative_results:
+        _id = result["_id"]
+        if _id not in merged_results or result["score"] > merged_results[_id]["score"]:
+            merged_results[_id] = result
+    return sorted(merged_results.values(), key=lambda x: (-x["score"], x["_id"]))[:limit]
+
+
+def single_round_trip_search(collection, query_vector, limit):
+    return list(collection.aggregate(build_semantic_search_pipeline(query_vector, limit)))
+
+
+def measure(label, fn, collection, queries, limit):
+    latencies = []
+    collection.round_trips = 0
+    results = []
+    for query_vector in queries:
+        start = time.perf_counter()
+        results.append(fn(collection, query_vector, limit))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"[{label}] p50={statistics.median(latencies):.1f}ms p99={p99:.1f}ms "
+        f"round_trips/query={collection.round_trips / len(queries):.1f}"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sequential vs single-round-trip semantic search latency.")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="simulated round trip per aggregate() call")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    db = InMemoryDatabase(latency_ms=args.rtt_ms)
+    collection = db["movies"]
+    build_catalog(collection, args.docs, args.dims)
+    rng = random.Random(42)
+    queries = [random_vector(args.dims, rng) for _ in range(args.runs)]
+
+    print(f"[Start] {args.docs} docs, {args.dims} dims, {args.rtt_ms}ms simulated RTT, {args.runs} queries")
+    legacy = measure("sequential", legacy_search, collection, queries, args.limit)
+    single = measure("$unionWith", single_round_trip_search, collection, queries, args.limit)
+
+    mismatches = sum(
+        [d["_id"] for d in a] != [d["_id"] for d in b] for a, b in zip(legacy, single)
+    )
+    print(f"[Check] {len(queries) - mismatches}/{len(queries)} queries returned identical rankings")
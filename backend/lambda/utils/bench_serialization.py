@@ -0,0 +1,102 @@
+#micro-benchmark for the response serialization path over a 100-movie result set.
+#old path: the driver decodes BSON into dicts, clean_mongo_document rebuilds each one and
+#json.dumps runs with CustomJSONEncoder. new path: the RawBSONDocuments a raw cursor returns go
+#through bson_json.dumps in a single encoder pass. the movies are synthetic but shaped like
+#sample_mflix documents (nested imdb/tomatoes, datetimes, cast lists, long fullplot text,
+#non-ascii titles).
+#
+#usage:
+#   python utils/bench_serialization.py --movies 100 --runs 200
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+from bson_json import dumps
+from resource_movie import clean_mongo_document
+from utils import CustomJSONEncoder
+
+
+WORDS = ["love", "war", "city", "night", "family", "secret", "journey", "détective", "東京", "river", "\"quoted\""]
+
+
+def build_movie(i, rng):
+    released = datetime(1950, 1, 1) + timedelta(days=rng.randint(0, 25000))
+    return {
+        "_id": ObjectId(),
+        "title": f"{rng.choice(WORDS).title()} {i}",
+        "plot": " ".join(rng.choice(WORDS) for _ in range(30)),
+        "fullplot": " ".join(rng.choice(WORDS) for _ in range(250)) + "\nThe end.",
+        "genres": rng.sample(["Drama", "Comedy", "Crime", "Romance", "Action"], 2),
+        "runtime": rng.randint(70, 180),
+        "cast": [f"Actor {rng.randint(1, 5000)}" for _ in range(4)],
+        "poster": f"https://m.media-amazon.com/images/M/{i}.jpg",
+        "languages": ["English"],
+        "released": released,
+        "directors": [f"Director {rng.randint(1, 500)}"],
+        "rated": rng.choice(["G", "PG", "PG-13", "R"]),
+        "awards": {"wins": rng.randint(0, 20), "nominations": rng.randint(0, 40), "text": "2 wins."},
+        "year": released.year,
+        "imdb": {"rating": round(rng.uniform(1, 10), 1), "votes": rng.randint(5, 900000), "id": rng.randint(1, 999999)},
+        "countries": ["USA"],
+        "type": "movie",
+        "tomatoes": {
+            "viewer": {"rating": round(rng.uniform(0, 5), 1), "numReviews": rng.randint(0, 100000), "meter": rng.randint(0, 100)},
+            "lastUpdated": released + timedelta(days=9000, milliseconds=rng.randint(0, 10 ** 6)),
+        },
+        "num_mflix_comments": rng.randint(0, 200),
+        "lastupdated": "2015-09-10 00:19:25.140000000",
+        "score": rng.random(),
+    }
+
+
+def old_path(payloads):
+    docs = [bson.decode(payload) for payload in payloads]
+    body = {"message": "ok", "movies": [clean_mongo_document(doc) for doc in docs]}
+    return json.dumps(body, cls=CustomJSONEncoder, ensure_ascii=False)
+
+
+def new_path(payloads):
+    docs = [RawBSONDocument(payload) for payload in payloads]
+    return dumps({"message": "ok", "movies": docs})
+
+
+def measure(label, fn, payloads, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(payloads)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"[{label}] p50={statistics.median(timings):.3f}ms p99={p99:.3f}ms")
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the two-pass and single-pass response serializers.")
+    parser.add_argument("--movies", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    payloads = [bson.encode(build_movie(i, rng)) for i in range(args.movies)]
+    print(f"[Start] {args.movies} movies, {sum(map(len, payloads)) / 1024:.0f} KiB of BSON, {args.runs} runs")
+
+    identical = old_path(payloads) == new_path(payloads)
+    print(f"[Check] outputs identical: {identical}")
+
+    old = measure("decode + clean + json.dumps", old_path, payloads, args.runs)
+    new = measure("raw bson single pass", new_path, payloads, args.runs)
+    print(f"[Result] {old / new:.2f}x")
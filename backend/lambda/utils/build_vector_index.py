@@ -0,0 +1,32 @@
+#builds the local IVF vector indexes (see vector_index.py) from the movies collection and persists them
+#to LOCAL_VECTOR_INDEX_DIR, one sub-directory per vector field. Copy the output next to the Lambda
+#(or onto an EFS mount) and set VECTOR_BACKEND=local to serve queries without Atlas $vectorSearch.
+#
+#usage:
+#   MONGO_URI=... LOCAL_VECTOR_INDEX_DIR=./vector_index LOCAL_VECTOR_DTYPE=float16 python utils/build_vector_index.py
+
+from pymongo import MongoClient
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vector_index import VECTOR_FIELDS, LOCAL_VECTOR_INDEX_DIR, build_from_collection
+
+# Setup
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+
+print("[Init] Connecting to MongoDB...")
+mongo_client = MongoClient(MONGO_URI)
+db = mongo_client["sample_mflix"]
+collection = db["movies"]
+print("[Init] Connected to MongoDB.")
+
+
+if __name__ == "__main__":
+    for field in VECTOR_FIELDS:
+        start = time.perf_counter()
+        index = build_from_collection(collection, field)
+        directory = os.path.join(LOCAL_VECTOR_INDEX_DIR, field)
+        index.save(directory)
+        print(f"[Done] {field}: {len(index)} vectors, {index.nlist} lists, {index.dtype.name} -> {directory} ({time.perf_counter() - start:.1f}s)")
@@ -0,0 +1,309 @@
+#throughput load harness for movies_api_handler.handler.
+#replays API Gateway proxy events concurrently against the handler in process and reports
+#requests/sec and p50/p95/p99/max latency per route. events come from a recording (a JSON array
+#or one event per line) or from a built-in read-heavy mix over the catalog.
+#
+#by default everything runs on the local stand-ins (backend/dev/stand_ins.py): an in-memory catalog of
+#synthetic movies embedded with the hashing embedder, and a canned Bedrock responder. each
+#stand-in has a base latency and an exponential jitter, so the tails reflect the simulated
+#services plus our own work. --backend live uses the real clients (needs SECRET_NAME).
+#handler logging goes to /dev/null unless --verbose, the prints would dominate the profile.
+#
+#usage:
+#   python utils/load_test.py --movies 2000 --concurrency 8 --requests 2000
+#   python utils/load_test.py --events recorded.jsonl --duration 60 --mongo-ms 5 --embed-ms 60 --llm-ms 900 --llm-jitter-ms 400
+#   python utils/load_test.py --dump-events /tmp/mix.jsonl --requests 500         # write the built-in mix and exit
+#   SECRET_NAME=mongoagent_secrets python utils/load_test.py --backend live --events recorded.jsonl
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The in-memory stand-ins live in backend/dev, outside the Lambda bundle
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "dev"))
+
+
+GENRES = ["Action", "Comedy", "Drama", "Crime", "Romance", "Thriller", "Horror", "Western", "Family", "War"]
+FIRST_NAMES = ["Anna", "Marlon", "Grace", "James", "Sofia", "Tom", "Meryl", "Akira", "Ingrid", "Denzel"]
+LAST_NAMES = ["Brando", "Kelly", "Stewart", "Loren", "Hanks", "Streep", "Kurosawa", "Bergman", "Washington", "Ford"]
+NOUNS = ["city", "river", "family", "secret", "heist", "war", "island", "train", "detective", "ghost", "king", "storm"]
+PLOTS = [
+    "a {noun} hides a {noun2} that could ruin an old {noun3}",
+    "two strangers cross a {noun} to escape a {noun2}",
+    "a retired {noun} returns for one last {noun2}",
+    "a small town {noun} is torn apart by a {noun2}",
+]
+QUERIES = [
+    "{genre} movies about a {noun}",
+    "a retired {noun} returns for one last {noun2}",
+    "{first} {last} {genre}",
+    "films where a {noun} hides a {noun2}",
+    "{genre} with {first} {last} about a {noun}",
+]
+
+
+def fill(template, rng):
+    return template.format(
+        genre=rng.choice(GENRES).lower(), noun=rng.choice(NOUNS), noun2=rng.choice(NOUNS), noun3=rng.choice(NOUNS),
+        first=rng.choice(FIRST_NAMES), last=rng.choice(LAST_NAMES),
+    )
+
+
+def person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def build_catalog(count, embedder, seed=7):
+    from bson import ObjectId
+    from models import build_contextual_text, build_narrative_text, embedding_field, embedding_text_hash, text_hash_field
+
+    rng = random.Random(seed)
+    movies = []
+    for i in range(count):
+        plot = fill(rng.choice(PLOTS), rng)
+        movie = {
+            "_id": ObjectId(),
+            "title": f"The {rng.choice(NOUNS).title()} {i}",
+            "plot": plot.capitalize() + ".",
+            "fullplot": (plot.capitalize() + ". ") * 3,
+            "genres": rng.sample(GENRES, 2),
+            "cast": [person(rng) for _ in range(3)],
+            "directors": [person(rng)],
+            "languages": ["English"],
+            "countries": ["USA"],
+            "year": rng.randint(1950, 2020),
+            "rated": rng.choice(["G", "PG", "PG-13", "R"]),
+            "runtime": rng.randint(80, 170),
+            "type": "movie",
+            "imdb": {"rating": round(rng.uniform(3, 9), 1), "votes": rng.randint(10, 500000), "id": i},
+            "poster": f"https://example.com/posters/{i}.jpg",
+        }
+        for kind, text in (("narrative", build_narrative_text(movie)), ("contextual", build_contextual_text(movie))):
+            movie[embedding_field(kind)] = embedder.embed(text)
+            movie[text_hash_field(kind)] = embedding_text_hash(text)
+        movies.append(movie)
+    return movies
+
+
+def default_events(catalog, count, writes=False, seed=11):
+    """
+    Read-heavy mix: listing, lookups and every search mode, optionally with updates.
+    """
+    from server import build_event
+
+    rng = random.Random(seed)
+    ids = [str(movie["_id"]) for movie in catalog]
+    mix = [
+        (3, lambda: build_event("GET", f"/movies?limit={rng.choice([10, 20, 50])}", None)),
+        (3, lambda: build_event("GET", f"/movies/{rng.choice(ids)}", None)),
+        (3, lambda: build_event("POST", "/movies/search", json.dumps({"request": fill(rng.choice(QUERIES), rng)}))),
+        (2, lambda: build_event("POST", "/movies/search?hybrid=true", json.dumps({"request": fill(rng.choice(QUERIES), rng)}))),
+        (1, lambda: build_event("POST", "/movies/search?hybrid=true&reranking=true&fields=card",
+                                json.dumps({"request": fill(rng.choice(QUERIES), rng)}))),
+        (1, lambda: build_event("POST", "/movies/search?agent=true", json.dumps({"request": fill(rng.choice(QUERIES), rng)}))),
+        (1, lambda: build_event("POST", "/movies/search?stream=true&hybrid=true",
+                                json.dumps({"request": fill(rng.choice(QUERIES), rng)}))),
+    ]
+    if writes:
+        mix.append((1, lambda: build_event("PUT", f"/movies/{rng.choice(ids)}",
+                                           json.dumps({"plot": fill(rng.choice(PLOTS), rng).capitalize() + "."}))))
+    weights = [weight for weight, _ in mix]
+    return [rng.choices(mix, weights)[0][1]() for _ in range(count)]
+
+
+def load_events(path):
+    with open(path) as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def route_key(event):
+    """
+    "METHOD /resource" with ids folded into {id}; searches are split by mode.
+    """
+    method = event["httpMethod"]
+    path = event["path"]
+    if (event.get("pathParameters") or {}).get("id"):
+        path = path.rsplit("/", 1)[0] + "/{id}"
+    key = f"{method} {path}"
+    if path == "/movies/search":
+        params = event.get("queryStringParameters") or {}
+        mode = "agent" if params.get("agent") == "true" else "hybrid" if params.get("hybrid") == "true" else "semantic"
+        flags = [flag for flag in ("reranking", "stream") if params.get(flag) == "true"]
+        key += f" [{'+'.join([mode] + flags)}]"
+    return key
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, status):
+        with self._lock:
+            self.samples.setdefault(route, []).append(seconds * 1000)
+            if status >= 500:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def serve(event):
+    """
+    Returns the status server.py would send: stream=true searches go through
+    stream_handler and are drained, every other event through handler.
+    """
+    from movies_api_handler import handler, stream_handler
+
+    params = event.get("queryStringParameters") or {}
+    if event["path"] == "/movies/search" and event["httpMethod"] == "POST" and params.get("stream") == "true":
+        error, lines = stream_handler(event)
+        if error is not None:
+            return error["statusCode"]
+        failed = any('"event": "error"' in line for line in lines)
+        return 500 if failed else 200
+    return handler(event, None)["statusCode"]
+
+
+def run(events, concurrency, requests, duration, warmup):
+    for event in events[:warmup]:
+        serve(event)
+
+    recorder = Recorder()
+    position = iter(range(requests or sys.maxsize))
+    position_lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        while deadline is None or time.perf_counter() < deadline:
+            with position_lock:
+                i = next(position, None)
+            if i is None:
+                return
+            event = events[i % len(events)]
+            start = time.perf_counter()
+            try:
+                status = serve(event)
+            except Exception:
+                status = 599
+            recorder.record(route_key(event), time.perf_counter() - start, status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+def report(recorder, elapsed):
+    rows = []
+    everything = []
+    for route in sorted(recorder.samples):
+        latencies = sorted(recorder.samples[route])
+        everything.extend(latencies)
+        rows.append((route, latencies, recorder.errors.get(route, 0)))
+    rows.append(("all routes", sorted(everything), sum(recorder.errors.values())))
+
+    print(f"{'route':<42}{'count':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    summary = []
+    for route, latencies, errors in rows:
+        row = {
+            "route": route,
+            "count": len(latencies),
+            "errors": errors,
+            "rps": len(latencies) / elapsed,
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": latencies[-1],
+        }
+        summary.append(row)
+        print(f"{route:<42}{row['count']:>7}{errors:>8}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay API Gateway events against the Movie API handler under load.")
+    parser.add_argument("--backend", choices=["local", "live"], default="local")
+    parser.add_argument("--events", help="recorded API Gateway events (JSON array or JSON lines)")
+    parser.add_argument("--dump-events", help="write the built-in event mix to this file and exit")
+    parser.add_argument("--writes", action="store_true", help="add PUT /movies/{id} to the built-in mix")
+    parser.add_argument("--movies", type=int, default=1000, help="local catalog size")
+    parser.add_argument("--dims", type=int, default=256, help="local embedding dimensions")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000, help="requests to send (0 = until --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run (0 = until --requests)")
+    parser.add_argument("--warmup", type=int, default=20, help="events replayed first and left out of the results")
+    parser.add_argument("--mongo-ms", type=float, default=2.0, help="simulated Atlas round trip")
+    parser.add_argument("--embed-ms", type=float, default=40.0, help="simulated embeddings request latency")
+    parser.add_argument("--embed-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--llm-ms", type=float, default=800.0, help="simulated Bedrock latency")
+    parser.add_argument("--llm-jitter-ms", type=float, default=300.0)
+    parser.add_argument("--llm-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--no-caches", action="store_true", help="disable the search, query and embedding caches")
+    parser.add_argument("--verbose", action="store_true", help="keep the handler's logging")
+    parser.add_argument("--json", help="write the per-route results to this file")
+    args = parser.parse_args()
+
+    if args.no_caches:
+        os.environ["SEARCH_CACHE_ENABLED"] = "false"
+        os.environ["QUERY_CACHE_ENABLED"] = "false"
+        os.environ["EMBEDDING_CACHE_BACKEND"] = "none"
+    if args.backend == "local":
+        # Module settings are read at import time, so they are set before the first import
+        os.environ.setdefault("EMBEDDING_DIMENSIONS", str(args.dims))
+        os.environ.setdefault("VECTOR_BACKEND", "atlas")
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        catalog = []
+        if args.backend == "local":
+            import stand_ins
+            from memory_collection import InMemoryClient
+
+            mongo = InMemoryClient(latency_ms=args.mongo_ms)
+            embedder = stand_ins.HashingEmbedder(args.dims, args.embed_ms, args.embed_jitter_ms)
+            bedrock = stand_ins.CannedBedrock(args.llm_ms, args.llm_jitter_ms, throttle_rate=args.llm_throttle_rate)
+            catalog = build_catalog(args.movies, embedder)
+            stand_ins.install(mongo, embedder, bedrock)
+            from clients import get_collection
+            get_collection("movies").documents = catalog
+
+        if args.events:
+            events = load_events(args.events)
+        elif catalog:
+            events = default_events(catalog, max(args.requests, 1000), writes=args.writes)
+        else:
+            parser.error("--backend live needs --events")
+
+        if args.dump_events:
+            with open(args.dump_events, "w") as f:
+                f.writelines(json.dumps(event) + "\n" for event in events)
+            print(f"[Done] Wrote {len(events)} events to {args.dump_events}", file=sys.stderr)
+            sys.exit(0)
+
+        plan = f"{args.requests} requests" if args.requests else "requests"
+        if args.duration:
+            plan += f" for up to {args.duration:g}s"
+        print(f"[Start] {plan} over {len(events)} events, {args.concurrency} workers, backend={args.backend}", file=sys.stderr)
+        recorder, elapsed = run(events, args.concurrency, args.requests, args.duration, args.warmup)
+
+    summary = report(recorder, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
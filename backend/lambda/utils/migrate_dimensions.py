@@ -0,0 +1,149 @@
+#matryoshka dimension migration for the stored text-embedding-3-large vectors.
+#text-embedding-3 vectors can be shortened by keeping the first N components and re-normalizing, which is
+#what the API's `dimensions` parameter does. This tool:
+#   migrate  → writes truncated copies into narrative_embeddings_<N> / contextual_embeddings_<N> and creates
+#              a matching "vector_index_<N>" Atlas vector index (set EMBEDDING_DIMENSIONS=<N> to serve from it)
+#   report   → recall-vs-size report of truncated vectors against the full 3072-dim ranking on our catalog
+#
+#usage:
+#   MONGO_URI=... python utils/migrate_dimensions.py migrate --dims 1024
+#   MONGO_URI=... python utils/migrate_dimensions.py report --dims 256,512,1024,3072 --sample 5000 --queries 200
+
+from pymongo import MongoClient, UpdateOne
+import argparse
+import os
+import time
+
+import numpy as np
+
+# Setup
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+FULL_DIMENSIONS = 3072
+BATCH_SIZE = 500
+KINDS = ["narrative", "contextual"]
+
+
+def field_name(kind, dims):
+    # Same field naming as models.embedding_field
+    return f"{kind}_embeddings" if dims == FULL_DIMENSIONS else f"{kind}_embeddings_{dims}"
+
+
+def truncate(vectors, dims):
+    vectors = np.asarray(vectors, dtype=np.float32)[:, :dims]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def migrate(collection, db, dims):
+    source_fields = {field_name(kind, FULL_DIMENSIONS): 1 for kind in KINDS}
+    cursor = collection.find(
+        {field_name("narrative", FULL_DIMENSIONS): {"$exists": True}},
+        source_fields,
+        batch_size=BATCH_SIZE
+    )
+
+    migrated = 0
+    start = time.perf_counter()
+    batch = []
+
+    def flush(batch):
+        ops = []
+        truncated = {
+            kind: truncate([doc[field_name(kind, FULL_DIMENSIONS)] for doc in batch], dims)
+            for kind in KINDS
+        }
+        for i, doc in enumerate(batch):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+                field_name(kind, dims): truncated[kind][i].tolist() for kind in KINDS
+            }}))
+        collection.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    for doc in cursor:
+        if all(doc.get(field_name(kind, FULL_DIMENSIONS)) for kind in KINDS):
+            batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            migrated += flush(batch)
+            batch = []
+            print(f"[Migrate] {migrated} documents ({migrated / (time.perf_counter() - start):.0f} docs/sec)")
+    if batch:
+        migrated += flush(batch)
+    print(f"[Migrate] Wrote {dims}-dim vectors for {migrated} documents.")
+
+    index_name = f"vector_index_{dims}"
+    try:
+        db.command({"dropSearchIndex": "movies", "name": index_name})
+        print(f"🗑️ Dropped existing index: {index_name}")
+    except Exception as e:
+        print(f"⚠️ Couldn't drop index {index_name} (might not exist): {e}")
+
+    db.command({
+        "createSearchIndexes": "movies",
+        "indexes": [{
+            "name": index_name,
+            "type": "vectorSearch",
+            "definition": {
+                "fields": [
+                    {"type": "vector", "path": field_name(kind, dims), "numDimensions": dims, "similarity": "cosine"}
+                    for kind in KINDS
+                ]
+            }
+        }]
+    })
+    print(f"🎉 Created vector index {index_name}. Set EMBEDDING_DIMENSIONS={dims} to use it.")
+
+
+def report(collection, dims_list, sample, queries, k, seed=0):
+    """
+    For each dimension, ranks a sample of the catalog against held-out movie
+    vectors (used as queries) and compares the top-k with the full 3072-dim
+    ranking.
+    """
+    docs = list(collection.aggregate([
+        {"$match": {field_name(kind, FULL_DIMENSIONS): {"$exists": True} for kind in KINDS}},
+        {"$sample": {"size": sample + queries}},
+        {"$project": {field_name(kind, FULL_DIMENSIONS): 1 for kind in KINDS}},
+    ]))
+    print(f"[Report] Loaded {len(docs)} movies ({queries} held out as queries), k={k}")
+
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(docs))
+    query_rows, catalog_rows = order[:queries], order[queries:]
+
+    print(f"{'kind':<12}{'dims':>6}{'bytes/vec':>11}{'catalog MB':>12}{'recall@' + str(k):>11}")
+    for kind in KINDS:
+        full = truncate([docs[i][field_name(kind, FULL_DIMENSIONS)] for i in range(len(docs))], FULL_DIMENSIONS)
+        truth = np.argsort(-(full[query_rows] @ full[catalog_rows].T), axis=1)[:, :k]
+        for dims in dims_list:
+            reduced = truncate(full, dims)
+            found = np.argsort(-(reduced[query_rows] @ reduced[catalog_rows].T), axis=1)[:, :k]
+            recall = np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)])
+            catalog_mb = dims * 4 * collection.estimated_document_count() / 1e6
+            print(f"{kind:<12}{dims:>6}{dims * 4:>11}{catalog_mb:>12.1f}{recall:>11.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate stored vectors to fewer dimensions or report recall vs size.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = sub.add_parser("migrate")
+    migrate_parser.add_argument("--dims", type=int, required=True)
+    report_parser = sub.add_parser("report")
+    report_parser.add_argument("--dims", default="256,512,1024,3072")
+    report_parser.add_argument("--sample", type=int, default=5000)
+    report_parser.add_argument("--queries", type=int, default=200)
+    report_parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print("[Init] Connecting to MongoDB...")
+    mongo_client = MongoClient(MONGO_URI)
+    db = mongo_client["sample_mflix"]
+    collection = db["movies"]
+    print("[Init] Connected to MongoDB.")
+
+    if args.command == "migrate":
+        if not 0 < args.dims < FULL_DIMENSIONS:
+            parser.error(f"--dims must be between 1 and {FULL_DIMENSIONS - 1}")
+        migrate(collection, db, args.dims)
+    else:
+        report(collection, [int(d) for d in args.dims.split(",")], args.sample, args.queries, args.k)
@@ -0,0 +1,94 @@
+#per-route cold-start import profile for movies_api_handler, based on `python -X importtime`.
+#every route is profiled in a fresh interpreter that imports the handler, the route module the handler
+#loads on first use, and the SDKs that route initializes through clients.py on its first call.
+#keep ROUTES in sync with the lazy imports in movies_api_handler.handler.
+#
+#usage:
+#   python utils/profile_imports.py                 # report
+#   python utils/profile_imports.py --budget-ms 400  # exit 1 if any route exceeds the budget
+#   python utils/profile_imports.py --top 15         # show the 15 slowest modules per route
+
+import argparse
+import os
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# route -> (modules imported on the cold path, modules that must never be imported on it)
+ROUTES = {
+    "GET /movies/{id}": (["resource_movie", "boto3", "pymongo"], ["openai", "semantic_search", "hybrid_search", "agent"]),
+    "GET /movies": (["resource_movie", "boto3", "pymongo"], ["openai", "semantic_search", "hybrid_search", "agent"]),
+    "POST /movies": (["resource_movie", "boto3", "pymongo", "openai"], ["semantic_search", "hybrid_search", "agent"]),
+    "POST /movies/bulk": (["resource_movie", "boto3", "pymongo", "openai"], ["semantic_search", "hybrid_search", "agent"]),
+    "PUT /movies/{id}": (["resource_movie", "boto3", "pymongo", "openai"], ["semantic_search", "hybrid_search", "agent"]),
+    "DELETE /movies/{id}": (["resource_movie", "boto3", "pymongo"], ["openai", "semantic_search", "hybrid_search", "agent"]),
+    "POST /movies/search": (["semantic_search", "boto3", "pymongo", "openai"], ["agent", "hybrid_search"]),
+    "POST /movies/search?hybrid=true": (["hybrid_search", "boto3", "pymongo", "openai"], ["agent", "semantic_search"]),
+    "POST /movies/search?agent=true": (["agent", "boto3", "pymongo", "openai"], ["semantic_search"]),
+}
+
+
+def profile_route(modules):
+    """
+    Imports the handler plus the route modules in a fresh interpreter and
+    returns {module: (self_us, cumulative_us)} parsed from -X importtime.
+    """
+    code = "import movies_api_handler\n" + "".join(f"import {m}\n" for m in modules)
+    env = os.environ.copy()
+    env.setdefault("SECRET_NAME", "profile-only")  # clients.py only reads it on first use
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=LAMBDA_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def top_level(name):
+    return name.split(".")[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-route cold-start import cost of the Movie API handler.")
+    parser.add_argument("--top", type=int, default=5, help="slowest top-level packages to list per route")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when a route's total import time exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    for route, (modules, forbidden) in ROUTES.items():
+        try:
+            timings = profile_route(modules)
+        except RuntimeError as e:
+            print(f"[Skip] {route}: {e}")
+            continue
+
+        total_ms = sum(self_us for self_us, _ in timings.values()) / 1000
+        packages = {}
+        for name, (self_us, _) in timings.items():
+            packages[top_level(name)] = packages.get(top_level(name), 0) + self_us
+
+        print(f"\n{route}: {total_ms:.1f}ms across {len(timings)} modules")
+        for package, self_us in sorted(packages.items(), key=lambda x: x[1], reverse=True)[:args.top]:
+            print(f"  {package:<24} {self_us / 1000:8.1f}ms")
+
+        leaked = sorted({m for m in forbidden if m in packages})
+        if leaked:
+            print(f"  [Regression] imports {', '.join(leaked)} on this route")
+            failed = True
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            print(f"  [Regression] {total_ms:.1f}ms exceeds budget of {args.budget_ms:.1f}ms")
+            failed = True
+
+    sys.exit(1 if failed else 0)
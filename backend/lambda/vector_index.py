@@ -0,0 +1,317 @@
+"""
+In-process approximate nearest-neighbour engine (IVF) for the movie vectors.
+
+An alternative to the Atlas `vector_index` for `narrative_embeddings` and
+`contextual_embeddings`. Vectors are L2-normalized and stored as a float32 or
+float16 matrix grouped by inverted list, so a query only scans the `nprobe`
+lists whose centroids are closest to it. Persisted indexes are loaded with
+np.load(mmap_mode="r") and paged in on demand.
+
+Indexes are only built offline (utils/build_vector_index.py); building one
+means reading every vector and running k-means, which does not fit in a
+request. When a field has no persisted index the searches for it fall back
+to Atlas $vectorSearch.
+
+Scores follow Atlas's cosine convention, (1 + cosine) / 2, so results can be
+fused with Atlas full-text scores unchanged.
+
+The engine is selected with VECTOR_BACKEND=local (see clients.py).
+
+Environment variables:
+- LOCAL_VECTOR_INDEX_DIR    → directory holding one sub-directory per vector field (default vector_index/ next to this module)
+- LOCAL_VECTOR_DTYPE        → "float32" (default) or "float16"
+- LOCAL_VECTOR_NLIST        → number of inverted lists (default sqrt(n))
+- LOCAL_VECTOR_NPROBE       → lists scanned per query (default 8)
+"""
+
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from clients import VECTOR_BACKEND
+from models import embedding_field
+
+LOCAL_VECTOR_INDEX_DIR = os.environ.get(
+    "LOCAL_VECTOR_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vector_index")
+)
+LOCAL_VECTOR_DTYPE = os.environ.get("LOCAL_VECTOR_DTYPE", "float32")
+LOCAL_VECTOR_NLIST = int(os.environ.get("LOCAL_VECTOR_NLIST", 0))
+LOCAL_VECTOR_NPROBE = int(os.environ.get("LOCAL_VECTOR_NPROBE", 8))
+
+# Vector fields served by the local engine
+VECTOR_FIELDS = [embedding_field("narrative"), embedding_field("contextual")]
+
+
+def encode_id(_id):
+    from bson import ObjectId
+
+    if isinstance(_id, ObjectId):
+        return ["oid", str(_id)]
+    return ["raw", _id]
+
+
+def decode_id(entry):
+    from bson import ObjectId
+
+    kind, value = entry
+    return ObjectId(value) if kind == "oid" else value
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _kmeans(vectors, nlist, iterations=10, sample_size=10000, seed=0):
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, dims, nlist=None, nprobe=LOCAL_VECTOR_NPROBE, dtype=LOCAL_VECTOR_DTYPE):
+        self.dims = dims
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.dtype = np.dtype(dtype)
+        self.centroids = np.zeros((0, dims), dtype=np.float32)
+        self.vectors = np.zeros((0, dims), dtype=self.dtype)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.ids = []
+        self._deleted = set()
+        self._positions = {}
+        self._delta_ids = []
+        self._delta_vectors = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids) - len(self._deleted) + len(self._delta_ids)
+
+    def build(self, ids, vectors):
+        """
+        Trains the coarse quantizer and lays the vectors out by inverted list.
+        """
+        vectors = _normalize(vectors)
+        if len(vectors) == 0:
+            raise ValueError("Cannot build an index without vectors")
+        nlist = self.nlist or LOCAL_VECTOR_NLIST or max(1, int(math.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        with self._lock:
+            self.centroids = _kmeans(vectors, nlist)
+            self.nlist = nlist
+            self._layout(list(ids), vectors)
+        return self
+
+    def _layout(self, ids, vectors):
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1) if len(vectors) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(assignments, kind="stable")
+        self.vectors = vectors[order].astype(self.dtype)
+        self.ids = [ids[i] for i in order]
+        counts = np.bincount(assignments, minlength=self.nlist)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self._positions = {_id: row for row, _id in enumerate(self.ids)}
+        self._deleted = set()
+        self._delta_ids = []
+        self._delta_vectors = []
+
+    def add(self, ids, vectors):
+        """
+        Adds or replaces vectors. New rows live in an in-memory delta that is
+        scanned exhaustively until the next save() folds it into the lists.
+        """
+        vectors = _normalize(vectors)
+        with self._lock:
+            self.delete(ids)
+            for _id, vector in zip(ids, vectors):
+                self._delta_ids.append(_id)
+                self._delta_vectors.append(vector)
+
+    def delete(self, ids):
+        with self._lock:
+            for _id in ids:
+                row = self._positions.get(_id)
+                if row is not None:
+                    self._deleted.add(row)
+                if _id in self._delta_ids:
+                    index = self._delta_ids.index(_id)
+                    del self._delta_ids[index]
+                    del self._delta_vectors[index]
+
+    def search(self, query_vector, k=10, nprobe=None):
+        """
+        Returns up to k (id, score) pairs, best first.
+        """
+        query = _normalize(query_vector).reshape(-1)
+        nprobe = min(nprobe or self.nprobe, self.nlist or 1)
+
+        with self._lock:
+            rows = []
+            scores = []
+
+            if len(self.ids):
+                lists = np.argsort(-(self.centroids @ query))[:nprobe]
+                for c in lists:
+                    start, end = int(self.offsets[c]), int(self.offsets[c + 1])
+                    if start < end:
+                        rows.append(np.arange(start, end))
+                        scores.append(np.asarray(self.vectors[start:end], dtype=np.float32) @ query)
+
+            rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+            scores = np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+            if self._deleted:
+                live = ~np.isin(rows, list(self._deleted))
+                rows, scores = rows[live], scores[live]
+            candidate_ids = [self.ids[row] for row in rows]
+
+            if self._delta_ids:
+                candidate_ids.extend(self._delta_ids)
+                scores = np.concatenate([scores, np.asarray(self._delta_vectors, dtype=np.float32) @ query])
+
+        if not candidate_ids:
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(candidate_ids[i], float((1 + scores[i]) / 2)) for i in top]
+
+    def save(self, directory):
+        """
+        Persists the index, folding the delta into the inverted lists and
+        dropping deleted rows.
+        """
+        with self._lock:
+            keep = [row for row in range(len(self.ids)) if row not in self._deleted]
+            ids = [self.ids[row] for row in keep] + self._delta_ids
+            vectors = np.asarray(self.vectors[keep], dtype=np.float32)
+            if self._delta_vectors:
+                vectors = np.vstack([vectors, np.asarray(self._delta_vectors, dtype=np.float32)])
+            if not len(self.centroids):
+                self.build(ids, vectors)
+            else:
+                self._layout(ids, vectors)
+
+            os.makedirs(directory, exist_ok=True)
+            np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+            np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+            np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+            with open(os.path.join(directory, "ids.json"), "w") as f:
+                json.dump([encode_id(_id) for _id in self.ids], f)
+            with open(os.path.join(directory, "meta.json"), "w") as f:
+                json.dump({"dims": self.dims, "nlist": self.nlist, "nprobe": self.nprobe, "dtype": self.dtype.name}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, "ids.json")) as f:
+            ids = [decode_id(entry) for entry in json.load(f)]
+
+        index = cls(meta["dims"], nlist=meta["nlist"], nprobe=meta["nprobe"], dtype=meta["dtype"])
+        index.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r" if mmap else None)
+        index.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        index.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        index.ids = ids
+        index._positions = {_id: row for row, _id in enumerate(ids)}
+        return index
+
+
+def build_from_collection(collection, field, batch_size=1000, **index_options):
+    """
+    Builds an index for `field` from every movie that has it.
+    """
+    ids = []
+    vectors = []
+    cursor = collection.find({field: {"$exists": True}}, {field: 1}, batch_size=batch_size)
+    for doc in cursor:
+        vector = doc.get(field)
+        if vector:
+            ids.append(doc["_id"])
+            vectors.append(vector)
+    print(f"[Vector Index] Building {field} index over {len(ids)} vectors...")
+    return IVFIndex(len(vectors[0]), **index_options).build(ids, vectors)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(field):
+    """
+    Returns the persisted local index for `field`, memory-mapped from
+    LOCAL_VECTOR_INDEX_DIR, or None when utils/build_vector_index.py has not
+    built one. A missing index is remembered for the life of the container.
+    """
+    with _indexes_lock:
+        if field not in _indexes:
+            directory = os.path.join(LOCAL_VECTOR_INDEX_DIR, field)
+            if os.path.exists(os.path.join(directory, "meta.json")):
+                _indexes[field] = IVFIndex.load(directory)
+            else:
+                print(f"[Vector Index] No index for {field} in {LOCAL_VECTOR_INDEX_DIR}; using Atlas $vectorSearch")
+                _indexes[field] = None
+        return _indexes[field]
+
+
+def use_local_index():
+    return VECTOR_BACKEND == "local"
+
+
+def local_vector_search_stages(query_vector, path, limit, num_candidates=100, filters=None, score_field="vector_search_score"):
+    """
+    Pipeline prefix that stands in for a `$vectorSearch` stage: the local index
+    picks the candidates, then Mongo (or any collection that supports $match)
+    returns them in score order with the score in `score_field`. Returns None
+    when `path` has no local index, so the caller uses $vectorSearch instead.
+    """
+    index = get_local_index(path)
+    if index is None:
+        return None
+    hits = index.search(query_vector, k=max(limit, num_candidates) if filters else limit)
+    ids = [_id for _id, _ in hits]
+    scores = [score for _, score in hits]
+
+    match = {"_id": {"$in": ids}}
+    if filters:
+        match = {"$and": [match, filters]}
+
+    return [
+        {"$match": match},
+        {"$addFields": {score_field: {"$arrayElemAt": [scores, {"$indexOfArray": [ids, "$_id"]}]}}},
+        {"$sort": {score_field: -1}},
+        {"$limit": limit},
+    ]
+
+
+def upsert_document(doc):
+    """
+    Keeps already-loaded local indexes in step with a written movie.
+    """
+    if not use_local_index():
+        return
+    for field in VECTOR_FIELDS:
+        index = _indexes.get(field)
+        if index is not None and doc.get(field):
+            index.add([doc["_id"]], [doc[field]])
+
+
+def remove_document(_id):
+    if not use_local_index():
+        return
+    for index in _indexes.values():
+        if index is not None:
+            index.delete([_id])
@@ -0,0 +1,65 @@
+import pytest
+
+import resource_movie
+from models import embedding_field, text_hash_field
+
+KINDS = ("narrative", "contextual")
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    calls = {"count": 0, "fail": 0}
+
+    def create_embeddings(text):
+        calls["count"] += 1
+        if calls["fail"]:
+            calls["fail"] -= 1
+            return None
+        return [float(len(text)), 1.0]
+
+    monkeypatch.setattr(resource_movie, "create_embeddings", create_embeddings)
+    return calls
+
+
+def test_new_movie_gets_vectors_and_hashes(embeddings):
+    data = resource_movie.add_embeddings({"title": "Heat", "plot": "A heist."})
+
+    for kind in KINDS:
+        assert data[embedding_field(kind)] is not None
+        assert data[text_hash_field(kind)]
+
+
+def test_unchanged_text_is_not_embedded_again(embeddings):
+    stored = resource_movie.add_embeddings({"title": "Heat", "plot": "A heist."})
+    embeddings["count"] = 0
+
+    data = resource_movie.add_embeddings({"poster": "heat.jpg"}, stored)
+
+    assert embeddings["count"] == 0
+    assert data == {"poster": "heat.jpg"}
+
+
+def test_failed_embedding_is_retried_on_the_next_update(embeddings):
+    embeddings["fail"] = 2
+    stored = resource_movie.add_embeddings({"title": "Heat", "plot": "A heist."})
+
+    for kind in KINDS:
+        assert embedding_field(kind) not in stored
+        assert text_hash_field(kind) not in stored
+
+    data = resource_movie.add_embeddings({"poster": "heat.jpg"}, stored)
+
+    for kind in KINDS:
+        assert data[embedding_field(kind)] is not None
+        assert data[text_hash_field(kind)]
+
+
+def test_failed_update_keeps_the_stored_vector(embeddings):
+    stored = resource_movie.add_embeddings({"title": "Heat", "plot": "A heist."})
+    embeddings["fail"] = 2
+
+    data = resource_movie.add_embeddings({"plot": "A heist goes wrong."}, stored)
+
+    # Nothing to $set over the stored vector, and its stale hash keeps it due for re-embedding
+    assert embedding_field("narrative") not in data
+    assert text_hash_field("narrative") not in data
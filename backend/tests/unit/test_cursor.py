@@ -0,0 +1,46 @@
+import base64
+import json
+
+import pytest
+from bson import ObjectId
+
+from resource_movie import decode_cursor, encode_cursor
+
+
+def token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("direction", ["next", "prev"])
+def test_object_id_round_trip(direction):
+    _id = ObjectId()
+    assert decode_cursor(encode_cursor(direction, _id)) == (direction, _id)
+
+
+def test_plain_id_round_trip():
+    assert decode_cursor(encode_cursor("next", "tt0111161")) == ("next", "tt0111161")
+    assert decode_cursor(encode_cursor("prev", 42)) == ("prev", 42)
+
+
+def test_token_is_url_safe_without_padding():
+    encoded = encode_cursor("next", ObjectId())
+    assert "=" not in encoded
+    assert set(encoded) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("tampered", [
+    token({"d": "next", "id": "zz", "oid": True}),
+    token({"d": "next", "id": 12, "oid": True}),
+    token({"d": "sideways", "id": str(ObjectId()), "oid": True}),
+    token({"d": "next", "oid": True}),
+    token({"id": str(ObjectId()), "oid": True}),
+    token(["next", str(ObjectId())]),
+    token("next"),
+    "not base64 at all!",
+    "é",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii"),
+    "",
+])
+def test_tampered_tokens_raise_value_key_or_type_error(tampered):
+    with pytest.raises((ValueError, KeyError, TypeError)):
+        decode_cursor(tampered)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from fusion import fuse
+
+
+def ranked(**retrievers):
+    return {name: (ids, np.array(scores, dtype=float)) for name, (ids, scores) in retrievers.items()}
+
+
+def test_rrf_sums_weighted_reciprocal_ranks():
+    ids, fused, contributions = fuse(
+        ranked(narrative=(["a", "b"], [0.9, 0.8]), text=(["b", "c"], [12.0, 3.0])),
+        {"narrative": 0.5, "text": 0.5},
+        method="rrf",
+        rrf_k=10,
+    )
+
+    assert ids == ["b", "a", "c"]
+    assert fused == pytest.approx([0.5 / 11 + 0.5 / 10, 0.5 / 10, 0.5 / 11])
+    # One row per retriever, in input order, aligned with the returned ids
+    assert contributions[0] == pytest.approx([0.5 / 11, 0.5 / 10, 0.0])
+    assert contributions[1] == pytest.approx([0.5 / 10, 0.0, 0.5 / 11])
+
+
+def test_combsum_weights_raw_scores():
+    ids, fused, _ = fuse(
+        ranked(narrative=(["a", "b"], [0.9, 0.2]), text=(["b"], [2.0])),
+        {"narrative": 1.0, "text": 0.5},
+        method="combsum",
+    )
+
+    assert ids == ["b", "a"]
+    assert fused == pytest.approx([0.2 + 1.0, 0.9])
+
+
+def test_normalized_rescales_each_retriever():
+    ids, fused, _ = fuse(
+        ranked(narrative=(["a", "b", "c"], [0.9, 0.6, 0.3]), text=(["c", "a"], [40.0, 20.0])),
+        {"narrative": 0.5, "text": 0.5},
+        method="normalized",
+    )
+
+    assert ids == ["a", "c", "b"]
+    assert fused == pytest.approx([0.5, 0.5, 0.25])
+
+
+def test_normalized_constant_scores_count_fully():
+    _, fused, _ = fuse(ranked(text=(["a", "b"], [3.0, 3.0])), {"text": 0.4}, method="normalized")
+
+    assert fused == pytest.approx([0.4, 0.4])
+
+
+def test_ties_keep_first_seen_order():
+    ids, _, _ = fuse(
+        ranked(narrative=(["a", "b"], [1.0, 1.0]), text=(["c", "d"], [1.0, 1.0])),
+        {"narrative": 1.0, "text": 1.0},
+        method="combsum",
+    )
+
+    assert ids == ["a", "b", "c", "d"]
+
+
+def test_repeated_id_keeps_its_best_contribution():
+    ids, fused, _ = fuse(ranked(narrative=(["a", "b", "a"], [0.9, 0.8, 0.7])), {"narrative": 1.0}, rrf_k=1)
+
+    assert ids == ["a", "b"]
+    assert fused == pytest.approx([1.0, 0.5])
+
+
+def test_unweighted_retriever_contributes_nothing():
+    ids, fused, _ = fuse(ranked(narrative=(["a"], [0.9]), text=(["b"], [5.0])), {"narrative": 1.0}, rrf_k=1)
+
+    assert ids == ["a", "b"]
+    assert fused == pytest.approx([1.0, 0.0])
+
+
+def test_no_candidates():
+    ids, fused, contributions = fuse(ranked(narrative=([], []), text=([], [])), {"narrative": 1.0, "text": 1.0})
+
+    assert ids == []
+    assert fused.shape == (0,)
+    assert contributions.shape == (2, 0)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        fuse(ranked(text=(["a"], [1.0])), {"text": 1.0}, method="borda")
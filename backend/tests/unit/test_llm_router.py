@@ -0,0 +1,163 @@
+import pytest
+
+import llm_router
+from llm_router import ModelRouter, CLOSED, OPEN, HALF_OPEN
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_router.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def router(clock):
+    return ModelRouter(["primary", "backup"], breaker_threshold=3, cooldown_seconds=30, stats_log_seconds=0,
+                       hedging=False)
+
+
+def trip(router, model_id="primary"):
+    for _ in range(router.breaker_threshold):
+        router.record(model_id, "throttle")
+
+
+def test_throttles_below_the_threshold_keep_the_circuit_closed(router):
+    router.record("primary", "throttle")
+    router.record("primary", "throttle")
+
+    assert router.models["primary"].state == CLOSED
+    assert router.choose() == "primary"
+
+
+def test_a_success_resets_the_throttle_streak(router):
+    router.record("primary", "throttle")
+    router.record("primary", "throttle")
+    router.record("primary", "ok", 100)
+    router.record("primary", "throttle")
+
+    assert router.models["primary"].state == CLOSED
+
+
+def test_errors_do_not_trip_a_closed_circuit(router):
+    for _ in range(5):
+        router.record("primary", "error")
+
+    assert router.models["primary"].state == CLOSED
+
+
+def test_threshold_throttles_open_the_circuit(router):
+    trip(router)
+
+    assert router.models["primary"].state == OPEN
+    assert router.choose() == "backup"
+
+
+def test_open_circuit_is_skipped_until_the_cooldown_ends(router, clock):
+    trip(router)
+    clock.now += 29
+
+    assert router.choose() == "backup"
+    assert router.models["primary"].state == OPEN
+
+
+def test_cooldown_half_opens_and_sends_one_probe(router, clock):
+    router.record("backup", "ok", 50)
+    trip(router)
+    clock.now += 30
+
+    # The probe goes first even though the backup is known to be fast
+    assert router.choose() == "primary"
+    assert router.models["primary"].state == HALF_OPEN
+    # Only one probe at a time
+    assert router.choose() == "backup"
+
+
+def test_successful_probe_closes_the_circuit(router, clock):
+    trip(router)
+    clock.now += 30
+    assert router.choose() == "primary"
+
+    router.record("primary", "ok", 100)
+
+    assert router.models["primary"].state == CLOSED
+    assert router.models["primary"].consecutive_throttles == 0
+
+
+@pytest.mark.parametrize("outcome", ["throttle", "error"])
+def test_failed_probe_reopens_the_circuit(router, clock, outcome):
+    trip(router)
+    clock.now += 30
+    assert router.choose() == "primary"
+
+    router.record("primary", outcome)
+
+    stats = router.models["primary"]
+    assert stats.state == OPEN
+    assert stats.opened_at == clock.now
+    assert router.choose() == "backup"
+    clock.now += 30
+    assert router.choose() == "primary"
+
+
+def test_every_circuit_open(router):
+    trip(router, "primary")
+    trip(router, "backup")
+
+    assert router.choose() is None
+
+
+class ReadTimeoutError(Exception):
+    # Like botocore's HTTPClientError subclasses, which carry no service response
+    response = None
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+def test_error_code_of_an_error_without_a_response():
+    assert llm_router.error_code(ReadTimeoutError("Read timeout on endpoint URL")) == "ReadTimeoutError"
+    assert llm_router.error_code(ValueError("boom")) == "ValueError"
+
+
+def test_error_code_of_a_client_error():
+    assert llm_router.error_code(ClientError("ThrottlingException")) == "ThrottlingException"
+
+
+def test_read_timeout_fails_over_to_the_next_model(router, monkeypatch):
+    monkeypatch.setattr(llm_router, "get_bedrock_client", lambda: None)
+    calls = []
+
+    def call(client, model_id, body, abandoned):
+        calls.append(model_id)
+        if model_id == "primary":
+            raise ReadTimeoutError("Read timeout on endpoint URL")
+        return "answer", None
+
+    assert router._chain("{}", call, "invoke", "primary", []) == ("answer", None)
+    assert calls == ["primary", "backup"]
+    assert router.models["primary"].errors == 1
+    assert router.models["primary"].throttles == 0
+
+
+def test_unknown_error_is_returned_to_the_caller(router, monkeypatch):
+    monkeypatch.setattr(llm_router, "get_bedrock_client", lambda: None)
+
+    def call(client, model_id, body, abandoned):
+        raise ClientError("ValidationException")
+
+    text, parser = router._chain("{}", call, "invoke", "primary", [])
+
+    assert text.startswith("ERROR: ")
+    assert parser is None
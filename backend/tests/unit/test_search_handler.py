@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+import agent
+import movies_api_handler
+import search_cache
+
+
+def search_event(query="space heist", **params):
+    return {
+        "httpMethod": "POST",
+        "path": "/movies/search",
+        "queryStringParameters": params,
+        "body": json.dumps({"request": query}),
+    }
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    stored = []
+    monkeypatch.setattr(search_cache, "get_catalog_version", lambda: 0)
+    monkeypatch.setattr(search_cache, "get_cached_search", lambda key, version, fields=None: None)
+    monkeypatch.setattr(search_cache, "put_cached_search", lambda *args: stored.append(args))
+    return stored
+
+
+@pytest.fixture
+def agent_search(monkeypatch):
+    searched = []
+
+    def hybrid_search(text, keyword_search_text="", keyword_search_categories=(), **options):
+        searched.append((text, keyword_search_text, list(keyword_search_categories)))
+        return [{"_id": "m1", "title": "Heat", "score": 1.0}]
+
+    monkeypatch.setattr(agent, "fast_path", lambda user_input: None)
+    monkeypatch.setattr(agent, "get_understanding", lambda user_input: None)
+    monkeypatch.setattr(agent, "put_understanding", lambda *args: None)
+    monkeypatch.setattr(agent, "create_embeddings", lambda text: [1.0, 0.0])
+    monkeypatch.setattr(agent, "hybrid_search", hybrid_search)
+    return searched
+
+
+def test_understanding_fallback_is_flagged_and_not_cached(cache, agent_search, monkeypatch):
+    monkeypatch.setattr(agent, "invoke_claude_x_streaming", lambda prompt, tags, on_tag: ("ERROR: throttled", None))
+
+    result = movies_api_handler.route(search_event("  space   heist ", agent="true"))
+    body = json.loads(result["body"])
+
+    assert result["statusCode"] == 200
+    assert body["partial"] is True
+    assert body["degraded"] == ["query_understanding"]
+    assert body["failed_retrievers"] == []
+    assert [movie["_id"] for movie in body["movies"]] == ["m1"]
+    assert agent_search == [("space heist", "space heist", [])]
+    assert cache == []
+
+
+def test_understood_query_is_cached(cache, agent_search, monkeypatch):
+    def invoke(prompt, tags, on_tag):
+        from models import TagStreamParser
+        parser = TagStreamParser(tags, on_tag)
+        parser.feed("<SEMANTIC_SEARCH_TEXT>A heist in space</SEMANTIC_SEARCH_TEXT>"
+                    "<KEYWORD_SEARCH_TEXT>heist</KEYWORD_SEARCH_TEXT>"
+                    '<KEYWORD_CATEGORIES>"genres"</KEYWORD_CATEGORIES>')
+        return "", parser
+
+    monkeypatch.setattr(agent, "invoke_claude_x_streaming", invoke)
+
+    result = movies_api_handler.route(search_event(agent="true"))
+    body = json.loads(result["body"])
+
+    assert result["statusCode"] == 200
+    assert "partial" not in body
+    assert agent_search == [("A heist in space", "heist", ["genres"])]
+    assert len(cache) == 1
+
+
+def test_stream_error_before_the_first_ranking_ends_with_an_error_event(monkeypatch):
+    def understand_query(user_input, on_semantic_text=None, degraded=None):
+        raise RuntimeError("bedrock unreachable")
+
+    monkeypatch.setattr(agent, "understand_query", understand_query)
+
+    error, lines = movies_api_handler.stream_handler(search_event(agent="true", stream="true"))
+    events = [json.loads(line) for line in lines]
+
+    assert error is None
+    assert events == [{"event": "error", "error": "Unexpected server error", "details": "bedrock unreachable"}]
+
+
+def test_invalid_stream_request_is_rejected_before_streaming():
+    error, lines = movies_api_handler.stream_handler(search_event("", stream="true"))
+
+    assert error["statusCode"] == 400
+    assert lines is None
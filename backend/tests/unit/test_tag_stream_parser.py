@@ -0,0 +1,71 @@
+import pytest
+
+from models import TagStreamParser
+
+TEXT = "<semantic>space heist</semantic> noise <keywords>Sci-Fi, Action</keywords>"
+
+
+def feed_in_pieces(parser, text, size):
+    return [parser.feed(text[i:i + size]) for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(TEXT)])
+def test_values_do_not_depend_on_how_the_text_is_split(size):
+    parser = TagStreamParser(["semantic", "keywords"])
+
+    results = feed_in_pieces(parser, TEXT, size)
+
+    assert parser.values == {"semantic": "space heist", "keywords": "Sci-Fi, Action"}
+    assert results[-1] is True
+    assert not any(results[:-1])
+
+
+def test_on_tag_fires_as_each_tag_closes():
+    seen = []
+    parser = TagStreamParser(["semantic", "keywords"], on_tag=lambda tag, value: seen.append((tag, value)))
+
+    parser.feed("<semantic>space he")
+    assert seen == []
+    parser.feed("ist</sem")
+    assert seen == []
+    parser.feed("antic><keywords>Sci-Fi")
+    assert seen == [("semantic", "space heist")]
+    assert not parser.done
+    parser.feed("</keywords>")
+    assert seen == [("semantic", "space heist"), ("keywords", "Sci-Fi")]
+    assert parser.done
+
+
+def test_each_tag_is_reported_once():
+    seen = []
+    parser = TagStreamParser(["a"], on_tag=lambda tag, value: seen.append(value))
+
+    parser.feed("<a>1</a>")
+    parser.feed("<a>2</a>")
+
+    assert seen == ["1"]
+    assert parser.get("a") == "1"
+
+
+def test_unclosed_tag_is_not_reported():
+    parser = TagStreamParser(["semantic", "keywords"])
+
+    assert parser.feed("<semantic>space heist</semantic><keywords>Sci") is False
+    assert not parser.done
+    assert parser.get("semantic") == "space heist"
+    assert parser.get("keywords") == ""
+
+
+def test_tags_closing_out_of_order():
+    parser = TagStreamParser(["semantic", "keywords"])
+
+    assert parser.feed("<keywords>Drama</keywords><semantic>") is False
+    assert parser.feed("tearjerker</semantic>") is True
+    assert parser.values == {"keywords": "Drama", "semantic": "tearjerker"}
+
+
+def test_empty_value():
+    parser = TagStreamParser(["keywords"])
+
+    assert parser.feed("<keywords></keywords>") is True
+    assert parser.values == {"keywords": ""}
@@ -0,0 +1,72 @@
+import pytest
+
+import resource_movie
+
+
+class Collection:
+    def __init__(self, count):
+        self.count = count
+        self.exact_counts = 0
+
+    def count_documents(self, query):
+        self.exact_counts += 1
+        return self.count
+
+    def estimated_document_count(self):
+        return self.count + 1000
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Monotonic time of a microVM booted a few seconds ago
+    clock = {"now": 5.0}
+    monkeypatch.setattr(resource_movie.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setitem(resource_movie._exact_count, "value", None)
+    monkeypatch.setitem(resource_movie._exact_count, "refreshed_at", None)
+    monkeypatch.setitem(resource_movie._exact_count, "refreshing", False)
+    return clock
+
+
+def test_first_call_counts_exactly(clock):
+    collection = Collection(42)
+
+    assert resource_movie.get_total_count(collection) == (42, True)
+    assert collection.exact_counts == 1
+
+
+def test_count_is_cached_until_it_expires(clock):
+    collection = Collection(42)
+    resource_movie.get_total_count(collection)
+    collection.count = 43
+
+    clock["now"] += resource_movie.COUNT_REFRESH_SECONDS - 1
+    assert resource_movie.get_total_count(collection) == (42, True)
+    clock["now"] += 1
+    assert resource_movie.get_total_count(collection) == (43, True)
+    assert collection.exact_counts == 2
+
+
+def test_invalidate_recounts_on_the_next_call(clock):
+    collection = Collection(42)
+    resource_movie.get_total_count(collection)
+    collection.count = 43
+
+    resource_movie.invalidate_total_count()
+
+    assert resource_movie.get_total_count(collection) == (43, True)
+
+
+def test_failed_count_falls_back_to_the_estimate(clock):
+    collection = Collection(42)
+    collection.count_documents = lambda query: 1 / 0
+
+    assert resource_movie.get_total_count(collection) == (1042, False)
+    assert resource_movie._exact_count["refreshing"] is False
+
+
+def test_count_in_progress_answers_with_the_estimate(clock):
+    collection = Collection(42)
+    resource_movie._exact_count["refreshing"] = True
+
+    assert resource_movie.get_total_count(collection) == (1042, False)
+    assert collection.exact_counts == 0